@@ -0,0 +1,299 @@
+'''
+Ops/sec, p50/p99 latency and peak memory of SimpleDrive, AsyncSimpleDrive, WebhookClient and BuildAuth calls,
+one by one and in bulk, against the local fake server (benchmarks/fake_server.py). Nothing is sent to Google.
+The server runs in another process, the peak memory is the client's only.
+
+python benchmarks/api_benchmark.py --output after.json
+python benchmarks/api_benchmark.py --latency 0.02 --error-rate 0.01 --output after.json --compare before.json
+python benchmarks/api_benchmark.py --only copy --number 50
+'''
+import argparse
+import asyncio
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+
+import google.oauth2.credentials
+from google.oauth2.credentials import Credentials
+from pydrive2.auth import GoogleAuth
+
+# Run from a checkout without pip install, the package is in the parent directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simplegoogleapi.auth import BuildAuth
+from simplegoogleapi.chat import WebhookClient
+from simplegoogleapi.drive import SimpleDrive
+from simplegoogleapi.drive.scheduler import RequestScheduler
+from simplegoogleapi.instrument import NoopInstrument, set_instrument
+
+
+class FakeGauth(GoogleAuth):
+    def __init__(self):
+        super().__init__()
+        self.credentials = Credentials(token='fake-token')
+
+
+class ServerProcess:
+    def __init__(self, latency=0, jitter=False, error_rate=0, seed=0):
+        '''
+        benchmarks/fake_server.py in a child process, on a free port
+        '''
+        command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_server.py'),
+                   '--port', '0', '--latency', str(latency), '--error-rate', str(error_rate), '--seed', str(seed)]
+        if jitter:
+            command.append('--jitter')
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+        line = self.process.stdout.readline()
+        if not line.startswith('Fake server on '):
+            self.process.kill()
+            raise Exception(f'The fake server did not start: {line}')
+        self.url = line.split()[-1]
+
+    @property
+    def stats(self):
+        with urllib.request.urlopen(f'{self.url}/stats') as response:
+            return json.loads(response.read())
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q / 100))]
+
+
+def run(name, function, number=1, setup=None, items=1):
+    '''
+    Time every call, then run it once more under tracemalloc for the peak memory
+    :param name: Operation name in the results
+    :param function: A function without parameter
+    :param number: Number of timed calls
+    :param setup: A function called before each call, not timed
+    :param items: Number of files (or messages) handled by one call, for items/sec of bulk workloads
+    :return: {count, ops_per_sec, items_per_sec, p50_ms, p99_ms, peak_kb}
+    '''
+    latencies = []
+    for i in range(number):
+        if setup != None:
+            setup()
+        started = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - started)
+    if setup != None:
+        setup()
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    total = sum(latencies)
+    result = {'count': number, 'ops_per_sec': number / total, 'items_per_sec': number * items / total,
+              'p50_ms': percentile(latencies, 50) * 1000, 'p99_ms': percentile(latencies, 99) * 1000,
+              'peak_kb': peak / 1024}
+    print(f'{name:<28} {result["ops_per_sec"]:>10.1f} ops/s {result["items_per_sec"]:>10.1f} items/s '
+          f'p50 {result["p50_ms"]:>8.2f} ms  p99 {result["p99_ms"]:>8.2f} ms  peak {result["peak_kb"]:>9.1f} KB')
+    return result
+
+
+def fill_folder(my_drive, parent_id, count, max_per_request=100):
+    '''
+    Create count small files in a folder with batched copies of one file
+    '''
+    file = my_drive.upload_bytes(b'x' * 100, 'seed.txt', folder_id=parent_id)
+    for start in range(0, count - 1, max_per_request):
+        b = my_drive.batch(max_per_request=max_per_request)
+        for i in range(start, min(count - 1, start + max_per_request)):
+            b.copy_file(file['id'], to_folder_id=parent_id, name=f'file_{i}.txt')
+        b.execute()
+
+
+def single_operations(my_drive, server, number, only):
+    results = {}
+    folder_id = my_drive.create_folder('single')
+    file = my_drive.upload_bytes(b'x' * 1024, 'small.bin', folder_id=folder_id)
+    small = os.urandom(64 * 1024)
+    large = os.urandom(16 * 1024 * 1024)
+    webhook = WebhookClient()
+    auth = BuildAuth(token_cache=None, refresh_margin=0)
+    credentials_dir = tempfile.mkdtemp()
+    credentials_file = os.path.join(credentials_dir, 'credentials.json')
+    expired = json.dumps({'token': 'expired', 'refresh_token': 'refresh', 'token_uri': f'{server.url}/token',
+                          'client_id': 'id', 'client_secret': 'secret',
+                          'expiry': (datetime.datetime.utcnow() - datetime.timedelta(hours=1)).isoformat() + 'Z'})
+    copies = []
+
+    def expire():
+        with open(credentials_file, 'w') as f:
+            f.write(expired)
+
+    def delete_setup():
+        copies.append(my_drive.copy_file(file['id'], to_folder_id=folder_id))
+
+    def permission():
+        my_drive.add_permission(file['id'], 'reader@example.com')
+        my_drive.delete_permission(file['id'], email='reader@example.com')
+
+    def batch_rename():
+        b = my_drive.batch()
+        for i in range(100):
+            b.rename_file(file['id'], f'renamed_{i}.bin')
+        b.execute()
+
+    operations = [
+        ('create_folder', lambda: my_drive.create_folder('folder', parent_folder_id=folder_id), None, 1),
+        ('get_file', lambda: my_drive.get_file(file['id']), None, 1),
+        ('rename_file', lambda: my_drive.rename_file(file['id'], 'renamed.bin'), None, 1),
+        ('copy_file', lambda: my_drive.copy_file(file['id'], to_folder_id=folder_id), None, 1),
+        ('delete_file', lambda: my_drive.delete_file(copies.pop()['id']), delete_setup, 1),
+        ('add_delete_permission', permission, None, 1),
+        ('check_usage', lambda: my_drive.check_usage(), None, 1),
+        ('iter_files_page', lambda: list(my_drive.iter_files(parent_id=folder_id, page_size=100)), None, 1),
+        ('upload_bytes_64k', lambda: my_drive.upload_bytes(small, 'small.bin', folder_id=folder_id), None, 1),
+        ('upload_bytes_16m', lambda: my_drive.upload_bytes(large, 'large.bin', folder_id=folder_id), None, 1),
+        ('batch_rename_100', batch_rename, None, 100),
+        ('webhook_send', lambda: webhook.send(f'{server.url}/chat/webhook', 'Hello'), None, 1),
+        ('auth_refresh', lambda: auth.refresh_creds_shared(credentials_file, auth.drive_scopes), expire, 1),
+    ]
+    for name, function, setup, items in operations:
+        if only == None or only in name:
+            count = max(1, number // 10) if name == 'upload_bytes_16m' else number
+            results[name] = run(name, function, count, setup=setup, items=items)
+    return results
+
+
+def bulk_workloads(my_drive, server, files, only):
+    results = {}
+    source_id = my_drive.create_folder('bulk')
+    fill_folder(my_drive, source_id, files)
+    sub_id = my_drive.create_folder('sub', parent_folder_id=source_id)
+    fill_folder(my_drive, sub_id, files // 10)
+    local_dir = tempfile.mkdtemp()
+    local_files = []
+    for i in range(100):
+        local_files.append(os.path.join(local_dir, f'local_{i}.bin'))
+        with open(local_files[-1], 'wb') as f:
+            f.write(os.urandom(4096))
+    targets = []
+    export_id = my_drive.create_folder('export')
+    for i in range(100):
+        my_drive.execute(my_drive.service.files().create(
+            body={'name': f'doc_{i}', 'mimeType': 'application/vnd.google-apps.document', 'parents': [export_id]}))
+    export_dirs = []
+
+    def delete_setup():
+        folder_id = my_drive.create_folder('to-delete')
+        fill_folder(my_drive, folder_id, 1000)
+        targets[:] = [i['id'] for i in my_drive.iter_files(parent_id=folder_id, fields='id', page_size=1000)]
+
+    def delete_batched():
+        b = my_drive.batch()
+        for file_id in targets:
+            b.delete_file(file_id)
+        b.execute()
+
+    workloads = [
+        (f'iter_files_{files}', lambda: list(my_drive.iter_files(parent_id=source_id, fields='id, name',
+                                                                  page_size=1000)), None, files),
+        (f'copy_tree_{files + files // 10}', lambda: my_drive.copy_tree(source_id, 'root', verify=False),
+         None, files + files // 10),
+        ('batch_delete_1000', delete_batched, delete_setup, 1000),
+        ('upload_many_100', lambda: my_drive.upload_many(local_files, folder_id=source_id), None, 100),
+        ('export_many_100', lambda: my_drive.export_many(folder_id=export_id, dest_dir=export_dirs[-1]),
+         lambda: export_dirs.append(tempfile.mkdtemp()), 100),
+    ]
+    for name, function, setup, items in workloads:
+        if only == None or only in name:
+            results[name] = run(name, function, 3, setup=setup, items=items)
+    if (only == None or only in 'async_create_folder_100') and async_available():
+        results['async_create_folder_100'] = run('async_create_folder_100',
+                                                 lambda: asyncio.run(async_folders(server, 100)), 3, items=100)
+    return results
+
+
+def async_available():
+    return importlib.util.find_spec('aiohttp') != None
+
+
+async def async_folders(server, count):
+    from simplegoogleapi.drive.aio import AsyncSimpleDrive
+    async with AsyncSimpleDrive(creds=Credentials(token='fake-token'), api_endpoint=server.url) as my_drive:
+        await asyncio.gather(*[my_drive.create_folder(f'async_{i}') for i in range(count)])
+
+
+def compare(results, old_file, threshold):
+    '''
+    Print the change of each operation against an older result file
+    :return: Names of the operations whose p50 is more than threshold slower
+    '''
+    with open(old_file) as f:
+        old = json.load(f)['operations']
+    regressions = []
+    print(f'\n{"operation":<28} {"p50 before":>12} {"p50 after":>12} {"change":>8} {"peak before":>12} {"peak after":>12}')
+    for name, result in results['operations'].items():
+        if name not in old:
+            continue
+        change = result['p50_ms'] / old[name]['p50_ms'] - 1 if old[name]['p50_ms'] > 0 else 0
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = '  slower'
+        print(f'{name:<28} {old[name]["p50_ms"]:>9.2f} ms {result["p50_ms"]:>9.2f} ms {change:>+8.0%} '
+              f'{old[name]["peak_kb"]:>9.1f} KB {result["peak_kb"]:>9.1f} KB{flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark simplegoogleapi against a local fake server')
+    parser.add_argument('--number', type=int, default=200, help='Timed calls per single operation')
+    parser.add_argument('--files', type=int, default=10000, help='Files in the bulk workloads')
+    parser.add_argument('--latency', type=float, default=0, help='Seconds added to every request')
+    parser.add_argument('--jitter', action='store_true')
+    parser.add_argument('--error-rate', type=float, default=0, help='Part of the requests answered with 429 or 503')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', default=None, help='Run only the operations whose name contains this')
+    parser.add_argument('--output', default=None, help='Save the results to this json file')
+    parser.add_argument('--compare', default=None, help='An older results json file')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Slower by more than this is a regression')
+    args = parser.parse_args()
+
+    set_instrument(NoopInstrument())
+    server = ServerProcess(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, seed=args.seed)
+    # from_authorized_user_info always uses Google's token endpoint, BuildAuth refreshes go to the fake one
+    google.oauth2.credentials._GOOGLE_OAUTH2_TOKEN_ENDPOINT = f'{server.url}/token'
+    # Injected errors are retried at once, the benchmark measures the client and not the backoff
+    scheduler = RequestScheduler(quota_per_minute=1e12, base_delay=0 if args.error_rate > 0 else 1)
+    my_drive = SimpleDrive(FakeGauth(), cache=False, scheduler=scheduler, api_endpoint=server.url)
+    try:
+        operations = single_operations(my_drive, server, args.number, args.only)
+        operations.update(bulk_workloads(my_drive, server, args.files, args.only))
+        stats = server.stats
+    finally:
+        server.stop()
+
+    results = {'meta': {'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                        'python': platform.python_version(), 'platform': platform.platform(),
+                        'latency': args.latency, 'jitter': args.jitter, 'error_rate': args.error_rate,
+                        'requests': stats['requests'], 'injected_errors': stats['errors']},
+               'operations': operations}
+    if args.output != None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Saved {args.output}')
+    if args.compare != None:
+        regressions = compare(results, args.compare, args.threshold)
+        if len(regressions) > 0:
+            print(f'Slower: {", ".join(regressions)}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+'''
+Time to construct a Drive client, before (build() + GoogleDrive per object) and after (shared service, lazy GoogleDrive).
+No request is sent, fake credentials are used.
+
+python benchmarks/construction.py
+'''
+import os
+import sys
+import time
+
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+from pydrive2.auth import GoogleAuth
+from pydrive2.drive import GoogleDrive
+
+# Run from a checkout without pip install, the package is in the parent directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simplegoogleapi.drive import SimpleDrive
+from simplegoogleapi.drive.service import build_service
+
+
+class FakeGauth(GoogleAuth):
+    def __init__(self):
+        super().__init__()
+        self.credentials = Credentials(token='fake-token')
+
+
+def timeit(name, function, number):
+    started = time.perf_counter()
+    for i in range(number):
+        function()
+    seconds = (time.perf_counter() - started) / number
+    print(f'{name}: {seconds * 1000:.2f} ms per client')
+    return seconds
+
+
+if __name__ == '__main__':
+    gauth = FakeGauth()
+    number = 50
+
+    def before():
+        build('drive', 'v3', credentials=gauth.credentials)
+        GoogleDrive(gauth)
+
+    def after():
+        SimpleDrive(gauth).service
+
+    def new_credentials():
+        build_service(Credentials(token='fake-token'))
+
+    before_seconds = timeit('before', before, number)
+    timeit('after, new credentials (cached discovery document only)', new_credentials, number)
+    after_seconds = timeit('after', after, number)
+    print(f'{before_seconds / after_seconds:.0f}x faster')
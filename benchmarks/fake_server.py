@@ -0,0 +1,454 @@
+'''
+A local stand-in for the Drive v3 API, Google Chat webhooks and the OAuth token endpoint, for benchmarks.
+Files live in memory, field masks are ignored (the whole file is returned).
+
+Endpoints: about, files create/get/list/copy/update/delete, get with alt=media (Range supported), export and
+exportLinks (files.export refuses contents larger than export_limit), permissions list/create/update/delete, multipart and resumable uploads, batch, changes, a Chat webhook (/chat),
+an OAuth token endpoint (/token) and the request counters (/stats).
+
+python benchmarks/fake_server.py --port 8080 --latency 0.02 --error-rate 0.01
+SimpleDrive(gauth, api_endpoint='http://127.0.0.1:8080')
+'''
+import argparse
+import email.parser
+import hashlib
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+EXPORT_MIME_TYPES = ['application/pdf', 'text/csv', 'text/plain',
+                     'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                     'application/vnd.openxmlformats-officedocument.wordprocessingml.document']
+RFC3339 = '%Y-%m-%dT%H:%M:%S.000Z'
+STATUS_TEXT = {200: 'OK', 204: 'No Content', 206: 'Partial Content', 308: 'Resume Incomplete', 400: 'Bad Request',
+               404: 'Not Found', 429: 'Too Many Requests', 503: 'Service Unavailable'}
+
+
+def error_body(status, reason, message):
+    return json.dumps({'error': {'code': status, 'message': message,
+                                 'errors': [{'reason': reason, 'message': message}]}}).encode()
+
+
+class DriveState:
+    def __init__(self):
+        '''
+        Files, permissions, upload sessions and changes kept in memory
+        '''
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.files = {}
+        self.content = {}
+        self.permissions = {}
+        self.sessions = {}
+        self.changes = []
+        self.add({'id': 'root', 'name': 'My Drive', 'mimeType': FOLDER_MIME_TYPE, 'parents': []})
+
+    def new_id(self, prefix='f'):
+        return f'{prefix}{next(self.ids):012d}'
+
+    def add(self, file, content=None):
+        now = time.strftime(RFC3339, time.gmtime())
+        # Drive always sets a mimeType, files created or uploaded without one are application/octet-stream
+        file = {'kind': 'drive#file', 'createdTime': now, 'modifiedTime': now, 'trashed': False,
+                'mimeType': 'application/octet-stream', 'owners': [{'emailAddress': 'owner@example.com'}], 'parents': ['root'], **file}
+        if content != None:
+            file['size'] = str(len(content))
+            file['md5Checksum'] = hashlib.md5(content).hexdigest()
+            self.content[file['id']] = content
+        self.files[file['id']] = file
+        self.permissions.setdefault(file['id'], [{'id': 'owner', 'type': 'user', 'role': 'owner',
+                                                  'emailAddress': 'owner@example.com'}])
+        self.changes.append({'fileId': file['id'], 'time': now})
+        return file
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, without it each response waits for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, status, body=b'', headers=None):
+        self.send_response(status, STATUS_TEXT.get(status))
+        for key, value in (headers or {'Content-Type': 'application/json; charset=UTF-8'}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length > 0 else b''
+        server = self.server
+        if self.path == '/stats':
+            # Read by a client in another process, it is not counted and never fails
+            with server.stats_lock:
+                self._respond(200, json.dumps(server.stats).encode())
+            return
+        with server.stats_lock:
+            server.stats['requests'] += 1
+        if server.latency > 0:
+            time.sleep(server.latency * (0.5 + random.random()) if server.jitter else server.latency)
+        injected = server.inject()
+        if injected != None:
+            self._respond(*injected)
+            return
+        status, body, headers = server.app.dispatch(method, self.path, dict(self.headers), body)
+        self._respond(status, body, headers)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_PATCH(self):
+        self._handle('PATCH')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+
+class FakeDrive:
+    def __init__(self, server):
+        self.server = server
+        self.state = DriveState()
+
+    def json(self, status, value):
+        return status, json.dumps(value).encode(), {'Content-Type': 'application/json; charset=UTF-8'}
+
+    def not_found(self, file_id):
+        return 404, error_body(404, 'notFound', f'File not found: {file_id}.'), {'Content-Type': 'application/json'}
+
+    def dispatch(self, method, path, headers, body):
+        url = urlparse(path)
+        query = {key: value[0] for key, value in parse_qs(url.query).items()}
+        parts = [unquote(i) for i in url.path.split('/') if i != '']
+        with self.state.lock:
+            if parts == ['token']:
+                return self.json(200, {'access_token': f'token-{uuid.uuid4().hex}', 'expires_in': 3600,
+                                       'token_type': 'Bearer'})
+            if parts[:1] == ['export-link'] and parts[1] in self.state.files:
+                return 200, self.exported(parts[1], query.get('mimeType')), {'Content-Type': query.get('mimeType')}
+            if parts[:1] == ['chat']:
+                return self.json(200, {'name': f'spaces/fake/messages/{self.state.new_id("m")}'})
+            if parts == ['batch', 'drive', 'v3']:
+                return self.batch(headers, body)
+            if parts[:3] == ['upload', 'drive', 'v3']:
+                return self.upload(method, parts[3:], query, headers, body)
+            if parts[:2] == ['drive', 'v3']:
+                return self.api(method, parts[2:], query, headers, body)
+        return 404, b'{}', None
+
+    def api(self, method, parts, query, headers, body):
+        state = self.state
+        data = json.loads(body) if body else {}
+        if parts == ['about']:
+            return self.json(200, {'storageQuota': {'limit': str(15 * 1024 ** 3), 'usage': '0'},
+                                   'user': {'emailAddress': 'owner@example.com'}})
+        if parts == ['changes', 'startPageToken']:
+            return self.json(200, {'startPageToken': str(len(state.changes))})
+        if parts == ['changes']:
+            start = int(query.get('pageToken', 0))
+            page = state.changes[start:start + int(query.get('pageSize', 100))]
+            result = {'changes': [{'changeType': 'file', 'fileId': i['fileId'], 'time': i['time'],
+                                   'removed': i['fileId'] not in state.files,
+                                   'file': state.files.get(i['fileId'])} for i in page]}
+            end = start + len(page)
+            result['nextPageToken' if end < len(state.changes) else 'newStartPageToken'] = str(end)
+            return self.json(200, result)
+        if parts == ['files'] and method == 'GET':
+            return self.list_files(query)
+        if parts == ['files'] and method == 'POST':
+            return self.json(200, state.add({**data, 'id': state.new_id()}))
+        if len(parts) < 2 or parts[0] != 'files':
+            return 404, b'{}', None
+        file_id = parts[1]
+        if file_id not in state.files:
+            return self.not_found(file_id)
+        file = state.files[file_id]
+        if len(parts) == 2 and method == 'GET':
+            if query.get('alt') == 'media':
+                return self.media(file_id, headers)
+            if file['mimeType'].startswith('application/vnd.google-apps.') and file['mimeType'] != FOLDER_MIME_TYPE:
+                links = {i: f'{self.server.url}/export-link/{file_id}?mimeType={i}' for i in EXPORT_MIME_TYPES}
+                return self.json(200, dict(file, exportLinks=links))
+            return self.json(200, file)
+        if len(parts) == 2 and method == 'PATCH':
+            self.update(file, data, query)
+            return self.json(200, file)
+        if len(parts) == 2 and method == 'DELETE':
+            self.delete(file_id)
+            return 204, b'', {}
+        if parts[2:] == ['copy'] and method == 'POST':
+            copied = {key: value for key, value in file.items() if key not in ['id', 'createdTime', 'modifiedTime']}
+            copied.update(data)
+            copied.pop('size', None)
+            copied.pop('md5Checksum', None)
+            return self.json(200, state.add({**copied, 'id': state.new_id()}, state.content.get(file_id)))
+        if parts[2:] == ['export'] and method == 'GET':
+            content = self.exported(file_id, query.get('mimeType'))
+            if len(content) > self.server.export_limit:
+                return 403, error_body(403, 'exportSizeLimitExceeded', 'This file is too large to be exported.'), None
+            return 200, content, {'Content-Type': query.get('mimeType')}
+        if parts[2:3] == ['permissions']:
+            return self.permission(method, file_id, parts[3:], data, query)
+        return 404, b'{}', None
+
+    def exported(self, file_id, mime_type):
+        file = self.state.files[file_id]
+        content = self.state.content.get(file_id)
+        return content if content != None else f'{file["name"]} {file["modifiedTime"]} as {mime_type}'.encode()
+
+    def matches(self, file, q):
+        # Terms joined by 'and', a term in parentheses can be terms joined by 'or'
+        return all(any(self.matches_term(file, i.strip().strip('()')) for i in re.split(r'\s+or\s+', term))
+                   for term in re.split(r'\s+and\s+', q) if term.strip() != '')
+
+    def matches_term(self, file, term):
+        found = re.fullmatch(r"'(.*)' in parents", term)
+        if found:
+            return found.group(1) in file.get('parents', [])
+        found = re.fullmatch(r'trashed\s*=\s*(true|false)', term)
+        if found:
+            return file.get('trashed', False) == (found.group(1) == 'true')
+        found = re.fullmatch(r"(name|mimeType)\s*(=|!=)\s*'(.*)'", term)
+        if found:
+            return (file.get(found.group(1)) == found.group(3)) == (found.group(2) == '=')
+        found = re.fullmatch(r"name contains '(.*)'", term)
+        if found:
+            return found.group(1) in file.get('name', '')
+        found = re.fullmatch(r"appProperties has \{ key='(.*)' and value='(.*)' \}", term)
+        if found:
+            return file.get('appProperties', {}).get(found.group(1)) == found.group(2)
+        return True
+
+    def list_files(self, query):
+        q = query.get('q', '')
+        # appProperties has { ... } contains 'and', it is matched before the query is split
+        app = re.search(r"appProperties has \{[^}]*\}", q)
+        files = [i for i in self.state.files.values() if i['id'] != 'root'
+                 and (app == None or self.matches_term(i, app.group(0)))
+                 and self.matches(i, q.replace(app.group(0), '') if app != None else q)]
+        start = int(query.get('pageToken', 0))
+        size = min(int(query.get('pageSize', 100)), 1000)
+        result = {'files': files[start:start + size]}
+        if start + size < len(files):
+            result['nextPageToken'] = str(start + size)
+        return self.json(200, result)
+
+    def update(self, file, data, query):
+        file.update(data)
+        if query.get('removeParents'):
+            file['parents'] = [i for i in file['parents'] if i not in query['removeParents'].split(',')]
+        if query.get('addParents'):
+            file['parents'] = file['parents'] + query['addParents'].split(',')
+        file['modifiedTime'] = time.strftime(RFC3339, time.gmtime())
+        self.state.changes.append({'fileId': file['id'], 'time': file['modifiedTime']})
+
+    def delete(self, file_id):
+        state = self.state
+        if state.files[file_id].get('mimeType') == FOLDER_MIME_TYPE:
+            for child in [i for i in state.files.values() if file_id in i.get('parents', [])]:
+                self.delete(child['id'])
+        state.files.pop(file_id)
+        state.content.pop(file_id, None)
+        state.changes.append({'fileId': file_id, 'time': time.strftime(RFC3339, time.gmtime())})
+
+    def media(self, file_id, headers):
+        content = self.state.content.get(file_id, b'')
+        found = re.fullmatch(r'bytes=(\d+)-(\d*)', headers.get('Range', headers.get('range', '')))
+        if found:
+            end = int(found.group(2)) if found.group(2) else len(content) - 1
+            return 206, content[int(found.group(1)):end + 1], {'Content-Type': 'application/octet-stream'}
+        return 200, content, {'Content-Type': 'application/octet-stream'}
+
+    def permission(self, method, file_id, parts, data, query):
+        permissions = self.state.permissions[file_id]
+        if parts == [] and method == 'GET':
+            start = int(query.get('pageToken', 0))
+            size = min(int(query.get('pageSize', 100)), 100)
+            result = {'permissions': permissions[start:start + size]}
+            if start + size < len(permissions):
+                result['nextPageToken'] = str(start + size)
+            return self.json(200, result)
+        if parts == [] and method == 'POST':
+            permission = {**data, 'id': self.state.new_id('p')}
+            permissions.append(permission)
+            return self.json(200, permission)
+        found = [i for i in permissions if i['id'] == parts[0]]
+        if len(found) == 0:
+            return self.not_found(parts[0])
+        if method == 'DELETE':
+            permissions.remove(found[0])
+            return 204, b'', {}
+        found[0].update(data)
+        return self.json(200, found[0])
+
+    def upload(self, method, parts, query, headers, body):
+        state = self.state
+        file_id = parts[1] if len(parts) > 1 else None
+        if file_id != None and file_id not in state.files and method != 'PUT':
+            return self.not_found(file_id)
+        upload_type = query.get('uploadType')
+        if upload_type == 'resumable' and method in ['POST', 'PATCH']:
+            session = state.new_id('s')
+            state.sessions[session] = {'metadata': json.loads(body) if body else {}, 'file_id': file_id,
+                                       'data': bytearray()}
+            location = f'{self.server.url}/upload/drive/v3/files?uploadType=resumable&upload_id={session}'
+            return 200, b'', {'Location': location, 'Content-Type': 'application/json'}
+        if upload_type == 'resumable' and method == 'PUT':
+            return self.resumable(query['upload_id'], headers, body)
+        if upload_type in ['multipart', 'media']:
+            metadata, content = self.multipart(headers, body) if upload_type == 'multipart' else ({}, body)
+            return self.json(200, self.save(file_id, metadata, content))
+        return 400, error_body(400, 'badRequest', 'Unknown upload'), None
+
+    def multipart(self, headers, body):
+        content_type = headers.get('Content-Type', headers.get('content-type'))
+        message = email.parser.BytesParser().parsebytes(f'Content-Type: {content_type}\r\n\r\n'.encode() + body)
+        parts = message.get_payload()
+        return json.loads(parts[0].get_payload(decode=True) or b'{}'), parts[1].get_payload(decode=True)
+
+    def save(self, file_id, metadata, content):
+        state = self.state
+        if file_id != None:
+            file = state.files[file_id]
+            file.update(metadata)
+            file['size'] = str(len(content))
+            file['md5Checksum'] = hashlib.md5(content).hexdigest()
+            state.content[file_id] = content
+            return file
+        return state.add({**metadata, 'id': state.new_id()}, content)
+
+    def resumable(self, session_id, headers, body):
+        session = self.state.sessions.get(session_id)
+        if session == None:
+            return 404, error_body(404, 'notFound', 'Upload session not found'), None
+        content_range = headers.get('Content-Range', headers.get('content-range', ''))
+        found = re.fullmatch(r'bytes (\d+)-(\d+)/(\d+|\*)', content_range)
+        total = None
+        if found:
+            start = int(found.group(1))
+            del session['data'][start:]
+            session['data'] += body
+            total = int(found.group(3)) if found.group(3) != '*' else None
+        elif content_range == '':
+            # The whole content in one request, googleapiclient sends an empty file this way
+            session['data'] = bytearray(body)
+            total = len(body)
+        else:
+            found = re.fullmatch(r'bytes \*/(\d+|\*)', content_range)
+            total = int(found.group(1)) if found and found.group(1) != '*' else None
+        if total != None and len(session['data']) >= total:
+            del self.state.sessions[session_id]
+            return self.json(200, self.save(session['file_id'], session['metadata'], bytes(session['data'])))
+        headers = {'Content-Type': 'application/json'}
+        if len(session['data']) > 0:
+            headers['Range'] = f'bytes=0-{len(session["data"]) - 1}'
+        return 308, b'', headers
+
+    def batch(self, headers, body):
+        content_type = headers.get('Content-Type', headers.get('content-type'))
+        message = email.parser.BytesParser().parsebytes(f'Content-Type: {content_type}\r\n\r\n'.encode() + body)
+        boundary = f'batch_{uuid.uuid4().hex}'
+        chunks = []
+        for part in message.get_payload():
+            request = part.get_payload(decode=True) if part.is_multipart() == False else part.as_bytes()
+            request = request if isinstance(request, bytes) else str(part.get_payload()).encode()
+            head, _, request_body = request.replace(b'\r\n', b'\n').partition(b'\n\n')
+            lines = head.decode().split('\n')
+            method, url = lines[0].split(' ')[:2]
+            request_headers = dict(i.split(': ', 1) for i in lines[1:] if ': ' in i)
+            injected = self.server.inject()
+            if injected != None:
+                status, response_body = injected[0], injected[1]
+            else:
+                self.state.lock.release()
+                try:
+                    status, response_body, response_headers = self.dispatch(method, url, request_headers,
+                                                                            request_body.strip())
+                finally:
+                    self.state.lock.acquire()
+            content_id = part.get('Content-ID', '').replace('<', '<response-', 1)
+            chunks.append(f'--{boundary}\r\nContent-Type: application/http\r\nContent-ID: {content_id}\r\n\r\n'
+                          f'HTTP/1.1 {status} {STATUS_TEXT.get(status, "")}\r\n'
+                          f'Content-Type: application/json; charset=UTF-8\r\n'
+                          f'Content-Length: {len(response_body)}\r\n\r\n'.encode() + response_body + b'\r\n')
+        return 200, b''.join(chunks) + f'--{boundary}--\r\n'.encode(), \
+            {'Content-Type': f'multipart/mixed; boundary={boundary}'}
+
+
+class FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0, jitter=False, error_rate=0, seed=None,
+                 export_limit=10 * 1024 * 1024):
+        '''
+        :param host: string
+        :param port: 0 = any free port
+        :param latency: Seconds added to every request
+        :param jitter: True = the latency is random between 0.5x and 1.5x
+        :param error_rate: Part of the requests (and batch parts) answered with 429 or 503
+        :param seed: Seed of the error injection
+        :param export_limit: Bytes files.export accepts, larger documents need their exportLinks
+        '''
+        super().__init__((host, port), Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.export_limit = export_limit
+        self.random = random.Random(seed)
+        self.stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0}
+        self.url = f'http://{host}:{self.server_address[1]}'
+        self.app = FakeDrive(self)
+        self.thread = None
+
+    def inject(self):
+        if self.error_rate <= 0:
+            return None
+        with self.stats_lock:
+            if self.random.random() >= self.error_rate:
+                return None
+            self.stats['errors'] += 1
+            if self.random.random() < 0.5:
+                return 429, error_body(429, 'rateLimitExceeded', 'Rate limit exceeded'), \
+                    {'Content-Type': 'application/json', 'Retry-After': '0'}
+            return 503, error_body(503, 'backendError', 'Backend error'), {'Content-Type': 'application/json'}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local fake Drive v3 / Chat / OAuth server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--jitter', action='store_true')
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    server = FakeServer(args.host, args.port, args.latency, args.jitter, args.error_rate, args.seed)
+    # The first line is read by api_benchmark.py to find the port when --port 0 is used
+    print(f'Fake server on {server.url}', flush=True)
+    server.serve_forever()
@@ -0,0 +1,99 @@
+'''
+Cold-start time of the imports short-lived jobs use, each one in a new interpreter.
+It fails (exit 1) when an import loads a heavy dependency it does not need, or when it is slower than --max-ms.
+
+python benchmarks/import_time.py
+python benchmarks/import_time.py --number 20 --output after.json --compare before.json
+python -X importtime -c "from simplegoogleapi.chat import send_webhook_message"  # Where the time goes
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY = ['googleapiclient', 'pydrive2', 'oauth2client', 'google_auth_oauthlib', 'requests', 'pandas', 'pyarrow',
+         'aiohttp']
+
+# Statement, heavy modules it must not load
+SCENARIOS = {
+    'import simplegoogleapi': ('import simplegoogleapi', HEAVY),
+    'chat': ('from simplegoogleapi.chat import send_webhook_message', HEAVY),
+    'auth': ('from simplegoogleapi.auth import BuildAuth', HEAVY),
+    'instrument': ('from simplegoogleapi.instrument import log', HEAVY),
+    'drive index': ('from simplegoogleapi.drive import DriveIndex, ChangeTracker', HEAVY),
+    'drive async': ('from simplegoogleapi.drive import AsyncSimpleDrive', HEAVY),
+    'drive': ('from simplegoogleapi.drive import SimpleDrive',
+              ['pydrive2', 'google_auth_oauthlib', 'requests', 'pandas', 'pyarrow', 'aiohttp']),
+    'drive transfer': ('from simplegoogleapi.drive import transfer_owner_bulk',
+                       ['pydrive2', 'google_auth_oauthlib', 'requests', 'pandas', 'pyarrow', 'aiohttp']),
+}
+
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+{statement}
+seconds = time.perf_counter() - started
+print(json.dumps({{'seconds': seconds, 'modules': sorted({{i.split('.')[0] for i in sys.modules}})}}))
+'''
+
+
+def measure(statement, number):
+    '''
+    :return: (list of seconds, top-level modules loaded by the statement)
+    '''
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([root, os.environ.get('PYTHONPATH', '')]).rstrip(os.pathsep))
+    times = []
+    modules = []
+    for i in range(number):
+        output = subprocess.run([sys.executable, '-c', PROBE.format(statement=statement)], env=env,
+                                capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        times.append(result['seconds'])
+        modules = result['modules']
+    return times, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import time of simplegoogleapi entry points')
+    parser.add_argument('--number', type=int, default=10, help='New interpreters per import')
+    parser.add_argument('--max-ms', type=float, default=None, help='Fail when the chat, auth or instrument '
+                                                                     'import median is slower')
+    parser.add_argument('--output', default=None, help='Save the results to this json file')
+    parser.add_argument('--compare', default=None, help='An older results json file')
+    args = parser.parse_args()
+
+    results = {}
+    failures = []
+    for name, (statement, forbidden) in SCENARIOS.items():
+        times, modules = measure(statement, args.number)
+        loaded = [i for i in forbidden if i in modules]
+        results[name] = {'statement': statement, 'median_ms': statistics.median(times) * 1000,
+                         'max_ms': max(times) * 1000, 'heavy_modules': [i for i in HEAVY if i in modules]}
+        print(f'{name:<24} median {results[name]["median_ms"]:>7.1f} ms  max {results[name]["max_ms"]:>7.1f} ms  '
+              f'{", ".join(results[name]["heavy_modules"])}')
+        if len(loaded) > 0:
+            failures.append(f'{statement} loads {", ".join(loaded)}')
+        if args.max_ms != None and name in ['chat', 'auth', 'instrument'] and \
+                results[name]['median_ms'] > args.max_ms:
+            failures.append(f'{statement} takes {results[name]["median_ms"]:.1f} ms (max {args.max_ms} ms)')
+
+    if args.output != None:
+        with open(args.output, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'imports': results}, f, indent=2)
+        print(f'Saved {args.output}')
+    if args.compare != None:
+        with open(args.compare) as f:
+            old = json.load(f)['imports']
+        for name, result in results.items():
+            if name in old:
+                print(f'{name:<24} {old[name]["median_ms"]:>7.1f} ms -> {result["median_ms"]:>7.1f} ms')
+    if len(failures) > 0:
+        print('\n'.join(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+'''
+Memory of a large listing, before (list_files: GoogleDriveFile objects with the full v2 metadata)
+and after (FileRecord with __slots__, FileColumns). No request is sent, fake files are used.
+
+python benchmarks/listing_memory.py 200000
+'''
+import gc
+import os
+import sys
+import tracemalloc
+
+from pydrive2.files import GoogleDriveFile
+
+# Run from a checkout without pip install, the package is in the parent directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simplegoogleapi.drive.records import FileColumns, record_type
+
+FIELDS = 'id, name, mimeType, parents, size, modifiedTime'
+
+
+def v2_metadata(i):
+    # The main keys files.list returns in v2 when no fields are given
+    return {
+        'kind': 'drive#file', 'id': f'1AbCdEfGhIjKlMnOpQrStUvWxYz{i:08d}', 'etag': f'"MTY5{i:012d}"',
+        'selfLink': f'https://www.googleapis.com/drive/v2/files/1AbCdEfGhIjKlMnOpQrStUvWxYz{i:08d}',
+        'webContentLink': f'https://drive.google.com/uc?id=1AbCdEfGhIjKlMnOpQrStUvWxYz{i:08d}&export=download',
+        'alternateLink': f'https://drive.google.com/file/d/1AbCdEfGhIjKlMnOpQrStUvWxYz{i:08d}/view?usp=drivesdk',
+        'embedLink': f'https://drive.google.com/file/d/1AbCdEfGhIjKlMnOpQrStUvWxYz{i:08d}/preview?usp=drivesdk',
+        'iconLink': 'https://drive-thirdparty.googleusercontent.com/16/type/text/csv',
+        'title': f'report_{i}.csv', 'mimeType': 'text/csv',
+        'labels': {'starred': False, 'hidden': False, 'trashed': False, 'restricted': False, 'viewed': True},
+        'copyRequiresWriterPermission': False, 'createdDate': '2026-01-01T00:00:00.000Z',
+        'modifiedDate': '2026-02-01T00:00:00.000Z', 'modifiedByMeDate': '2026-02-01T00:00:00.000Z',
+        'lastViewedByMeDate': '2026-02-01T00:00:00.000Z', 'markedViewedByMeDate': '1970-01-01T00:00:00.000Z',
+        'version': '3', 'parents': [{'kind': 'drive#parentReference', 'id': '0AbCdEfGhIjKlMnOpQrStUv',
+                                     'isRoot': False}],
+        'downloadUrl': f'https://www.googleapis.com/drive/v2/files/1AbCdEfGhIjKlMnOpQrStUvWxYz{i:08d}?alt=media',
+        'userPermission': {'kind': 'drive#permission', 'id': 'me', 'type': 'user', 'role': 'owner'},
+        'originalFilename': f'report_{i}.csv', 'fileExtension': 'csv', 'md5Checksum': f'{i:032x}',
+        'fileSize': str(1000 + i), 'quotaBytesUsed': str(1000 + i),
+        'ownerNames': ['Example'], 'owners': [{'kind': 'drive#user', 'displayName': 'Example',
+                                               'isAuthenticatedUser': True, 'permissionId': '0123456789',
+                                               'emailAddress': 'example@mail.com'}],
+        'lastModifyingUserName': 'Example', 'editable': True, 'copyable': True, 'writersCanShare': True,
+        'shared': False, 'explicitlyTrashed': False, 'appDataContents': False, 'headRevisionId': f'0B{i:020d}',
+        'spaces': ['drive'],
+    }
+
+
+def v3_file(i):
+    return {'id': f'1AbCdEfGhIjKlMnOpQrStUvWxYz{i:08d}', 'name': f'report_{i}.csv', 'mimeType': 'text/csv',
+            'parents': ['0AbCdEfGhIjKlMnOpQrStUv'], 'size': str(1000 + i),
+            'modifiedTime': '2026-02-01T00:00:00.000Z'}
+
+
+def measure(name, build, count):
+    gc.collect()
+    tracemalloc.start()
+    result = build(count)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{name}: {current / 1024 / 1024:.1f} MB kept, {current / count:.0f} bytes per file, '
+          f'peak {peak / 1024 / 1024:.1f} MB')
+    del result
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    record = record_type(FIELDS)
+    print(f'{count} files')
+    measure('before, list_files (GoogleDriveFile, v2 metadata)',
+            lambda n: [GoogleDriveFile(auth=None, metadata=v2_metadata(i), uploaded=True) for i in range(n)], count)
+    measure('v3 dicts with the same fields', lambda n: [v3_file(i) for i in range(n)], count)
+    measure('after, list_records (FileRecord)', lambda n: [record(v3_file(i)) for i in range(n)], count)
+
+    def columns(n):
+        result = FileColumns(FIELDS)
+        result.extend(v3_file(i) for i in range(n))
+        return result
+
+    measure('after, list_columns (FileColumns)', columns, count)
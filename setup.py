@@ -5,7 +5,7 @@ README = (Path(__file__).parent / "README.md").read_text()
 
 setup(
     name='simplegoogleapi',
-    version='0.1.2',
+    version='0.2.0',
     description='A simple way to work with Google API',
     long_description=README,
     long_description_content_type="text/markdown",
@@ -20,5 +20,11 @@ setup(
         'google-api-python-client',
         'oauth2client',
         'httplib2'
-    ]
+    ],
+    extras_require={
+        'async': ['aiohttp'],
+        'pandas': ['pandas'],
+        'parquet': ['pandas', 'pyarrow'],
+        'all': ['aiohttp', 'pandas', 'pyarrow']
+    }
 )
\ No newline at end of file
@@ -1,2 +1,10 @@
-from . import drive
-from . import auth
\ No newline at end of file
+import importlib
+
+__all__ = ['auth', 'chat', 'drive', 'instrument']
+
+
+def __getattr__(name):
+    # Subpackages are imported on first use, a job which only sends a Chat message does not load the Drive client
+    if name in __all__:
+        return importlib.import_module(f'.{name}', __name__)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
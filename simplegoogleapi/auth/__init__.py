@@ -1 +1,2 @@
-from .main import BuildAuth
\ No newline at end of file
+from .main import BuildAuth
+from .token_cache import TokenCache, FileTokenCache, SqliteTokenCache
\ No newline at end of file
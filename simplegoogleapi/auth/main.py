@@ -1,27 +1,27 @@
+import datetime
 import json
-import os
-import os.path
+import logging
 
-import requests
-from google.auth.transport.requests import Request
-from google.oauth2 import service_account
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from oauth2client.service_account import ServiceAccountCredentials
-from pydrive2.auth import GoogleAuth
+from ..instrument import log, measure
+from .token_cache import FileTokenCache
 
 
 class BuildAuth:
-    def __init__(self, client_secrets_file=None, credentials_file=None, service_account_json=None):
+    def __init__(self, client_secrets_file=None, credentials_file=None, service_account_json=None,
+                 token_cache=None, refresh_margin=300):
         '''
 
         :param client_secrets_file: client_secrets.json string
         :param credentials_file: credentials.json string
         :param service_account_json: service_account.json string or a dict
+        :param token_cache: Where credentials are kept, FileTokenCache() (the credentials_file itself) by default, or SqliteTokenCache()
+        :param refresh_margin: Seconds before expiry when a token is refreshed
         '''
         self.client_secrets_file = client_secrets_file
         self.credentials_file = credentials_file
         self.service_account_json = service_account_json
+        self.token_cache = token_cache if token_cache != None else FileTokenCache()
+        self.refresh_margin = refresh_margin
 
         self.drive_scopes = ["https://www.googleapis.com/auth/drive"]
         self.drive_documents_scopes = ['https://www.googleapis.com/auth/drive',
@@ -37,6 +37,75 @@ class BuildAuth:
             raise Exception('Please input a file path string or a dict')
         return service_account_json
 
+    def expiring(self, expiry):
+        '''
+
+        :param expiry: Token expiry, a naive UTC datetime or None
+        :return: True if the token expires within refresh_margin
+        '''
+        if expiry == None:
+            return False
+        margin = datetime.timedelta(seconds=self.refresh_margin)
+        return expiry - margin <= datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+    def refresh_creds_shared(self, credentials_file, scopes):
+        '''
+        Refresh creds once for every process: the first one refreshes and saves the token, the others load it.
+        The creds keep doing so when google-auth refreshes them later, see SharedCredentials.
+        :param credentials_file: Token cache key
+        :param scopes: drive_scopes or drive_documents_scopes
+        :return: creds
+        '''
+        from google.auth.transport.requests import Request
+        from .shared import SharedCredentials
+        creds = SharedCredentials.load(self.token_cache, credentials_file, scopes)
+        if not creds.valid or self.expiring(creds.expiry):
+            # The refresh takes the token cache lock, a token saved by another process in the meantime is used
+            measure('auth.refresh', lambda: creds.refresh(Request()))
+        return creds
+
+    def gauth_expiring(self, gauth):
+        '''
+
+        :param gauth: GoogleAuth
+        :return: True if the token has expired or expires within refresh_margin
+        '''
+        return gauth.access_token_expired or self.expiring(getattr(gauth.credentials, 'token_expiry', None))
+
+    def load_gauth_credentials(self, gauth, credentials_file):
+        '''
+        Same as gauth.LoadCredentialsFile but with the token cache. Every later refresh of gauth.credentials
+        goes through the token cache too, see TokenCacheStorage.
+        :param gauth: GoogleAuth
+        :param credentials_file: Token cache key
+        :return: No
+        '''
+        from .shared import TokenCacheStorage
+        gauth.credentials = TokenCacheStorage(self.token_cache, credentials_file).get()
+
+    def save_gauth_credentials(self, gauth, credentials_file):
+        '''
+        Same as gauth.SaveCredentialsFile but with the token cache (atomic replace)
+        :param gauth: GoogleAuth
+        :param credentials_file: Token cache key
+        :return: No
+        '''
+        self.token_cache.save(credentials_file, gauth.credentials.to_json())
+
+    def refresh_gauth_shared(self, gauth, credentials_file):
+        '''
+        Refresh gauth once for every process: the first one refreshes and saves the token, the others load it
+        :param gauth: GoogleAuth
+        :param credentials_file: Token cache key
+        :return: No
+        '''
+        self.load_gauth_credentials(gauth, credentials_file)
+        if self.gauth_expiring(gauth):
+            # The credentials store takes the token cache lock, uses a token saved by another process in the
+            # meantime, or refreshes and saves the new one
+            measure('auth.refresh', gauth.Refresh)
+        gauth.Authorize()
+
     def build_creds_from_service_account(self, scopes=None, service_account_json=None):
         '''
 
@@ -52,6 +121,7 @@ class BuildAuth:
 
         service_account_json = self.load_service_account(service_account_json)
 
+        from google.oauth2 import service_account
         creds = service_account.Credentials.from_service_account_info(service_account_json, scopes=scopes)
         return creds
 
@@ -72,22 +142,22 @@ class BuildAuth:
         if credentials_file == None:
             credentials_file = self.credentials_file
 
-        creds = None
+        from .shared import SharedCredentials
         # The file token.json stores the user's access and refresh tokens, and is
         # created automatically when the authorization flow completes for the first
         # time.
-        if os.path.exists(credentials_file):
-            creds = Credentials.from_authorized_user_file(credentials_file, scopes)
+        creds = SharedCredentials.load(self.token_cache, credentials_file, scopes)
+        # Refresh shortly before expiry, only one process does it
+        if creds and creds.refresh_token and (not creds.valid or self.expiring(creds.expiry)):
+            creds = self.refresh_creds_shared(credentials_file, scopes)
         # If there are no (valid) credentials available, let the user log in.
         if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(client_secrets_file, scopes)
-                creds = flow.run_local_server(port=0)
+            from google_auth_oauthlib.flow import InstalledAppFlow
+            flow = InstalledAppFlow.from_client_secrets_file(client_secrets_file, scopes)
+            creds = flow.run_local_server(port=0)
             # Save the credentials for the next run
-            with open(credentials_file, 'w') as token:
-                token.write(creds.to_json())
+            self.token_cache.save(credentials_file, creds.to_json())
+            creds = SharedCredentials.load(self.token_cache, credentials_file, scopes)
         return creds
 
     def build_gauth_from_service_account(self, service_account_json=None):
@@ -101,11 +171,30 @@ class BuildAuth:
 
         service_account_json = self.load_service_account(service_account_json)
 
+        from oauth2client.service_account import ServiceAccountCredentials
+        from pydrive2.auth import GoogleAuth
         gauth = GoogleAuth()
         scopes = self.drive_scopes
         gauth.credentials = ServiceAccountCredentials.from_json_keyfile_dict(service_account_json, scopes)
         return gauth
 
+    def build_gauth_pool(self, service_account_jsons):
+        '''
+        Use it with DrivePool to spread requests over many service accounts
+        :param service_account_jsons: A list of file strings or dict variables
+        :return: A list of gauth
+        '''
+        return [self.build_gauth_from_service_account(i) for i in service_account_jsons]
+
+    def build_creds_pool(self, service_account_jsons, scopes=None):
+        '''
+
+        :param service_account_jsons: A list of file strings or dict variables
+        :param scopes: drive_scopes or drive_documents_scopes
+        :return: A list of creds
+        '''
+        return [self.build_creds_from_service_account(scopes=scopes, service_account_json=i) for i in service_account_jsons]
+
     def build_gauth_from_client_secrets_manually(self, client_secrets_file=None, credentials_file=None):
         '''
         This method should be run on a desktop because it has manual steps (100%)
@@ -118,6 +207,7 @@ class BuildAuth:
         if credentials_file == None:
             credentials_file = self.credentials_file
 
+        from pydrive2.auth import GoogleAuth
         gauth = GoogleAuth()
         gauth.DEFAULT_SETTINGS['client_config_file'] = client_secrets_file
         gauth.GetFlow()
@@ -125,7 +215,7 @@ class BuildAuth:
         gauth.flow.params.update({'access_type': 'offline'})
         gauth.flow.params.update({'approval_prompt': 'force'})
         gauth.LocalWebserverAuth()
-        gauth.SaveCredentialsFile(credentials_file)
+        self.save_gauth_credentials(gauth, credentials_file)
 
         return gauth
 
@@ -143,22 +233,23 @@ class BuildAuth:
             credentials_file = self.credentials_file
 
         # https://stackoverflow.com/questions/46978784/pydrive-google-drive-automate-authentication
+        from pydrive2.auth import GoogleAuth
         gauth = GoogleAuth()
 
         gauth.DEFAULT_SETTINGS['client_config_file'] = client_secrets_file
 
         # Try to load saved credentials
-        gauth.LoadCredentialsFile(credentials_file)
+        self.load_gauth_credentials(gauth, credentials_file)
 
         # If the file does not exist -> Start new authentication
         if gauth.credentials is None:
             gauth = self.build_gauth_from_client_secrets_manually(client_secrets_file=client_secrets_file, credentials_file=credentials_file)
 
-        # If the file exist but token has expired -> Try to refresh. If it can not be refreshed -> Start new authentication
-        elif gauth.access_token_expired:
+        # If the file exist but token has expired (or will expire soon) -> Try to refresh. If it can not be refreshed -> Start new authentication
+        elif self.gauth_expiring(gauth):
             try:
-                # Refresh them if expired
-                gauth.Refresh()
+                # Refresh them if expired, the refreshed token is saved for the other processes
+                self.refresh_gauth_shared(gauth, credentials_file)
             except:
                 gauth = self.build_gauth_from_client_secrets_manually(client_secrets_file=client_secrets_file, credentials_file=credentials_file)
 
@@ -167,8 +258,6 @@ class BuildAuth:
             # Initialize the saved creds
             gauth.Authorize()
 
-        # Save the current credentials to a file
-        gauth.SaveCredentialsFile(credentials_file)
         return gauth
 
     def get_auth_from_raw(self, client_secrets_raw=None, credentials_raw=None, service_account_raw=None,
@@ -184,21 +273,22 @@ class BuildAuth:
         :param save_service_account_file: file string
         :return:
         '''
+        import requests
         if client_secrets_raw != None:
             client_secrets = requests.get(client_secrets_raw).text
             with open(save_client_secrets_file, 'w') as f:
                 f.write(client_secrets)
-            print('Client secrets has been saved')
+            log('Client secrets has been saved')
         if credentials_raw != None:
             credentials = requests.get(credentials_raw).text
             with open(save_credentials_file, 'w') as f:
                 f.write(credentials)
-            print('Credentials has been saved')
+            log('Credentials has been saved')
         if service_account_raw != None:
             sa = requests.get(service_account_raw).text
             with open(save_service_account_file, 'w') as f:
                 f.write(sa)
-            print('Service account has been saved')
+            log('Service account has been saved')
 
     def build_gauth_auto_anyway(self, client_secrets_file=None, credentials_file=None,
                                 credentials_raw=None, service_account_json=None):
@@ -222,80 +312,73 @@ class BuildAuth:
             if service_account_json != None:
                 service_account_json = self.load_service_account(service_account_json)
 
+        from pydrive2.auth import GoogleAuth
         gauth = GoogleAuth()
         gauth.DEFAULT_SETTINGS['client_config_file'] = client_secrets_file
 
         # Try to load saved credentials
-        gauth.LoadCredentialsFile(credentials_file)
+        self.load_gauth_credentials(gauth, credentials_file)
 
         if gauth.credentials is None:
-            print('No credentials file')
+            log('No credentials file')
             if credentials_raw != None:
-                print('Get credential from raw link')
+                log('Get credential from raw link')
                 self.get_auth_from_raw(credentials_raw=credentials_raw)
-                gauth.LoadCredentialsFile(credentials_file)
-                if gauth.access_token_expired:
-                    print('Get credential from raw link has expired, try to refresh')
+                self.load_gauth_credentials(gauth, credentials_file)
+                if self.gauth_expiring(gauth):
+                    log('Get credential from raw link has expired, try to refresh')
                     try:
                         # Refresh them if expired
-                        gauth.Refresh()
-                        gauth.Authorize()
-                        gauth.SaveCredentialsFile(credentials_file)
-                        print('Refresh success')
+                        self.refresh_gauth_shared(gauth, credentials_file)
+                        log('Refresh success')
                         return gauth
                     except:
-                        print('Can not refresh, build gauth from Service Account')
+                        log('Can not refresh, build gauth from Service Account', level=logging.WARNING)
                         gauth = self.build_gauth_from_service_account(service_account_json)
                         return gauth
                 else:
-                    print('Credentials from raw link is good')
+                    log('Credentials from raw link is good')
                     gauth.Authorize()
-                    gauth.LoadCredentialsFile(credentials_file)
                     return gauth
 
             elif service_account_json != None:
-                print('No credentials raw link, build gauth from Service Account')
+                log('No credentials raw link, build gauth from Service Account')
                 gauth = self.build_gauth_from_service_account(service_account_json)
                 return gauth
 
             else:
-                print('Build gauth fail: No file, No link, No service account')
+                log('Build gauth fail: No file, No link, No service account', level=logging.ERROR)
 
-        elif gauth.access_token_expired:
-            print('Get credential has expired, try to refresh')
+        elif self.gauth_expiring(gauth):
+            log('Get credential has expired, try to refresh')
             try:
                 # Refresh them if expired
-                gauth.Refresh()
-                gauth.Authorize()
-                gauth.SaveCredentialsFile(credentials_file)
-                print('Refresh success')
+                self.refresh_gauth_shared(gauth, credentials_file)
+                log('Refresh success')
                 return gauth
             except:
-                print('Can not refresh')
+                log('Can not refresh', level=logging.WARNING)
                 if credentials_raw != None:
-                    print('Get credentials from raw link')
+                    log('Get credentials from raw link')
                     self.get_auth_from_raw(credentials_raw=credentials_raw)
-                    gauth.LoadCredentialsFile(credentials_file)
-                    if gauth.access_token_expired:
-                        print('Credentials from raw link also expired, try to refresh')
+                    self.load_gauth_credentials(gauth, credentials_file)
+                    if self.gauth_expiring(gauth):
+                        log('Credentials from raw link also expired, try to refresh')
                         try:
                             # Refresh them if expired
-                            gauth.Refresh()
-                            gauth.Authorize()
-                            gauth.SaveCredentialsFile(credentials_file)
-                            print('Refresh success')
+                            self.refresh_gauth_shared(gauth, credentials_file)
+                            log('Refresh success')
                             return gauth
                         except:
-                            print('Can not refresh, build gauth from Service Account')
+                            log('Can not refresh, build gauth from Service Account', level=logging.WARNING)
                             gauth = self.build_gauth_from_service_account(service_account_json)
                             return gauth
 
                 elif service_account_json != None:
-                    print('No credentials raw link, build gauth from Service Account')
+                    log('No credentials raw link, build gauth from Service Account')
                     gauth = self.build_gauth_from_service_account(service_account_json)
                     return gauth
         else:
-            print('Credentials file is good')
+            log('Credentials file is good')
             gauth.Authorize()
-            gauth.LoadCredentialsFile(credentials_file)
             return gauth
@@ -0,0 +1,79 @@
+import json
+import threading
+
+from google.oauth2.credentials import Credentials
+from oauth2client.client import OAuth2Credentials, Storage
+
+
+class TokenCacheStorage(Storage):
+    def __init__(self, token_cache, key):
+        '''
+        oauth2client Storage backed by a TokenCache. Set on gauth.credentials, every refresh (also the automatic
+        ones after a 401 or an expiry) takes the token cache lock, uses a token another process has just saved,
+        or refreshes and saves the new one.
+        :param token_cache: A TokenCache
+        :param key: Token cache key, the credentials_file
+        '''
+        super().__init__()
+        self.token_cache = token_cache
+        self.key = key
+        self.held = threading.local()
+
+    def acquire_lock(self):
+        self.held.lock = self.token_cache.lock(self.key)
+        self.held.lock.__enter__()
+
+    def release_lock(self):
+        lock, self.held.lock = self.held.lock, None
+        lock.__exit__(None, None, None)
+
+    def locked_get(self):
+        data = self.token_cache.load(self.key)
+        if not data:
+            return None
+        credentials = OAuth2Credentials.from_json(data)
+        credentials.set_store(self)
+        return credentials
+
+    def locked_put(self, credentials):
+        self.token_cache.save(self.key, credentials.to_json())
+
+    def locked_delete(self):
+        pass
+
+
+class SharedCredentials(Credentials):
+    '''
+    google-auth user Credentials whose refresh goes through a TokenCache, like TokenCacheStorage for gauth.
+    Use SharedCredentials.load(token_cache, key, scopes).
+    '''
+
+    @classmethod
+    def load(cls, token_cache, key, scopes=None):
+        '''
+
+        :param token_cache: A TokenCache
+        :param key: Token cache key, the credentials_file
+        :param scopes: drive_scopes or drive_documents_scopes
+        :return: SharedCredentials or None if the cache has no token
+        '''
+        data = token_cache.load(key)
+        if not data:
+            return None
+        creds = cls.from_authorized_user_info(json.loads(data), scopes)
+        creds.token_cache = token_cache
+        creds.key = key
+        return creds
+
+    def refresh(self, request):
+        with self.token_cache.lock(self.key):
+            data = self.token_cache.load(self.key)
+            cached = Credentials.from_authorized_user_info(json.loads(data)) if data else None
+            if cached != None and cached.token != self.token and cached.valid:
+                # Another process has refreshed it
+                self.token = cached.token
+                self.expiry = cached.expiry
+                self._refresh_token = cached.refresh_token
+                return
+            super().refresh(request)
+            self.token_cache.save(self.key, self.to_json())
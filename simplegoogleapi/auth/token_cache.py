@@ -0,0 +1,154 @@
+import os
+import os.path
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def file_lock(lock_file):
+    '''
+    An exclusive lock shared by every process (and thread) on the machine
+    :param lock_file: string
+    '''
+    with open(lock_file, 'a+') as f:
+        if fcntl != None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.1)
+        try:
+            yield
+        finally:
+            if fcntl != None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class TokenCache(ABC):
+    '''
+    Where BuildAuth keeps credentials json. Subclass it to use another backend.
+    A key is the credentials_file given to BuildAuth.
+    '''
+
+    @abstractmethod
+    def load(self, key):
+        '''
+
+        :param key: string
+        :return: Credentials json string or None
+        '''
+
+    @abstractmethod
+    def save(self, key, data):
+        '''
+
+        :param key: string
+        :param data: Credentials json string
+        :return: No
+        '''
+
+    @abstractmethod
+    def lock(self, key):
+        '''
+        Only one process refreshes a token at a time, the others wait then load the new token
+        :param key: string
+        :return: A context manager
+        '''
+
+
+class FileTokenCache(TokenCache):
+    def __init__(self, directory=None):
+        '''
+
+        :param directory: Without directory, the key is the file path (the credentials_file itself). With directory, files are kept in it.
+        '''
+        self.directory = directory
+
+    def path(self, key):
+        if self.directory == None:
+            return key
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, os.path.basename(key))
+
+    def load(self, key):
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return f.read()
+
+    def save(self, key, data):
+        path = self.path(key)
+        temp_file = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_file, 'w') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, path)
+
+    def lock(self, key):
+        return file_lock(f'{self.path(key)}.lock')
+
+
+class SqliteTokenCache(TokenCache):
+    def __init__(self, database='tokens.sqlite'):
+        '''
+
+        :param database: SQLite file path, it can be shared by many processes
+        '''
+        self.database = database
+        self.local = threading.local()
+        self.execute('CREATE TABLE IF NOT EXISTS tokens (key TEXT PRIMARY KEY, data TEXT)', ())
+
+    def connect(self):
+        return sqlite3.connect(self.database, timeout=60)
+
+    def execute(self, sql, parameters):
+        # Inside lock() the locked connection has to be used, else the writes would wait for the lock itself
+        connection = getattr(self.local, 'connection', None)
+        if connection != None:
+            return connection.execute(sql, parameters).fetchone()
+        connection = self.connect()
+        try:
+            with connection:
+                return connection.execute(sql, parameters).fetchone()
+        finally:
+            connection.close()
+
+    def load(self, key):
+        row = self.execute('SELECT data FROM tokens WHERE key = ?', (key,))
+        return row[0] if row != None else None
+
+    def save(self, key, data):
+        self.execute('INSERT OR REPLACE INTO tokens (key, data) VALUES (?, ?)', (key, data))
+
+    @contextmanager
+    def lock(self, key):
+        connection = sqlite3.connect(self.database, timeout=60, isolation_level=None)
+        connection.execute('BEGIN IMMEDIATE')
+        self.local.connection = connection
+        try:
+            yield
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        finally:
+            self.local.connection = None
+            connection.close()
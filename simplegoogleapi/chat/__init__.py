@@ -1 +1 @@
-from .main import send_webhook_message
\ No newline at end of file
+from .main import send_webhook_message, WebhookClient, WebhookError
\ No newline at end of file
@@ -1,20 +1,228 @@
+import queue
+import random
+import threading
+import time
+from json import dumps, loads
+
 from httplib2 import Http
-from json import dumps
+
+from ..instrument import RequestEvent, get_instrument
+
+
+class WebhookError(Exception):
+    def __init__(self, status, content):
+        '''
+
+        :param status: HTTP status
+        :param content: Response body string
+        '''
+        self.status = status
+        self.content = content
+        super().__init__(f'Webhook message failed with status {status}: {content}')
+
+
+class WebhookClient:
+    def __init__(self, coalesce_window=0, background=False, max_message_length=4000, max_retries=5,
+                 queue_size=10000, on_error=None, max_connections=4):
+        '''
+        Send Google Chat webhook messages with a small pool of kept-alive connections per webhook URL.
+        With background=True (or a coalesce_window), send() puts the message in a queue and returns at once,
+        a background thread sends it.
+        :param coalesce_window: Seconds messages to the same webhook are collected and sent as one message
+        :param background: True = never block the caller
+        :param max_message_length: Background messages are joined or split to stay under this length
+        :param max_retries: Number of retries on 429 and 5xx
+        :param queue_size: Messages waiting in the background queue, send() blocks when it is full
+        :param on_error: A function called with (webhook, message, error) when a background message fails
+        :param max_connections: Connections per webhook URL, post() calls to the same webhook run at the same time
+                                up to this number
+        '''
+        self.coalesce_window = coalesce_window
+        self.background = background or coalesce_window > 0
+        self.max_message_length = max_message_length
+        self.max_retries = max_retries
+        self.on_error = on_error
+        self.max_connections = max_connections
+        self.errors = []
+        self.connections = {}
+        self.connections_lock = threading.Lock()
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.worker = None
+        self.stopping = object()
+
+    def _pool(self, webhook):
+        '''
+        :return: (idle Http objects, a semaphore of max_connections slots) of a webhook URL
+        '''
+        with self.connections_lock:
+            if webhook not in self.connections:
+                self.connections[webhook] = (queue.LifoQueue(), threading.BoundedSemaphore(self.max_connections))
+            return self.connections[webhook]
+
+    def post(self, webhook, body):
+        '''
+        Send a message body now, wait on 429 (Retry-After) and retry 5xx
+        :param webhook: Webhook URL
+        :param body: Message json, for example {'text': 'Hello'}
+        :return: Response json
+        '''
+        headers = {'Content-Type': 'application/json; charset=UTF-8'}
+        idle, slots = self._pool(webhook)
+        data = dumps(body)
+        instrument = get_instrument()
+        started = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            # httplib2 is not thread-safe, one request per Http object at a time
+            with slots:
+                try:
+                    http_obj = idle.get_nowait()
+                except queue.Empty:
+                    http_obj = Http()
+                try:
+                    response, content = http_obj.request(uri=webhook, method='POST', headers=headers, body=data)
+                finally:
+                    idle.put(http_obj)
+            received = len(content)
+            content = content.decode('utf-8', 'replace')
+            retry = (response.status == 429 or response.status >= 500) and attempt < self.max_retries
+            if instrument.enabled and not retry:
+                error = WebhookError(response.status, content) if response.status >= 300 else None
+                instrument.request(RequestEvent('chat.webhook.post', time.perf_counter() - started, response.status,
+                                                attempt, len(data), received, error))
+            if 200 <= response.status < 300:
+                return loads(content) if content else None
+            if retry:
+                retry_after = response.get('retry-after', '')
+                delay = min(64, 2 ** attempt) * (0.5 + random.random() / 2)
+                time.sleep(max(delay, int(retry_after)) if retry_after.isdigit() else delay)
+                continue
+            raise WebhookError(response.status, content)
+
+    def send(self, webhook, message):
+        '''
+
+        :param webhook: Webhook URL
+        :param message: string
+        :return: Response json, or None in background mode
+        '''
+        if not self.background:
+            return self.post(webhook, {'text': message})
+        self._start()
+        self.queue.put((webhook, message))
+
+    def _start(self):
+        with self.connections_lock:
+            if self.worker == None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self._run, daemon=True)
+                self.worker.start()
+
+    def _split(self, message):
+        '''
+        Cut a message longer than max_message_length, at the last line break if there is one
+        :return: A list of strings
+        '''
+        parts = []
+        while len(message) > self.max_message_length:
+            cut = message.rfind('\n', 0, self.max_message_length + 1)
+            if cut > 0:
+                parts.append(message[:cut])
+                message = message[cut + 1:]
+            else:
+                parts.append(message[:self.max_message_length])
+                message = message[self.max_message_length:]
+        parts.append(message)
+        return parts
+
+    def _join(self, messages):
+        texts = []
+        for message in [part for message in messages for part in self._split(message)]:
+            if len(texts) > 0 and len(texts[-1]) + 1 + len(message) <= self.max_message_length:
+                texts[-1] = f'{texts[-1]}\n{message}'
+            else:
+                texts.append(message)
+        return texts
+
+    def _run(self):
+        stop = False
+        while not stop:
+            item = self.queue.get()
+            items = [item]
+            if item is self.stopping:
+                stop = True
+            else:
+                deadline = time.monotonic() + self.coalesce_window
+                while self.coalesce_window > 0:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self.queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    items.append(item)
+                    if item is self.stopping:
+                        stop = True
+                        break
+
+            try:
+                pending = {}
+                for item in items:
+                    if item is not self.stopping:
+                        pending.setdefault(item[0], []).append(item[1])
+                for webhook, messages in pending.items():
+                    for text in self._join(messages):
+                        try:
+                            self.post(webhook, {'text': text})
+                        except Exception as error:
+                            self.errors.append((webhook, text, error))
+                            if self.on_error != None:
+                                try:
+                                    self.on_error(webhook, text, error)
+                                except Exception as callback_error:
+                                    self.errors.append((webhook, text, callback_error))
+            finally:
+                # flush() waits for these, they are done even if something above failed
+                for item in items:
+                    self.queue.task_done()
+
+    def flush(self):
+        '''
+        Wait until every queued message has been sent
+        :return: No
+        '''
+        self.queue.join()
+
+    def close(self):
+        '''
+        Send the queued messages and stop the background thread
+        :return: No
+        '''
+        if self.worker != None and self.worker.is_alive():
+            self.queue.put(self.stopping)
+            self.worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+_default_client = WebhookClient()
+
 
 def send_webhook_message(webhook, message):
-    body = {
-        'text': message
-    }
-    headers = {'Content-Type': 'application/json; charset=UTF-8'}
-    http_obj = Http()
-    response = http_obj.request(
-        uri=webhook,
-        method='POST',
-        headers=headers,
-        body=dumps(body),
-    )
+    '''
+
+    :param webhook: Webhook URL
+    :param message: string
+    :return: Response json, a WebhookError is raised if the status is not 2xx
+    '''
+    return _default_client.send(webhook, message)
+
 
 if __name__ == '__main__':
     message = 'Hello'
     webhook = 'https://chat.googleapis.com/v1/spaces/...'
-    # send_webhook_message(webhook=webhook, message=message)
\ No newline at end of file
+    # send_webhook_message(webhook=webhook, message=message)
@@ -1,2 +1,25 @@
-from .main import SimpleDrive
-from .help import transfer_owner_by_copy
\ No newline at end of file
+import importlib
+
+# Name: module, a module is imported the first time one of its names is used
+_exports = {
+    'SimpleDrive': '.main',
+    'DrivePool': '.pool',
+    'AsyncSimpleDrive': '.aio',
+    'ChangeTracker': '.changes',
+    'ChangeEvent': '.changes',
+    'DriveIndex': '.index',
+    'FileRecord': '.records',
+    'FileColumns': '.records',
+    'transfer_owner_by_copy': '.help',
+    'transfer_owner_bulk': '.help',
+}
+
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    if name in _exports:
+        value = getattr(importlib.import_module(_exports[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
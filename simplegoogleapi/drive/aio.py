@@ -0,0 +1,413 @@
+import asyncio
+import json
+import logging
+import os
+import os.path
+import random
+import time
+
+from ..instrument import RequestEvent, get_instrument, log
+from .batch import IDEMPOTENT_METHODS, RETRYABLE_REASONS, RETRYABLE_STATUS
+from .query import FOLDER_MIME_TYPE, build_query
+from .service import access_token
+
+# Same names as googleapiclient methodId, a '*' stands for an ID in the URL path
+OPERATIONS = {('GET', 'about'): 'drive.about.get', ('GET', 'files'): 'drive.files.list',
+              ('POST', 'files'): 'drive.files.create', ('GET', 'files/*'): 'drive.files.get',
+              ('PATCH', 'files/*'): 'drive.files.update', ('DELETE', 'files/*'): 'drive.files.delete',
+              ('POST', 'files/*/copy'): 'drive.files.copy', ('GET', 'files/*/permissions'): 'drive.permissions.list',
+              ('POST', 'files/*/permissions'): 'drive.permissions.create',
+              ('DELETE', 'files/*/permissions/*'): 'drive.permissions.delete'}
+
+
+class AsyncDriveError(Exception):
+    def __init__(self, status, content):
+        '''
+
+        :param status: HTTP status
+        :param content: Response body
+        '''
+        self.status = status
+        self.content = content
+        try:
+            error = json.loads(content)['error']
+            self.reason = error['errors'][0]['reason']
+            message = error.get('message', content)
+        except Exception:
+            self.reason = None
+            message = content
+        super().__init__(f'{status} {message}')
+
+    def retryable(self):
+        return self.status in RETRYABLE_STATUS or (self.status == 403 and self.reason in RETRYABLE_REASONS)
+
+
+def _transport_errors():
+    '''
+
+    :return: The exceptions raised when the connection failed before a response came back
+    '''
+    import aiohttp
+    return aiohttp.ClientError, asyncio.TimeoutError
+
+
+def _not_sent(error):
+    '''
+
+    :param error: A transport error
+    :return: True if the connection could not be opened, the request has not reached Drive
+    '''
+    import aiohttp
+    return isinstance(error, aiohttp.ClientConnectorError)
+
+
+class AsyncSimpleDrive:
+    def __init__(self, gauth=None, creds=None, max_connections=20, max_concurrency=20, max_retries=5,
+                 api_endpoint='https://www.googleapis.com'):
+        '''
+        SimpleDrive for asyncio, it needs aiohttp (pip install aiohttp).
+        async with AsyncSimpleDrive(gauth=gauth) as my_drive:
+            await my_drive.delete_file(file_id='your-file-id')
+        :param gauth: Use build gauth functions
+        :param creds: Or use build creds functions
+        :param max_connections: Keep-alive connections in the pool
+        :param max_concurrency: Number of requests in flight at the same time
+        :param max_retries: Number of retries on rate limit, server and connection errors
+        :param api_endpoint: string
+        '''
+        self.creds = creds if creds != None else gauth.credentials
+        self.max_connections = max_connections
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_retries = max_retries
+        self.api_url = f'{api_endpoint}/drive/v3'
+        self.upload_url = f'{api_endpoint}/upload/drive/v3/files'
+        self.session = None
+        self.token = None
+        self.token_lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        if self.session != None:
+            await self.session.close()
+            self.session = None
+
+    def _session(self):
+        if self.session == None:
+            import aiohttp
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
+
+    async def _token(self, refresh=False):
+        async with self.token_lock:
+            if self.token == None or refresh:
+                if refresh and hasattr(self.creds, 'get_access_token'):
+                    self.creds.access_token = None
+                elif refresh:
+                    self.creds.token = None
+                # Refreshing sends a blocking request, it runs in a thread
+                self.token = await asyncio.get_running_loop().run_in_executor(None, access_token, self.creds)
+            return self.token
+
+    async def _backoff(self, attempt, retry_after=''):
+        '''
+        Exponential backoff with jitter, Retry-After is used when it is longer
+        :param attempt: Number of retries so far
+        :param retry_after: Retry-After header string
+        '''
+        delay = min(64, 2 ** attempt) * (0.5 + random.random() / 2)
+        await asyncio.sleep(max(delay, int(retry_after)) if retry_after.isdigit() else delay)
+
+    def _operation(self, method, url):
+        if not url.startswith(self.api_url):
+            return 'drive.files.upload'
+        parts = [i for i in url[len(self.api_url):].split('?')[0].split('/') if i != '']
+        path = '/'.join('*' if index % 2 == 1 else part for index, part in enumerate(parts))
+        return OPERATIONS.get((method, path), f'{method} {path}')
+
+    async def request(self, method, url, params=None, body=None, data=None, headers=None, raw=False):
+        '''
+        Send a request with the pooled session, retry on rate limit, server and connection errors. A POST whose
+        response is lost is not sent again, Drive may have done it.
+        :param method: GET, POST, PATCH, PUT, DELETE
+        :param url: Full URL
+        :param params: Query parameters dict
+        :param body: JSON body
+        :param data: Raw body
+        :param headers: Extra headers
+        :param raw: True = return (status, headers, bytes) without checking the status, only a 401 is handled and
+                    connection errors are raised
+        :return: Response json
+        '''
+        params = {key: value for key, value in (params or {}).items() if value != None}
+        for key, value in params.items():
+            if isinstance(value, bool):
+                params[key] = 'true' if value else 'false'
+        instrument = get_instrument()
+        started = time.perf_counter()
+        sent = len(data) if data != None else len(json.dumps(body)) if body != None else 0
+        transport_errors = _transport_errors()
+        refreshed = False
+        attempt = 0
+        while True:
+            request_headers = {'Authorization': f'Bearer {await self._token()}', **(headers or {})}
+            try:
+                async with self.semaphore:
+                    async with self._session().request(method, url, params=params, json=body, data=data,
+                                                       headers=request_headers) as response:
+                        content = await response.read()
+                        status = response.status
+                        response_headers = response.headers
+            except transport_errors as error:
+                if raw or attempt >= self.max_retries or (method not in IDEMPOTENT_METHODS and not _not_sent(error)):
+                    if instrument.enabled:
+                        instrument.request(RequestEvent(self._operation(method, url), time.perf_counter() - started,
+                                                        None, attempt, sent, 0, error))
+                    raise
+                await self._backoff(attempt)
+                attempt += 1
+                continue
+            error = AsyncDriveError(status, content.decode('utf-8', 'replace')) if status >= 300 else None
+            again = error != None and ((status == 401 and not refreshed) or
+                                       (not raw and error.retryable() and attempt < self.max_retries))
+            if instrument.enabled and not again:
+                instrument.request(RequestEvent(self._operation(method, url), time.perf_counter() - started, status,
+                                                attempt, sent, len(content), error if not raw else None))
+            if status == 401 and not refreshed:
+                refreshed = True
+                await self._token(refresh=True)
+                continue
+            if raw:
+                return status, response_headers, content
+            if status < 300:
+                return json.loads(content) if len(content) > 0 else None
+            if not error.retryable() or attempt >= self.max_retries:
+                raise error
+            await self._backoff(attempt, response_headers.get('Retry-After', ''))
+            attempt += 1
+
+    async def create_folder(self, new_folder_name, parent_folder_id=None):
+        '''
+
+        :param new_folder_name: string
+        :param parent_folder_id: Without parent_folder_id new folder will be created in My Drive
+        :return: folder_id
+        '''
+        body = {'name': new_folder_name, 'mimeType': FOLDER_MIME_TYPE}
+        if parent_folder_id != None:
+            body['parents'] = [parent_folder_id]
+        file = await self.request('POST', f'{self.api_url}/files', params={'fields': 'id', 'supportsAllDrives': True},
+                                  body=body)
+        log(F'Folder has created with ID: "{file.get("id")}".')
+        return file.get('id')
+
+    async def upload_file(self, local_file, folder_id=None, rename=None, chunk_size=8 * 1024 * 1024):
+        '''
+        Resumable upload, only one chunk is kept in memory
+        :param local_file: Local file path
+        :param folder_id: Without folder_id, file will be uploaded to My Drive.
+        :param rename: Without rename, local_file will be used as file name.
+        :param chunk_size: Bytes per request, a multiple of 256 KB
+        :return: File information json
+        '''
+        name = rename if rename != None else os.path.split(local_file)[-1]
+        body = {'name': name}
+        if folder_id != None:
+            body['parents'] = [folder_id]
+        size = os.path.getsize(local_file)
+        status, headers, content = await self.request(
+            'POST', self.upload_url, params={'uploadType': 'resumable', 'supportsAllDrives': True},
+            body=body, headers={'X-Upload-Content-Length': str(size)}, raw=True)
+        if status >= 300:
+            raise AsyncDriveError(status, content.decode('utf-8', 'replace'))
+        session_uri = headers['Location']
+
+        loop = asyncio.get_running_loop()
+        transport_errors = _transport_errors()
+        file = None
+        offset = 0
+        attempt = 0
+        with open(local_file, 'rb') as f:
+            while file == None:
+                f.seek(offset)
+                data = await loop.run_in_executor(None, f.read, chunk_size)
+                end = offset + len(data) - 1
+                content_range = f'bytes {offset}-{end}/{size}' if len(data) > 0 else f'bytes */{size}'
+                try:
+                    status, headers, content = await self.request('PUT', session_uri, data=data, raw=True,
+                                                                  headers={'Content-Range': content_range})
+                except transport_errors:
+                    if attempt >= self.max_retries:
+                        raise
+                    # The response is lost, it is handled like a server error
+                    status, headers, content = None, {}, b''
+                if (status == None or status in RETRYABLE_STATUS) and attempt < self.max_retries:
+                    await self._backoff(attempt, headers.get('Retry-After', ''))
+                    attempt += 1
+                    # Part of the chunk may have been saved, the session tells where to resume
+                    try:
+                        status, headers, content = await self.request('PUT', session_uri, raw=True,
+                                                                      headers={'Content-Range': f'bytes */{size}'})
+                    except transport_errors:
+                        continue
+                    if status in RETRYABLE_STATUS:
+                        continue
+                if status in [200, 201]:
+                    file = json.loads(content)
+                elif status == 308:
+                    saved = int(headers['Range'].split('-')[1]) + 1 if 'Range' in headers else 0
+                    # max_retries counts failures in a row, the upload moving on starts again from 0
+                    attempt = 0 if saved > offset else attempt
+                    offset = saved
+                else:
+                    raise AsyncDriveError(status, content.decode('utf-8', 'replace'))
+        log(
+            f'Upload {local_file}{" as " + rename if rename != None else ""} to {"Drive folder " + folder_id if folder_id != None else "My Drive"} successfully!')
+        return file
+
+    async def check_usage(self):
+        '''
+
+        :return: A usage information json
+        '''
+        result = await self.request('GET', f'{self.api_url}/about', params={'fields': '*'})
+        return result.get('storageQuota', {})
+
+    async def iter_files(self, parent_id=None, mime_type=None, name_contains=None, owner_email=None,
+                         modified_after=None, modified_before=None, trashed=False, query=None,
+                         fields='id, name, mimeType, parents', page_size=1000, drive_id=None):
+        '''
+        Same as SimpleDrive.iter_files
+        async for file in my_drive.iter_files(parent_id='your-folder-id'):
+            ...
+        :return: An async generator of file information json
+        '''
+        params = {'fields': f'nextPageToken, files({fields})', 'pageSize': page_size,
+                  'supportsAllDrives': True, 'includeItemsFromAllDrives': True,
+                  'q': build_query(parent_id=parent_id, mime_type=mime_type, name_contains=name_contains,
+                                   owner_email=owner_email, modified_after=modified_after,
+                                   modified_before=modified_before, trashed=trashed, query=query)}
+        if drive_id != None:
+            params['corpora'] = 'drive'
+            params['driveId'] = drive_id
+        while True:
+            result = await self.request('GET', f'{self.api_url}/files', params=params)
+            for file in result.get('files', []):
+                yield file
+            params['pageToken'] = result.get('nextPageToken')
+            if params['pageToken'] == None:
+                break
+
+    async def list_files(self, title_contains=None, owner_email=None, **kwargs):
+        '''
+
+        :param title_contains: string
+        :param owner_email: Exactly email
+        :param kwargs: Other iter_files parameters
+        :return: A list of files
+        '''
+        return [file async for file in self.iter_files(name_contains=title_contains, owner_email=owner_email,
+                                                       **kwargs)]
+
+    async def delete_file(self, file_id):
+        '''
+
+        :param file_id: string
+        :return: No
+        '''
+        await self.request('DELETE', f'{self.api_url}/files/{file_id}', params={'supportsAllDrives': True})
+        log(f'{file_id} has been deleted!')
+
+    async def move_file(self, file_id, to_folder_id):
+        '''
+
+        :param file_id: string
+        :param to_folder_id: string
+        :return: File information json
+        '''
+        file = await self.request('GET', f'{self.api_url}/files/{file_id}',
+                                  params={'fields': 'id, name, parents', 'supportsAllDrives': True})
+        moved = await self.request('PATCH', f'{self.api_url}/files/{file_id}', body={},
+                                   params={'addParents': to_folder_id, 'removeParents': file['parents'][0],
+                                           'fields': 'id, name, parents, owners', 'supportsAllDrives': True})
+        log(f'{file["name"]} has been moved to folder {to_folder_id}!')
+        return moved
+
+    async def copy_file(self, file_id, same_name=True, prefix=None, suffix=None, to_folder_id=None):
+        '''
+        Same as SimpleDrive.copy_file
+        :return: New file information json
+        '''
+        old_file = await self.request('GET', f'{self.api_url}/files/{file_id}',
+                                      params={'fields': 'id, name, parents, owners', 'supportsAllDrives': True})
+        if same_name == True:
+            new_name = f'{str(prefix) + " " if prefix != None else ""}{old_file["name"]}{" " + str(suffix) if suffix != None else ""}'
+        else:
+            new_name = f'Copy of {old_file["name"]}'
+        body = {'name': new_name}
+        if to_folder_id != None:
+            body['parents'] = [to_folder_id]
+        copied = await self.request('POST', f'{self.api_url}/files/{file_id}/copy', body=body,
+                                    params={'fields': 'id, name, parents, owners', 'supportsAllDrives': True})
+        log(
+            f'{old_file["name"]} ({file_id}) has been copied to {body["name"]} ({copied["id"]}) {", folder " + to_folder_id if to_folder_id != None else ""}!')
+        return copied
+
+    async def rename_file(self, file_id, new_name):
+        '''
+
+        :param file_id: string
+        :param new_name: string
+        :return: New file information json
+        '''
+        result = await self.request('PATCH', f'{self.api_url}/files/{file_id}', body={'name': new_name},
+                                    params={'fields': 'id, name, parents, owners', 'supportsAllDrives': True})
+        log(f'{file_id} has been renamed to {new_name}!')
+        return result
+
+    async def add_permission(self, file_id, email, role='reader'):
+        '''
+
+        :param file_id: string
+        :param email: string
+        :param role: reader, commenter, writer
+        :return: No
+        '''
+        permission = {'type': 'user', 'role': role, 'emailAddress': email}
+        await self.request('POST', f'{self.api_url}/files/{file_id}/permissions', body=permission,
+                           params={'supportsAllDrives': True})
+        log(f'{email} has been added {role} permission to file_id {file_id}')
+
+    async def delete_permission(self, file_id, permission_id=None, email=None):
+        '''
+        You can input permission_id or email only, if you input both then permission_id will be used
+        :param file_id: string
+        :param permission_id: string
+        :param email: string
+        :return: No
+        '''
+        if permission_id == None and email == None:
+            raise Exception('Please input permission_id or email')
+        if permission_id == None:
+            params = {'fields': 'nextPageToken, permissions(id, emailAddress)', 'pageSize': 100,
+                      'supportsAllDrives': True}
+            found = []
+            # A file can have more than one page of permissions, the next page is read until the email is found
+            while True:
+                result = await self.request('GET', f'{self.api_url}/files/{file_id}/permissions', params=params)
+                found = [i['id'] for i in result.get('permissions', []) if i.get('emailAddress') == email]
+                params['pageToken'] = result.get('nextPageToken')
+                if len(found) > 0 or params['pageToken'] == None:
+                    break
+            if len(found) == 0:
+                log(f'{email} not in permissions for file_id {file_id}', level=logging.WARNING, file_id=file_id)
+                return
+            permission_id = found[0]
+        await self.request('DELETE', f'{self.api_url}/files/{file_id}/permissions/{permission_id}',
+                           params={'supportsAllDrives': True})
+        log(f'{email if email != None else "permission_id " + permission_id} has been removed from file_id {file_id}')
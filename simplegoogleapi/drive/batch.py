@@ -0,0 +1,308 @@
+import json
+import time
+
+from ..instrument import log
+from .query import FOLDER_MIME_TYPE
+
+RETRYABLE_STATUS = [429, 500, 502, 503, 504]
+RETRYABLE_REASONS = ['rateLimitExceeded', 'userRateLimitExceeded', 'backendError', 'internalError']
+# Sending one of them twice leaves Drive as sending it once (a Drive PATCH sets fields), a POST (create, copy...)
+# sent twice can make two files or permissions
+IDEMPOTENT_METHODS = ['GET', 'HEAD', 'PUT', 'PATCH', 'DELETE']
+
+
+def error_reason(error):
+    '''
+
+    :param error: HttpError
+    :return: The first reason string in the error body, for example userRateLimitExceeded
+    '''
+    try:
+        content = json.loads(error.content.decode('utf-8'))
+        return content['error']['errors'][0]['reason']
+    except Exception:
+        return None
+
+
+def is_retryable(error):
+    '''
+
+    :param error: An exception raised by an API call
+    :return: True if the same request can be sent again later
+    '''
+    # googleapiclient is imported here, AsyncSimpleDrive uses this module without it
+    from googleapiclient.errors import HttpError
+    if not isinstance(error, HttpError):
+        return False
+    status = error.resp.status
+    if status in RETRYABLE_STATUS:
+        return True
+    return status == 403 and error_reason(error) in RETRYABLE_REASONS
+
+
+class DriveBatch:
+    def __init__(self, simple_drive, max_per_request=100, max_retries=3):
+        '''
+        Queue mutations and send them through the Drive batch endpoint.
+        Use it with SimpleDrive.batch():
+
+        with my_drive.batch(max_per_request=100) as b:
+            b.delete_file(file_id='...')
+            b.rename_file(file_id='...', new_name='...')
+        print(b.results)
+
+        :param simple_drive: A SimpleDrive object
+        :param max_per_request: Number of calls per batch request, Drive accepts 100 at most
+        :param max_retries: Number of times failed calls (rate limit, 5xx) will be sent again
+        '''
+        self.simple_drive = simple_drive
+        self.max_per_request = max(1, min(max_per_request, 100))
+        self.max_retries = max_retries
+        self.queue = []
+        self.results = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type == None:
+            self.execute()
+        return False
+
+    def _add(self, operation, file_id, build=None, lookup=None):
+        item = {'operation': operation, 'file_id': file_id, 'build': build, 'lookup': lookup,
+                'result': None, 'error': None}
+        self.queue.append(item)
+        return item
+
+    def delete_file(self, file_id):
+        '''
+
+        :param file_id: string
+        :return: No
+        '''
+        self._add('delete_file', file_id,
+                  build=lambda service: service.files().delete(fileId=file_id))
+
+    def rename_file(self, file_id, new_name):
+        '''
+
+        :param file_id: string
+        :param new_name: string
+        :return: No
+        '''
+        body = {'name': new_name}
+        self._add('rename_file', file_id,
+                  build=lambda service: service.files().update(fileId=file_id, body=body,
+                                                               fields='id, name, parents, owners'))
+
+    def move_file(self, file_id, to_folder_id, remove_parents=None):
+        '''
+
+        :param file_id: string
+        :param to_folder_id: string
+        :param remove_parents: Current parent folder ID, it will be looked up (in a batch) if not provided
+        :return: No
+        '''
+        def build(service, remove_parents=remove_parents):
+            return service.files().update(fileId=file_id, addParents=to_folder_id, removeParents=remove_parents,
+                                          fields='id, name, parents, owners')
+
+        if remove_parents != None:
+            self._add('move_file', file_id, build=build)
+        else:
+            self._add('move_file', file_id, build=build, lookup='parents')
+
+    def copy_file(self, file_id, to_folder_id=None, name=None, fields='id, name, mimeType, parents'):
+        '''
+        The parent is set in the copy call itself, no update is needed
+        :param file_id: string
+        :param to_folder_id: None = same folder
+        :param name: None = same name
+        :param fields: Fields of the new file
+        :return: No
+        '''
+        body = {}
+        if to_folder_id != None:
+            body['parents'] = [to_folder_id]
+        if name != None:
+            body['name'] = name
+        self._add('copy_file', file_id,
+                  build=lambda service: service.files().copy(fileId=file_id, body=body, fields=fields,
+                                                             supportsAllDrives=True))
+
+    def create_folder(self, name, parent_folder_id=None):
+        '''
+
+        :param name: string
+        :param parent_folder_id: None = My Drive
+        :return: No
+        '''
+        body = {'name': name, 'mimeType': FOLDER_MIME_TYPE}
+        if parent_folder_id != None:
+            body['parents'] = [parent_folder_id]
+        self._add('create_folder', None,
+                  build=lambda service: service.files().create(body=body, fields='id, name, mimeType, parents',
+                                                               supportsAllDrives=True))
+
+    def add_permission(self, file_id, email, role='reader'):
+        '''
+
+        :param file_id: string
+        :param email: string
+        :param role: reader, commenter, writer
+        :return: No
+        '''
+        permission = {'type': 'user', 'role': role, 'emailAddress': email}
+        self._add('add_permission', file_id,
+                  build=lambda service: service.permissions().create(fileId=file_id, body=permission))
+
+    def update_permission(self, file_id, permission_id, role):
+        '''
+
+        :param file_id: string
+        :param permission_id: string
+        :param role: reader, commenter, writer
+        :return: No
+        '''
+        body = {'role': role}
+        self._add('update_permission', file_id,
+                  build=lambda service: service.permissions().update(fileId=file_id, permissionId=permission_id,
+                                                                     body=body))
+
+    def delete_permission(self, file_id, permission_id=None, email=None):
+        '''
+        You can input permission_id or email only, if you input both then permission_id will be used
+        :param file_id: string
+        :param permission_id: string
+        :param email: string, the permission ID will be looked up (in a batch)
+        :return: No
+        '''
+        def build(service, permission_id=permission_id):
+            return service.permissions().delete(fileId=file_id, permissionId=permission_id)
+
+        if permission_id != None:
+            self._add('delete_permission', file_id, build=build)
+        elif email != None:
+            self._add('delete_permission', file_id, build=build, lookup=('email', email))
+        else:
+            raise Exception('Please input permission_id or email')
+
+    def _permissions_page(self, file_id, page_token):
+        return lambda service: service.permissions().list(
+            fileId=file_id, fields='nextPageToken, permissions(id, emailAddress)', pageSize=100, pageToken=page_token)
+
+    def _resolve(self, items):
+        '''
+        Look up the values some calls need (current parents, permission IDs) with batched reads.
+        '''
+        lookups = []
+        for item in items:
+            if item['lookup'] == 'parents':
+                lookups.append({'target': item, 'result': None, 'error': None,
+                                'build': lambda service, file_id=item['file_id']: service.files().get(
+                                    fileId=file_id, fields='parents')})
+            elif item['lookup'] != None:
+                lookups.append({'target': item, 'result': None, 'error': None,
+                                'build': self._permissions_page(item['file_id'], None)})
+        pending = lookups
+        while len(pending) > 0:
+            self._run(pending)
+            # A file can have more than one page of permissions, the next page is read until the email is found
+            pending = []
+            for lookup in lookups:
+                item = lookup['target']
+                if item['lookup'] == 'parents' or lookup['error'] != None or \
+                        lookup['result'].get('nextPageToken') == None:
+                    continue
+                email = item['lookup'][1]
+                if not any(i.get('emailAddress') == email for i in lookup['result'].get('permissions', [])):
+                    lookup['build'] = self._permissions_page(item['file_id'], lookup['result']['nextPageToken'])
+                    pending.append(lookup)
+
+        for lookup in lookups:
+            item = lookup['target']
+            if lookup['error'] != None:
+                item['error'] = lookup['error']
+            elif item['lookup'] == 'parents':
+                parents = lookup['result'].get('parents', [])
+                remove_parents = parents[0] if len(parents) > 0 else None
+                item['build'] = lambda service, build=item['build'], value=remove_parents: build(service, value)
+            else:
+                email = item['lookup'][1]
+                found = [i['id'] for i in lookup['result'].get('permissions', []) if i.get('emailAddress') == email]
+                if len(found) == 0:
+                    item['error'] = Exception(f'{email} not in permissions for file_id {item["file_id"]}')
+                else:
+                    item['build'] = lambda service, build=item['build'], value=found[0]: build(service, value)
+
+    def _send(self, items):
+        from .scheduler import http_error, is_transport_error
+        scheduler = self.simple_drive.scheduler
+
+        def callback_for(item):
+            def callback(request_id, response, exception):
+                item['result'] = response
+                item['error'] = exception
+                if exception != None and error_reason(exception) in ['userRateLimitExceeded', 'rateLimitExceeded']:
+                    scheduler.throttled()
+            return callback
+
+        def send(service, chunk):
+            batch = service.new_batch_http_request()
+            for index, item in enumerate(chunk):
+                batch.add(item['build'](service), callback=callback_for(item), request_id=str(index))
+            batch.execute()
+
+        for start in range(0, len(items), self.max_per_request):
+            chunk = items[start:start + self.max_per_request]
+            # A batch whose response is lost is only sent again if every call in it can be sent twice
+            idempotent = all(item['build'](self.simple_drive.service).method in IDEMPOTENT_METHODS for item in chunk)
+            try:
+                # Every call in a batch counts against the quota
+                self.simple_drive._call_with_service(lambda service: send(service, chunk), tokens=len(chunk),
+                                                     operation='drive.batch', idempotent=idempotent)
+            except Exception as error:
+                if http_error(error) == None and not is_transport_error(error):
+                    raise
+                # The whole batch request failed, every call in it is marked with the same error
+                for item in chunk:
+                    item['error'] = error
+
+    def _run(self, items):
+        pending = items
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                time.sleep(self.simple_drive.scheduler.backoff(attempt - 1))
+            for item in pending:
+                item['result'] = None
+                item['error'] = None
+            self._send(pending)
+            pending = [i for i in pending if i['error'] != None and is_retryable(i['error'])]
+            if len(pending) == 0:
+                break
+
+    def execute(self):
+        '''
+        Send every queued call, it is called automatically at the end of the with block.
+        :return: A list of {'operation', 'file_id', 'result', 'error'} in the queued order
+        '''
+        items, self.queue = self.queue, []
+        self._resolve(items)
+        self._run([i for i in items if i['error'] == None])
+
+        for item in items:
+            if item['file_id'] != None:
+                self.simple_drive.invalidate(item['file_id'])
+            if item['error'] == None and item['operation'] == 'delete_file':
+                self.simple_drive._unindex_file(item['file_id'])
+            elif item['error'] == None and item['operation'] in ['rename_file', 'move_file', 'copy_file',
+                                                                   'create_folder']:
+                self.simple_drive._index_files([item['result']])
+
+        results = [{'operation': i['operation'], 'file_id': i['file_id'], 'result': i['result'], 'error': i['error']}
+                   for i in items]
+        self.results.extend(results)
+        failed = len([i for i in results if i['error'] != None])
+        log(f'Batch has finished: {len(results) - failed} succeeded, {failed} failed!')
+        return results
@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import OrderedDict
+
+# First item of every key, ('file', file_id) and ('permissions', file_id)
+KINDS = ['file', 'permissions']
+
+
+class MetadataCache:
+    def __init__(self, max_size=10000, ttl=60):
+        '''
+        LRU cache with a time to live for file metadata and permission lists
+        :param max_size: Number of entries kept, the least recently used entries are removed first
+        :param ttl: Seconds an entry is used before it is read again from Drive
+        '''
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, fields=None):
+        '''
+
+        :param key: A tuple like ('file', file_id)
+        :param fields: A list of field names which must be in the cached value
+        :return: The cached value or None
+        '''
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry != None and entry[0] < time.monotonic():
+                del self.entries[key]
+                entry = None
+            if entry == None or (fields != None and any(i not in entry[1] for i in fields)):
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, merge=False):
+        '''
+
+        :param key: A tuple like ('file', file_id)
+        :param value: A dict or a list
+        :param merge: Merge a dict value into the fields already cached
+        :return: No
+        '''
+        with self.lock:
+            entry = self.entries.get(key)
+            if merge and entry != None and entry[0] >= time.monotonic():
+                value = {**entry[1], **value}
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, file_id):
+        '''
+        Remove everything cached for a file
+        :param file_id: string
+        :return: No
+        '''
+        with self.lock:
+            for kind in KINDS:
+                self.entries.pop((kind, file_id), None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        '''
+
+        :return: {'hits', 'misses', 'size'}
+        '''
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries)}
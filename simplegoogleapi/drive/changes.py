@@ -0,0 +1,108 @@
+import datetime
+import email.utils
+from collections import namedtuple
+
+from .journal import JsonJournal
+
+ADDED = 'added'
+MODIFIED = 'modified'
+TRASHED = 'trashed'
+REMOVED = 'removed'
+
+ChangeEvent = namedtuple('ChangeEvent', ['kind', 'file_id', 'file', 'time'])
+
+
+def parse_time(value):
+    return datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+class ChangeTracker:
+    def __init__(self, simple_drive, state_file='drive_changes.json', drive_id=None,
+                 fields='id, name, mimeType, parents, trashed, createdTime, modifiedTime', page_size=1000):
+        '''
+        Follow changes with the Drive changes API, the page token is saved to state_file so polling continues
+        where it stopped after a restart.
+        tracker = ChangeTracker(my_drive)
+        for event in tracker.poll():
+            print(event.kind, event.file_id)
+        :param simple_drive: A SimpleDrive object
+        :param state_file: string
+        :param drive_id: Shared drive ID, without drive_id changes of My Drive and shared with me are followed
+        :param fields: Fields of each changed file, createdTime and trashed are needed for the event kind
+        :param page_size: Changes per page, 1000 at most
+        '''
+        self.simple_drive = simple_drive
+        self.journal = JsonJournal(state_file)
+        self.drive_id = drive_id
+        self.fields = fields
+        self.page_size = page_size
+
+    def reset(self):
+        '''
+        Start from now, changes before now are not returned
+        :return: The new page token
+        '''
+        param = {'supportsAllDrives': True}
+        if self.drive_id != None:
+            param['driveId'] = self.drive_id
+        response = {}
+        request = self.simple_drive.service.changes().getStartPageToken(**param)
+        request.add_response_callback(lambda resp: response.update(resp))
+        result = self.simple_drive.execute(request)
+        # createdTime is compared with Drive's clock, not with this computer's
+        if 'date' in response:
+            since = email.utils.parsedate_to_datetime(response['date']).isoformat()
+        else:
+            since = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        self.journal.update({'page_token': result['startPageToken'], 'since': since})
+        return result['startPageToken']
+
+    def _event(self, change, since):
+        if change.get('removed') or 'file' not in change:
+            return ChangeEvent(REMOVED, change.get('fileId'), None, change.get('time'))
+        file = change['file']
+        if file.get('trashed'):
+            kind = TRASHED
+        elif 'createdTime' in file and since != None and parse_time(file['createdTime']) > since:
+            kind = ADDED
+        else:
+            kind = MODIFIED
+        return ChangeEvent(kind, change.get('fileId'), file, change.get('time'))
+
+    def poll(self):
+        '''
+        The first poll only saves a start token. The token is saved after each page is consumed,
+        so an event can be returned again after a crash but it is never lost.
+        :return: A generator of ChangeEvent(kind, file_id, file, time), kind: added, modified, trashed, removed
+        '''
+        page_token = self.journal.get('page_token')
+        if page_token == None:
+            self.reset()
+            return
+        since = parse_time(self.journal.get('since')) if self.journal.get('since') != None else None
+        # Time of the last change returned, by Drive's clock. A file created after it is new for the next poll
+        latest = since
+
+        param = {'fields': f'nextPageToken, newStartPageToken, changes(changeType, removed, fileId, time, file({self.fields}))',
+                 'pageSize': self.page_size, 'includeRemoved': True, 'spaces': 'drive',
+                 'supportsAllDrives': True, 'includeItemsFromAllDrives': True}
+        if self.drive_id != None:
+            param['driveId'] = self.drive_id
+
+        while True:
+            result = self.simple_drive.execute(self.simple_drive.service.changes().list(pageToken=page_token, **param))
+            for change in result.get('changes', []):
+                if change.get('changeType', 'file') != 'file':
+                    continue
+                event = self._event(change, since)
+                if change.get('time') != None and (latest == None or parse_time(change['time']) > latest):
+                    latest = parse_time(change['time'])
+                if event.file_id != None:
+                    self.simple_drive.invalidate(event.file_id)
+                yield event
+            if 'newStartPageToken' in result:
+                self.journal.update({'page_token': result['newStartPageToken'],
+                                     'since': latest.isoformat() if latest != None else None})
+                break
+            page_token = result['nextPageToken']
+            self.journal.set('page_token', page_token)
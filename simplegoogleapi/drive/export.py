@@ -0,0 +1,194 @@
+import logging
+import os
+import os.path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseDownload
+
+from ..instrument import log
+from .batch import error_reason
+from .journal import JsonLinesJournal
+from .media import CHUNK_SIZE, safe_name
+from .service import access_token
+
+FIELDS = 'id, name, mimeType, modifiedTime'
+DOCUMENT = 'application/vnd.google-apps.document'
+SPREADSHEET = 'application/vnd.google-apps.spreadsheet'
+PRESENTATION = 'application/vnd.google-apps.presentation'
+PDF = 'application/pdf'
+XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CSV = 'text/csv'
+MIME_MAP = {DOCUMENT: PDF, SPREADSHEET: XLSX, PRESENTATION: PDF}
+EXTENSIONS = {PDF: 'pdf', XLSX: 'xlsx', CSV: 'csv', 'text/tab-separated-values': 'tsv', 'text/plain': 'txt',
+              'text/html': 'html', 'application/zip': 'zip', 'application/rtf': 'rtf', 'application/epub+zip': 'epub',
+              'text/markdown': 'md', 'image/png': 'png', 'image/jpeg': 'jpg', 'image/svg+xml': 'svg',
+              'application/vnd.openxmlformats-officedocument.wordprocessingml.document': 'docx',
+              'application/vnd.openxmlformats-officedocument.presentationml.presentation': 'pptx',
+              'application/vnd.oasis.opendocument.text': 'odt',
+              'application/vnd.oasis.opendocument.spreadsheet': 'ods',
+              'application/vnd.oasis.opendocument.presentation': 'odp',
+              'application/vnd.google-apps.script+json': 'json'}
+# files.export refuses larger documents, exportLinks do not have this limit
+SIZE_LIMIT_REASON = 'exportSizeLimitExceeded'
+
+
+def _targets(file, mime_map):
+    targets = mime_map.get(file['mimeType'], [])
+    return [targets] if isinstance(targets, str) else list(targets)
+
+
+def _local_name(name, mime_type):
+    return f'{safe_name(name)}.{EXTENSIONS.get(mime_type, mime_type.split("/")[-1])}'
+
+
+def _local_dir(dest_dir, directory):
+    '''
+    :param directory: A walk_tree path of Drive folder names, like 'a/b'
+    :return: The local directory, an Exception is raised if it is outside of dest_dir
+    '''
+    local_dir = os.path.join(dest_dir, *[safe_name(i) for i in directory.split('/') if i != ''])
+    root = os.path.realpath(dest_dir)
+    if os.path.commonpath([root, os.path.realpath(local_dir)]) != root:
+        raise Exception(f'{directory} is outside of {dest_dir}')
+    return local_dir
+
+
+def _export_media(simple_drive, file_id, mime_type, part_file):
+    request = simple_drive.worker_service().files().export_media(fileId=file_id, mimeType=mime_type)
+    with open(part_file, 'wb') as f:
+        downloader = MediaIoBaseDownload(f, request, chunksize=CHUNK_SIZE)
+        done = False
+        while not done:
+            status, done = simple_drive.scheduler.call(downloader.next_chunk, operation='drive.files.export')
+        return f.tell()
+
+
+def _export_link(simple_drive, file_id, mime_type, part_file):
+    import httplib2
+    import requests
+    links = simple_drive.execute(simple_drive.worker_service().files().get(
+        fileId=file_id, fields='exportLinks', supportsAllDrives=True)).get('exportLinks', {})
+    if mime_type not in links:
+        raise Exception(f'{file_id} can not be exported as {mime_type}')
+
+    def download():
+        headers = {'Authorization': f'Bearer {access_token(simple_drive.creds)}'}
+        with requests.get(links[mime_type], headers=headers, stream=True, timeout=300) as response:
+            if response.status_code >= 300:
+                # An HttpError is retried by the scheduler like the other requests
+                raise HttpError(httplib2.Response({'status': response.status_code}), response.content,
+                                uri=links[mime_type])
+            with open(part_file, 'wb') as f:
+                for data in response.iter_content(CHUNK_SIZE):
+                    f.write(data)
+                return f.tell()
+
+    return simple_drive.scheduler.call(download, operation='drive.files.exportLink')
+
+
+def export_one(simple_drive, file_id, mime_type, local_file):
+    '''
+    Export a Google Docs, Sheets or Slides file to a local file, through files.export, or through exportLinks when
+    the document is too large for files.export. The file is written to local_file.part then renamed.
+    :return: Number of bytes written
+    '''
+    part_file = f'{local_file}.part'
+    try:
+        size = _export_media(simple_drive, file_id, mime_type, part_file)
+    except HttpError as error:
+        if error.resp.status != 403 or error_reason(error) != SIZE_LIMIT_REASON:
+            raise
+        log(f'{file_id} is too large for files.export, use its export link', file_id=file_id)
+        size = _export_link(simple_drive, file_id, mime_type, part_file)
+    os.replace(part_file, local_file)
+    return size
+
+
+def export_many(simple_drive, file_ids=None, folder_id=None, mime_map=None, dest_dir='.', recursive=False,
+                journal_file=None, max_workers=8, progress=None):
+    '''
+    See SimpleDrive.export_many
+    '''
+    if (file_ids == None) == (folder_id == None):
+        raise Exception('Please input file_ids or folder_id')
+    mime_map = mime_map if mime_map != None else MIME_MAP
+    if journal_file == None:
+        journal_file = os.path.join(dest_dir, '.export_snapshot.jsonl')
+    journal = JsonLinesJournal(journal_file)
+    report = {'exported': 0, 'skipped': 0, 'failed': 0, 'bytes': 0, 'errors': [], 'files': {}}
+
+    def failed(file_id, mime_type, name, error):
+        report['failed'] += 1
+        report['errors'].append((file_id, mime_type, error))
+        log(f'Can not export {name} ({file_id}){" as " + mime_type if mime_type != None else ""}: {error}',
+            level=logging.WARNING, file_id=file_id)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        if folder_id != None:
+            if recursive:
+                files = [(os.path.dirname(path), file) for path, file in
+                         simple_drive.walk_tree(folder_id, fields=FIELDS, max_workers=max_workers)]
+            else:
+                files = [('', file) for file in simple_drive.iter_files(parent_id=folder_id, mime_type=list(mime_map),
+                                                                         fields=FIELDS)]
+        else:
+            files = []
+            futures = {executor.submit(simple_drive.get_file, i, fields=FIELDS): i for i in file_ids}
+            for future in as_completed(futures):
+                try:
+                    files.append(('', future.result()))
+                except Exception as error:
+                    # One bad ID does not stop the others
+                    failed(futures[future], None, futures[future], error)
+
+        # Local paths are chosen before the exports start, two files with the same name do not overwrite each other.
+        # Drive lists them in any order, they are sorted so each one keeps its local path from one snapshot to the next
+        files.sort(key=lambda i: (i[0], i[1]['name'], i[1]['id']))
+        jobs = []
+        claimed = set()
+        for directory, file in files:
+            if file_ids != None and len(_targets(file, mime_map)) == 0:
+                log(f'{file["name"]} ({file["id"]}) is a {file["mimeType"]} file, it is not in mime_map',
+                    level=logging.WARNING, file_id=file['id'])
+            try:
+                local_dir = _local_dir(dest_dir, directory)
+            except Exception as error:
+                for mime_type in _targets(file, mime_map):
+                    failed(file['id'], mime_type, file['name'], error)
+                continue
+            for mime_type in _targets(file, mime_map):
+                local_file = os.path.join(local_dir, _local_name(file['name'], mime_type))
+                if local_file in claimed:
+                    local_file = os.path.join(local_dir, _local_name(f'{file["name"]} ({file["id"]})', mime_type))
+                claimed.add(local_file)
+                jobs.append((file, mime_type, local_file))
+
+        def export(file, mime_type, local_file):
+            key = f'{file["id"]}:{mime_type}'
+            snapshot = journal.get(key)
+            if snapshot != None and snapshot['modifiedTime'] == file['modifiedTime'] \
+                    and snapshot['local_file'] == local_file and os.path.exists(local_file):
+                return 'skipped', 0
+            os.makedirs(os.path.dirname(os.path.abspath(local_file)), exist_ok=True)
+            size = export_one(simple_drive, file['id'], mime_type, local_file)
+            journal.set(key, {'modifiedTime': file['modifiedTime'], 'local_file': local_file})
+            return 'exported', size
+
+        futures = {executor.submit(export, *job): job for job in jobs}
+        for future in as_completed(futures):
+            file, mime_type, local_file = futures[future]
+            try:
+                status, size = future.result()
+                report[status] += 1
+                report['bytes'] += size
+                report['files'].setdefault(file['id'], []).append(local_file)
+            except Exception as error:
+                failed(file['id'], mime_type, file['name'], error)
+            if progress != None:
+                progress(dict(report))
+    journal.close()
+
+    log(f'Export {report["exported"]} files ({report["bytes"]} bytes) to {dest_dir}, {report["skipped"]} unchanged, '
+        f'{report["failed"]} failed')
+    return report
@@ -1,23 +1,184 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from ..instrument import log
 from .main import SimpleDrive
-from googleapiclient.discovery import build
-import pandas as pd
+from .pool import DrivePool
+from .journal import JsonLinesJournal
+from .query import FOLDER_MIME_TYPE
+from .scheduler import http_error, is_throttled
+
+SOURCE_PROPERTY = 'transferSource'
+SOURCE_FIELDS = 'id, name, mimeType, size, md5Checksum'
+COPY_FIELDS = 'id, name, mimeType, size, md5Checksum, parents, owners, trashed'
+
+
+def _simple_drive(gauth):
+    if isinstance(gauth, DrivePool):
+        return gauth.pooled_drive
+    return gauth if isinstance(gauth, SimpleDrive) else SimpleDrive(gauth)
+
+
+def verify_copy(source, copied):
+    '''
+    A copy is good when it is not trashed and its mimeType, size and md5Checksum are the same as the source.
+    Google Docs files have no size and md5Checksum, only mimeType is compared for them.
+    :param source: Source file information json
+    :param copied: Copied file information json
+    :return: True or False
+    '''
+    if copied.get('trashed'):
+        return False
+    return all(source.get(i) == copied.get(i) for i in ['mimeType', 'size', 'md5Checksum'])
+
 
 def transfer_owner_by_copy(gauth_from, gauth_to, file_id, same_name=True):
     '''
-    Copy the old file to a new file > Delete the old file
-    :param creds_from: Use build creds functions
-    :param creds_to: Use build creds functions
+    Copy the old file to a new file > Check the new file > Delete the old file
+    :param gauth_from: Use build gauth functions or a SimpleDrive object
+    :param gauth_to: Use build gauth functions or a SimpleDrive object
     :param file_id: ID in URL or use list_files function to get
     :return: New file information json
     '''
-    drive_from = SimpleDrive(gauth_from)
-    drive_to = SimpleDrive(gauth_to)
+    drive_from = _simple_drive(gauth_from)
+    drive_to = _simple_drive(gauth_to)
+    source = drive_from.get_file(file_id, fields=SOURCE_FIELDS)
     result = drive_to.copy_file(file_id=file_id, same_name=same_name)
+    copied = drive_to.execute(drive_to.service.files().get(fileId=result['id'], fields=COPY_FIELDS,
+                                                           supportsAllDrives=True))
+    if not verify_copy(source, copied):
+        raise Exception(f'Copy {result["id"]} of {file_id} does not match the source, the source is not deleted')
     result['deleted_file'] = file_id
     drive_from.delete_file(file_id=file_id)
     return result
 
 
+def _find_copy(drive_to, file_id):
+    # appProperties are written with the copy, so a copy made before a crash is found again
+    query = f"appProperties has {{ key='{SOURCE_PROPERTY}' and value='{file_id}' }}"
+    copies = list(drive_to.iter_files(query=query, fields=COPY_FIELDS, index=False))
+    return copies[0] if len(copies) > 0 else None
+
+
+def _copy(drive_to, file_id, body):
+    # Sent once: after a lost response or a server error Drive may have made the copy, the entry stays copying
+    # and the next run looks for it. A rate limit error is sent again, Drive has not copied anything.
+    max_retries = drive_to.scheduler.max_retries
+    for attempt in range(max_retries + 1):
+        request = drive_to.service.files().copy(fileId=file_id, body=body, fields=COPY_FIELDS, supportsAllDrives=True)
+        try:
+            return drive_to.execute(request, max_retries=0)
+        except Exception as error:
+            if not is_throttled(error) or attempt == max_retries:
+                raise
+            time.sleep(drive_to.scheduler.backoff(attempt, error))
+
+
+def _transfer_one(drive_from, drive_to, file_id, entry, to_folder_id, same_name, delete_source, journal):
+    if entry.get('source') == None:
+        source = drive_from.execute(drive_from.service.files().get(fileId=file_id, fields=SOURCE_FIELDS,
+                                                                   supportsAllDrives=True))
+        entry = dict(entry, source=source)
+    source = entry['source']
+
+    if entry['status'] in ['pending', 'copying']:
+        # Only a run which crashed during the copy can have left one behind, the others do not search for it
+        copied = _find_copy(drive_to, file_id) if entry['status'] == 'copying' else None
+        if copied == None:
+            entry = dict(entry, status='copying')
+            journal.set(file_id, entry)
+            body = {'name': source['name'] if same_name else f'Copy of {source["name"]}',
+                    'appProperties': {SOURCE_PROPERTY: file_id}}
+            if to_folder_id != None:
+                body['parents'] = [to_folder_id]
+            copied = _copy(drive_to, file_id, body)
+        entry = dict(entry, status='copied', copy_id=copied['id'])
+        journal.set(file_id, entry)
+
+    if entry['status'] == 'copied':
+        copied = drive_to.execute(drive_to.service.files().get(fileId=entry['copy_id'], fields=COPY_FIELDS,
+                                                               supportsAllDrives=True))
+        if not verify_copy(source, copied):
+            raise Exception(f'Copy {entry["copy_id"]} of {file_id} does not match the source')
+        entry = dict(entry, status='verified')
+        journal.set(file_id, entry)
+
+    if entry['status'] == 'verified' and delete_source:
+        try:
+            drive_from.execute(drive_from.service.files().delete(fileId=file_id, supportsAllDrives=True))
+        except Exception as error:
+            # Deleted by an earlier run which crashed before writing the journal
+            if http_error(error) == None or http_error(error).resp.status != 404:
+                raise
+        drive_from.invalidate(file_id)
+        entry = dict(entry, status='deleted')
+        journal.set(file_id, entry)
+    return entry
+
+
+def transfer_owner_bulk(gauth_from, gauth_to, file_ids=None, folder_id=None, to_folder_id=None, same_name=True,
+                        delete_source=True, journal_file='transfer_journal.jsonl', max_workers=8):
+    '''
+    Transfer many files by copy, each file goes through copying > copied > verified > source deleted and every
+    step is written to journal_file. Run it again after a crash: finished steps are skipped, and a copy made just
+    before the crash (the file is still copying) is found by its appProperties, so no file is copied twice.
+    report = transfer_owner_bulk(gauth_from, gauth_to, folder_id='your-folder-id', to_folder_id='new-folder-id')
+    :param gauth_from: Owner of the files, it deletes the sources. A gauth, a SimpleDrive or a DrivePool
+    :param gauth_to: New owner, it copies the files. A gauth, a SimpleDrive or a DrivePool
+    :param file_ids: A list of file IDs
+    :param folder_id: Or a folder, every file in its tree is transferred, the folder is listed once
+    :param to_folder_id: None = copies stay in the same folders, id string = copies go to this folder
+    :param same_name: True = same old name, False = Copy of ...
+    :param delete_source: False = stop after the copy is verified
+    :param journal_file: string
+    :param max_workers: Number of files transferred at the same time
+    :return: {'deleted', 'verified', 'skipped', 'failed', 'errors': [(file_id, error)]}
+    '''
+    if file_ids == None and folder_id == None:
+        raise Exception('file_ids or folder_id is required')
+    drive_from = _simple_drive(gauth_from)
+    drive_to = _simple_drive(gauth_to)
+    journal = JsonLinesJournal(journal_file)
+
+    try:
+        file_ids = list(file_ids) if file_ids != None else []
+        if folder_id != None:
+            listed = journal.get(f'folder:{folder_id}')
+            if listed == None:
+                listed = [file['id'] for path, file in
+                          drive_from.walk_tree(folder_id, fields='id, mimeType', index=False)
+                          if file['mimeType'] != FOLDER_MIME_TYPE]
+                journal.set(f'folder:{folder_id}', listed)
+            file_ids += [i for i in listed if i not in file_ids]
+
+        done = 'deleted' if delete_source else 'verified'
+        report = {'deleted': 0, 'verified': 0, 'skipped': 0, 'failed': 0, 'errors': []}
+        todo = []
+        for file_id in file_ids:
+            entry = journal.get(file_id, {'status': 'pending'})
+            if entry['status'] == done or entry['status'] == 'deleted':
+                report['skipped'] += 1
+            else:
+                todo.append((file_id, entry))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(_transfer_one, drive_from, drive_to, file_id, entry, to_folder_id,
+                                       same_name, delete_source, journal): file_id for file_id, entry in todo}
+            for future in as_completed(futures):
+                file_id = futures[future]
+                try:
+                    report[future.result()['status']] += 1
+                except Exception as error:
+                    report['failed'] += 1
+                    report['errors'].append((file_id, error))
+    finally:
+        journal.close()
+
+    log(f'Transfer: {report["deleted"]} deleted after copy, {report["verified"]} verified, '
+          f'{report["skipped"]} already done, {report["failed"]} failed')
+    return report
+
+
 # def add_permission(gauth, file_id, email, role='reader'):
 #     '''
 #     https://developers.google.com/drive/api/v3/reference/permissions/create
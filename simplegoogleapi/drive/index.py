@@ -0,0 +1,212 @@
+import sqlite3
+import threading
+
+from ..instrument import log
+from .query import FOLDER_MIME_TYPE, quote
+
+FIELDS = 'id, name, mimeType, parents, owners(emailAddress), modifiedTime, size, md5Checksum, trashed'
+COLUMNS = ['id', 'name', 'parent_id', 'mime_type', 'owner', 'modified_time', 'size', 'md5', 'trashed']
+
+
+class DriveIndex:
+    def __init__(self, database='drive_index.sqlite'):
+        '''
+        A local SQLite index of file and folder metadata, it is filled from listings (index_folder, iter_files)
+        and from the changes SimpleDrive makes. Lookups by path, name, parent, owner or mimeType send no request.
+        Many processes can share the same database file.
+        my_drive = SimpleDrive(gauth=gauth, index=DriveIndex('drive_index.sqlite'))
+        :param database: SQLite file path
+        '''
+        self.database = database
+        self.local = threading.local()
+        connection = self.connection()
+        with connection:
+            connection.execute('''CREATE TABLE IF NOT EXISTS files (
+                id TEXT PRIMARY KEY, name TEXT, parent_id TEXT, mime_type TEXT, owner TEXT,
+                modified_time TEXT, size INTEGER, md5 TEXT, trashed INTEGER)''')
+            connection.execute('CREATE INDEX IF NOT EXISTS files_parent_name ON files (parent_id, name)')
+            connection.execute('CREATE INDEX IF NOT EXISTS files_name ON files (name)')
+            connection.execute('CREATE INDEX IF NOT EXISTS files_owner ON files (owner)')
+            connection.execute('CREATE INDEX IF NOT EXISTS files_mime_type ON files (mime_type)')
+            connection.execute('CREATE TABLE IF NOT EXISTS aliases (alias TEXT PRIMARY KEY, id TEXT)')
+
+    def connection(self):
+        # sqlite3 connections can not be shared by threads
+        connection = getattr(self.local, 'connection', None)
+        if connection == None:
+            connection = sqlite3.connect(self.database, timeout=60)
+            self.local.connection = connection
+        return connection
+
+    def _row(self, file):
+        parents = file.get('parents')
+        owners = file.get('owners')
+        return (file['id'], file.get('name'), parents[0] if parents else None, file.get('mimeType'),
+                owners[0].get('emailAddress') if owners else None, file.get('modifiedTime'),
+                int(file['size']) if 'size' in file else None, file.get('md5Checksum'),
+                int(file['trashed']) if 'trashed' in file else None)
+
+    def add_many(self, files):
+        '''
+        Insert or update files, fields which are not in a file json keep their indexed value
+        :param files: A list of file information json, id is required
+        :return: No
+        '''
+        sql = f'''INSERT INTO files ({", ".join(COLUMNS)}) VALUES ({", ".join("?" for i in COLUMNS)})
+                  ON CONFLICT(id) DO UPDATE SET
+                  {", ".join(f"{i} = coalesce(excluded.{i}, {i})" for i in COLUMNS[1:])}'''
+        connection = self.connection()
+        with connection:
+            connection.executemany(sql, [self._row(file) for file in files if 'id' in file])
+
+    def add(self, file):
+        self.add_many([file])
+
+    def remove(self, file_id):
+        '''
+        Remove a file and everything indexed under it
+        :param file_id: string
+        :return: No
+        '''
+        connection = self.connection()
+        with connection:
+            connection.execute('''WITH RECURSIVE tree(id) AS (
+                                    SELECT ? UNION SELECT files.id FROM files JOIN tree ON files.parent_id = tree.id)
+                                  DELETE FROM files WHERE id IN tree''', (file_id,))
+
+    def get(self, file_id):
+        '''
+
+        :param file_id: string
+        :return: {id, name, parent_id, mime_type, owner, modified_time, size, md5, trashed} or None
+        '''
+        rows = self.connection().execute(f'SELECT {", ".join(COLUMNS)} FROM files WHERE id = ?', (file_id,)).fetchall()
+        return dict(zip(COLUMNS, rows[0])) if len(rows) > 0 else None
+
+    def find(self, name=None, name_contains=None, parent_id=None, owner=None, mime_type=None, include_trashed=False):
+        '''
+        Search the index, no request is sent
+        :param name: Exactly name
+        :param name_contains: string
+        :param parent_id: string
+        :param owner: Exactly email
+        :param mime_type: string
+        :param include_trashed: True = trashed files are returned too
+        :return: A list of {id, name, parent_id, mime_type, owner, modified_time, size, md5, trashed}
+        '''
+        filters = []
+        values = []
+        for column, value in [('name', name), ('parent_id', parent_id), ('owner', owner), ('mime_type', mime_type)]:
+            if value != None:
+                filters.append(f'{column} = ?')
+                values.append(value)
+        if name_contains != None:
+            filters.append('instr(name, ?) > 0')
+            values.append(name_contains)
+        if not include_trashed:
+            filters.append('coalesce(trashed, 0) = 0')
+        where = f'WHERE {" AND ".join(filters)}' if len(filters) > 0 else ''
+        rows = self.connection().execute(f'SELECT {", ".join(COLUMNS)} FROM files {where}', values).fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def root_id(self, simple_drive, alias='root'):
+        '''
+        Listings return the real ID of My Drive, not 'root'
+        :return: The real ID of an alias, it is asked to Drive once
+        '''
+        rows = self.connection().execute('SELECT id FROM aliases WHERE alias = ?', (alias,)).fetchall()
+        if len(rows) > 0:
+            return rows[0][0]
+        file = simple_drive.execute(simple_drive.service.files().get(fileId=alias, fields='id'))
+        connection = self.connection()
+        with connection:
+            connection.execute('INSERT OR REPLACE INTO aliases (alias, id) VALUES (?, ?)', (alias, file['id']))
+        return file['id']
+
+    def _child_folder(self, connection, parent_id, name):
+        rows = connection.execute('''SELECT id FROM files WHERE parent_id = ? AND name = ? AND mime_type = ?
+                                     AND coalesce(trashed, 0) = 0''', (parent_id, name, FOLDER_MIME_TYPE)).fetchall()
+        return rows[0][0] if len(rows) > 0 else None
+
+    def resolve_path(self, path, root_id):
+        '''
+        :param path: For example '/Reports/2026/10'
+        :param root_id: ID of the folder the path starts from
+        :return: Folder (or file) ID, or None if it is not in the index
+        '''
+        file_id = root_id
+        connection = self.connection()
+        for name in [i for i in path.split('/') if i != '']:
+            rows = connection.execute('''SELECT id FROM files WHERE parent_id = ? AND name = ?
+                                         AND coalesce(trashed, 0) = 0''', (file_id, name)).fetchall()
+            if len(rows) == 0:
+                return None
+            file_id = rows[0][0]
+        return file_id
+
+    def ensure_path(self, simple_drive, path, root_id):
+        '''
+        Same as mkdir -p. Each missing folder is looked up on Drive then created while the database is locked,
+        so workers (threads or processes) calling it at the same time never create duplicates.
+        :param simple_drive: A SimpleDrive object
+        :param path: For example '/Reports/2026/10'
+        :param root_id: ID of the folder the path starts from
+        :return: ID of the last folder
+        '''
+        folder_id = root_id
+        for name in [i for i in path.split('/') if i != '']:
+            found = self._child_folder(self.connection(), folder_id, name)
+            if found != None:
+                folder_id = found
+                continue
+
+            connection = sqlite3.connect(self.database, timeout=600, isolation_level=None)
+            try:
+                # BEGIN IMMEDIATE takes the write lock, the other workers wait here
+                connection.execute('BEGIN IMMEDIATE')
+                found = self._child_folder(connection, folder_id, name)
+                if found == None:
+                    query = f'name = {quote(name)}'
+                    existing = list(simple_drive.iter_files(parent_id=folder_id, mime_type=FOLDER_MIME_TYPE,
+                                                            query=query, fields=FIELDS, index=False))
+                    if len(existing) > 0:
+                        file = existing[0]
+                    else:
+                        body = {'name': name, 'mimeType': FOLDER_MIME_TYPE, 'parents': [folder_id]}
+                        file = simple_drive.execute(simple_drive.service.files().create(
+                            body=body, fields=FIELDS, supportsAllDrives=True))
+                        log(F'Folder has created with ID: "{file.get("id")}".')
+                    connection.execute(f'''INSERT OR REPLACE INTO files ({", ".join(COLUMNS)})
+                                           VALUES ({", ".join("?" for i in COLUMNS)})''', self._row(file))
+                    found = file['id']
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            finally:
+                connection.close()
+            folder_id = found
+        return folder_id
+
+    def index_folder(self, simple_drive, folder_id, recursive=True):
+        '''
+        Fill the index from a listing
+        :param simple_drive: A SimpleDrive object
+        :param folder_id: string
+        :param recursive: True = the whole tree
+        :return: Number of indexed files
+        '''
+        if recursive:
+            files = (file for path, file in simple_drive.walk_tree(folder_id, fields=FIELDS, index=False))
+        else:
+            files = simple_drive.iter_files(parent_id=folder_id, fields=FIELDS, index=False)
+        count = 0
+        batch = []
+        for file in files:
+            batch.append(file)
+            if len(batch) >= 1000:
+                self.add_many(batch)
+                count += len(batch)
+                batch = []
+        self.add_many(batch)
+        return count + len(batch)
@@ -0,0 +1,134 @@
+import json
+import os
+import os.path
+import threading
+
+
+class JsonJournal:
+    def __init__(self, journal_file):
+        '''
+        A small JSON key-value file, every change is written to a temporary file and then replaces
+        the old file, so a crash never leaves a half written journal.
+        :param journal_file: string
+        '''
+        self.journal_file = journal_file
+        self.lock = threading.Lock()
+        self.data = {}
+        if os.path.exists(journal_file):
+            with open(journal_file, 'r') as f:
+                self.data = json.load(f)
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.journal_file))
+        os.makedirs(directory, exist_ok=True)
+        temp_file = f'{self.journal_file}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump(self.data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.journal_file)
+
+    def get(self, key, default=None):
+        with self.lock:
+            return self.data.get(key, default)
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self._save()
+
+    def update(self, values):
+        with self.lock:
+            self.data.update(values)
+            self._save()
+
+    def delete(self, key):
+        with self.lock:
+            if key in self.data:
+                del self.data[key]
+                self._save()
+
+    def items(self):
+        with self.lock:
+            return list(self.data.items())
+
+
+class JsonLinesJournal:
+    def __init__(self, journal_file):
+        '''
+        Same as JsonJournal but every change is appended as one json line instead of rewriting the whole file,
+        use it when thousands of keys change one by one. The last value of a key wins, a line cut by a crash
+        is ignored.
+        :param journal_file: string
+        '''
+        self.journal_file = journal_file
+        self.lock = threading.Lock()
+        self.data = {}
+        if os.path.exists(journal_file):
+            with open(journal_file, 'r') as f:
+                for line in f:
+                    try:
+                        change = json.loads(line)
+                    except ValueError:
+                        continue
+                    if not isinstance(change, dict) or 'key' not in change:
+                        continue
+                    if change.get('deleted'):
+                        self.data.pop(change['key'], None)
+                    else:
+                        self.data[change['key']] = change['value']
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(journal_file)), exist_ok=True)
+        self.file = open(journal_file, 'a')
+        # A line cut by a crash must not glue to the next one
+        if self.file.tell() > 0:
+            self.file.write('\n')
+
+    def _append(self, *changes):
+        self.file.write(''.join(json.dumps(change) + '\n' for change in changes))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def get(self, key, default=None):
+        with self.lock:
+            return self.data.get(key, default)
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self._append({'key': key, 'value': value})
+
+    def update(self, values):
+        with self.lock:
+            self.data.update(values)
+            self._append(*[{'key': key, 'value': value} for key, value in values.items()])
+
+    def delete(self, key):
+        with self.lock:
+            if key in self.data:
+                del self.data[key]
+                self._append({'key': key, 'deleted': True})
+
+    def items(self):
+        with self.lock:
+            return list(self.data.items())
+
+    def replace(self, values):
+        '''
+        Replace every key with values and rewrite the file with only these lines
+        :param values: dict
+        :return: No
+        '''
+        with self.lock:
+            self.file.close()
+            temp_file = f'{self.journal_file}.{os.getpid()}.tmp'
+            with open(temp_file, 'w') as f:
+                f.write(''.join(json.dumps({'key': key, 'value': value}) + '\n' for key, value in values.items()))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_file, self.journal_file)
+            self.data = dict(values)
+            self.file = open(self.journal_file, 'a')
+
+    def close(self):
+        self.file.close()
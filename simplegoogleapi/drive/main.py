@@ -1,20 +1,205 @@
+import hashlib
+import json
+import logging
 import os
 import os.path
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from pydrive2.drive import GoogleDrive
+from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload
+
+from ..instrument import log
+from .batch import DriveBatch
+from .cache import MetadataCache
+from .export import export_many
+from .journal import JsonJournal
+from .media import MIME_TYPES, IterReader, MemoryReader, StreamUpload, dataframe_chunks, safe_name
+from .mirror import mirror_directory
+from .query import FOLDER_MIME_TYPE, build_query
+from .records import FileColumns, record_type, write_csv, write_parquet
+from .scheduler import RequestScheduler
+from .service import drive_service
+from .tree import copy_tree, move_tree
 
 
 class SimpleDrive:
-    def __init__(self, gauth):
+    def __init__(self, gauth, cache=False, cache_size=10000, cache_ttl=60, scheduler=None, index=None,
+                 api_endpoint=None):
         '''
 
         :param gauth: Use build gauth functions
+        :param cache: True = cache file metadata and permissions read by move_file, copy_file and delete_permission. False = always read from Drive
+        :param cache_size: Number of cached entries
+        :param cache_ttl: Seconds a cached entry is used
+        :param scheduler: A RequestScheduler (rate limit, retries), it can be shared by many SimpleDrive objects
+        :param index: A DriveIndex, it is filled from listings and from the changes SimpleDrive makes
+        :param api_endpoint: None = Google, or another server for the v3 requests, for example a local test server
         '''
+        self.gauth = gauth
         self.creds = gauth.credentials
-        self.service = build('drive', 'v3', credentials=self.creds)
-        self.drive = GoogleDrive(gauth)
+        self._drive = None
+        self.cache = MetadataCache(max_size=cache_size, ttl=cache_ttl) if cache else None
+        self.scheduler = scheduler if scheduler != None else RequestScheduler()
+        self.index = index
+        self.api_endpoint = api_endpoint
+
+    @property
+    def service(self):
+        '''
+        Drive v3 service, shared by every SimpleDrive with the same credentials (one per thread)
+        '''
+        return drive_service(self.creds, api_endpoint=self.api_endpoint)
+
+    @property
+    def drive(self):
+        '''
+        pydrive2 GoogleDrive, it is created the first time a pydrive2 based method is called
+        '''
+        if self._drive == None:
+            from pydrive2.drive import GoogleDrive
+            self._drive = GoogleDrive(self.gauth)
+        return self._drive
+
+    def worker_service(self):
+        '''
+        httplib2 is not thread-safe, each thread gets its own service (and HTTP client) with the same credentials
+        :return: A Drive v3 service for the current thread
+        '''
+        return self.service
+
+    def execute(self, request, max_retries=None):
+        '''
+        Send a request through the scheduler (rate limit, retries with backoff)
+        :param request: A googleapiclient HttpRequest
+        :param max_retries: None = max_retries of the scheduler, 0 = the request is sent once
+        :return: The response json
+        '''
+        return self.scheduler.execute(request, max_retries=max_retries)
+
+    def _call_with_service(self, function, **kwargs):
+        '''
+        Run a function which sends requests built with a service, DrivePool runs it with the next account
+        :param function: A function with the service as parameter
+        :param kwargs: RequestScheduler.call parameters
+        :return: The function result
+        '''
+        return self.scheduler.call(lambda: function(self.service), **kwargs)
+
+    def metrics(self):
+        '''
+
+        :return: Scheduler counters and current rate
+        '''
+        return self.scheduler.metrics()
+
+    def _index_files(self, files):
+        if self.index != None:
+            self.index.add_many(files)
+
+    def _unindex_file(self, file_id):
+        if self.index != None:
+            self.index.remove(file_id)
+
+    def _require_index(self):
+        if self.index == None:
+            raise Exception('Please create SimpleDrive with index=DriveIndex(...)')
+        return self.index
+
+    def ensure_path(self, path, root_id='root'):
+        '''
+        Same as mkdir -p, missing folders are created exactly once even if many workers call it at the same time
+        :param path: For example '/Reports/2026/10'
+        :param root_id: ID of the folder the path starts from, My Drive by default
+        :return: ID of the last folder
+        '''
+        index = self._require_index()
+        if root_id == 'root':
+            root_id = index.root_id(self)
+        return index.ensure_path(self, path, root_id)
+
+    def resolve_path(self, path, root_id='root'):
+        '''
+        Find a path in the index, no request is sent (except once to get the ID of My Drive)
+        :param path: For example '/Reports/2026/10/report.csv'
+        :param root_id: ID of the folder the path starts from, My Drive by default
+        :return: File ID or None
+        '''
+        index = self._require_index()
+        if root_id == 'root':
+            root_id = index.root_id(self)
+        return index.resolve_path(path, root_id)
+
+    def cache_stats(self):
+        '''
+
+        :return: {'hits', 'misses', 'size'} of the metadata cache
+        '''
+        return self.cache.stats() if self.cache != None else {'hits': 0, 'misses': 0, 'size': 0}
+
+    def invalidate(self, file_id):
+        '''
+        Remove a file from the metadata cache, SimpleDrive does it itself after its own changes
+        :param file_id: string
+        :return: No
+        '''
+        if self.cache != None:
+            self.cache.invalidate(file_id)
+
+    def get_file(self, file_id, fields='id, name, parents, owners'):
+        '''
+
+        :param file_id: string
+        :param fields: Fields separated by commas
+        :return: File information json, from the metadata cache if possible
+        '''
+        names = [i.strip() for i in fields.split(',')]
+        if self.cache != None:
+            file = self.cache.get(('file', file_id), names)
+            if file != None:
+                return file
+        file = self.execute(self.service.files().get(fileId=file_id, fields=fields, supportsAllDrives=True))
+        if self.cache != None:
+            self.cache.set(('file', file_id), file, merge=True)
+        return file
+
+    def list_permissions(self, file_id):
+        '''
+
+        :param file_id: string
+        :return: A list of {'id', 'emailAddress', 'role', 'type'}, from the metadata cache if possible
+        '''
+        if self.cache != None:
+            permissions = self.cache.get(('permissions', file_id))
+            if permissions != None:
+                return permissions
+        permissions = []
+        page_token = None
+        while True:
+            result = self.execute(self.service.permissions().list(
+                fileId=file_id, pageToken=page_token, supportsAllDrives=True,
+                fields='nextPageToken, permissions(id, emailAddress, role, type)'))
+            permissions.extend(result.get('permissions', []))
+            page_token = result.get('nextPageToken')
+            if page_token == None:
+                break
+        if self.cache != None:
+            self.cache.set(('permissions', file_id), permissions)
+        return permissions
+
+    def batch(self, max_per_request=100, max_retries=3):
+        '''
+        Send delete_file, rename_file, move_file, copy_file, create_folder, add_permission and delete_permission
+        calls in batches
+        with my_drive.batch(max_per_request=100) as b:
+            b.delete_file(file_id='your-file-id')
+        :param max_per_request: Number of calls per batch request, Drive accepts 100 at most
+        :param max_retries: Number of times failed calls (rate limit, 5xx) will be sent again
+        :return: A DriveBatch object, results are in b.results after the with block
+        '''
+        return DriveBatch(self, max_per_request=max_per_request, max_retries=max_retries)
 
     def create_folder(self, new_folder_name, parent_folder_id=None):
         '''
@@ -25,27 +210,27 @@ class SimpleDrive:
         :return: folder_id
         '''
 
-        try:
-            if parent_folder_id != None:
-                file_metadata = {
-                    'name': new_folder_name,
-                    'mimeType': 'application/vnd.google-apps.folder',
-                    'parents': [parent_folder_id]
-                }
-            else:
-                file_metadata = {
-                    'name': new_folder_name,
-                    'mimeType': 'application/vnd.google-apps.folder'
-                }
+        if parent_folder_id != None:
+            file_metadata = {
+                'name': new_folder_name,
+                'mimeType': 'application/vnd.google-apps.folder',
+                'parents': [parent_folder_id]
+            }
+        else:
+            file_metadata = {
+                'name': new_folder_name,
+                'mimeType': 'application/vnd.google-apps.folder'
+            }
 
-                # pylint: disable=maybe-no-member
-            file = self.service.files().create(body=file_metadata, fields='id'
-                                               ).execute()
-            print(F'Folder has created with ID: "{file.get("id")}".')
+        try:
+            # pylint: disable=maybe-no-member
+            file = self.execute(self.service.files().create(body=file_metadata, fields='id, name, mimeType, parents'))
+            self._index_files([file])
+            log(F'Folder has created with ID: "{file.get("id")}".')
 
         except HttpError as error:
-            print(F'An error occurred: {error}')
-            file = None
+            log(F'An error occurred: {error}', level=logging.WARNING)
+            return None
 
         return file.get('id')
 
@@ -65,17 +250,362 @@ class SimpleDrive:
         file = self.drive.CreateFile({'title': title, 'parents': parents})
 
         file.SetContentFile(local_file)
-        file.Upload()
-        print(
+        self.scheduler.call(file.Upload, operation='pydrive.files.upload', idempotent=False)
+        log(
             f'Upload {local_file}{" as " + rename if rename != None else ""} to {"Drive folder " + folder_id if folder_id != None else "My Drive"} successfully!')
 
+    def _next_chunk(self, request):
+        response = {}
+
+        def send():
+            before = request.resumable_progress
+            status, file = request.next_chunk()
+            after = status.resumable_progress if status != None else int(file.get('size', before))
+            response['bytes_sent'] = after - before
+            return status, file
+
+        return self.scheduler.call(send, operation='drive.files.upload', response=response)
+
+    def _send_media(self, service, media, body, file_id=None):
+        fields = 'id, name, mimeType, parents, size, md5Checksum'
+        if file_id != None:
+            # New content for an existing file
+            request = service.files().update(fileId=file_id, media_body=media, supportsAllDrives=True, fields=fields)
+        else:
+            request = service.files().create(body=body, media_body=media, fields=fields, supportsAllDrives=True)
+        if media.resumable():
+            file = None
+            while file == None:
+                status, file = self._next_chunk(request)
+        else:
+            file = self.execute(request)
+        self._index_files([file])
+        return file
+
+    def _upload_one(self, service, local_file, folder_id=None, rename=None, chunk_size=5 * 1024 * 1024, file_id=None):
+        name = rename if rename != None else os.path.split(local_file)[-1]
+        body = {'name': name}
+        if folder_id != None:
+            body['parents'] = [folder_id]
+        size = os.path.getsize(local_file)
+        # Small files are sent in one request, large files in chunks
+        media = MediaFileUpload(local_file, chunksize=chunk_size, resumable=size > chunk_size)
+        return self._send_media(service, media, body, file_id=file_id), size
+
+    def upload_stream(self, stream, name, folder_id=None, mime_type='application/octet-stream',
+                      chunk_size=8 * 1024 * 1024, file_id=None):
+        '''
+        Upload from a readable binary file object (an open file, BytesIO, a pipe, a response body...), nothing is
+        written to disk. Seekable streams are uploaded from their start. Other streams are read chunk by chunk,
+        only the current chunk is kept in memory.
+        :param stream: A readable binary file object
+        :param name: File name on Drive
+        :param folder_id: Without folder_id, file will be uploaded to My Drive.
+        :param mime_type: string
+        :param chunk_size: A multiple of 256 KB
+        :param file_id: Upload new content to this file instead of creating a file
+        :return: File information json
+        '''
+        body = {'name': name, 'mimeType': mime_type}
+        if folder_id != None:
+            body['parents'] = [folder_id]
+        seekable = getattr(stream, 'seekable', lambda: False)()
+        if seekable:
+            media = MediaIoBaseUpload(stream, mimetype=mime_type, chunksize=chunk_size, resumable=True)
+        else:
+            media = StreamUpload(stream, mimetype=mime_type, chunksize=chunk_size)
+        file = self._send_media(self.service, media, body, file_id=file_id)
+        log(f'Upload {name} to {"Drive folder " + folder_id if folder_id != None else "My Drive"} successfully!')
+        return file
+
+    def upload_bytes(self, data, name, folder_id=None, mime_type='application/octet-stream',
+                     chunk_size=8 * 1024 * 1024, file_id=None):
+        '''
+        Upload bytes, bytearray or memoryview without copying them, chunks are sliced from the buffer
+        my_drive.upload_bytes(report.encode(), name='report.csv', mime_type='text/csv')
+        :param data: bytes-like object
+        :param name: File name on Drive
+        :param folder_id: Without folder_id, file will be uploaded to My Drive.
+        :param mime_type: string
+        :param chunk_size: A multiple of 256 KB
+        :param file_id: Upload new content to this file instead of creating a file
+        :return: File information json
+        '''
+        return self.upload_stream(MemoryReader(data), name, folder_id=folder_id, mime_type=mime_type,
+                                  chunk_size=chunk_size, file_id=file_id)
+
+    def upload_dataframe(self, df, name, folder_id=None, file_format='csv', rows_per_chunk=100000,
+                         chunk_size=8 * 1024 * 1024, file_id=None, **kwargs):
+        '''
+        Upload a pandas DataFrame as CSV or Parquet. The frame is serialized slice by slice straight into a
+        resumable upload, the whole file is never in memory or on disk.
+        my_drive.upload_dataframe(df, name='report.parquet', file_format='parquet')
+        :param df: A pandas DataFrame
+        :param name: File name on Drive
+        :param folder_id: Without folder_id, file will be uploaded to My Drive.
+        :param file_format: 'csv' or 'parquet' (it needs pyarrow)
+        :param rows_per_chunk: Rows serialized at a time
+        :param chunk_size: A multiple of 256 KB
+        :param file_id: Upload new content to this file instead of creating a file
+        :param kwargs: Passed to DataFrame.to_csv or pyarrow.parquet.ParquetWriter
+        :return: File information json
+        '''
+        chunks = dataframe_chunks(df, file_format=file_format, rows_per_chunk=rows_per_chunk, **kwargs)
+        return self.upload_stream(IterReader(chunks), name, folder_id=folder_id, mime_type=MIME_TYPES[file_format],
+                                  chunk_size=chunk_size, file_id=file_id)
+
+    def upload_many(self, local_files, folder_id=None, max_workers=8, progress=None):
+        '''
+        Upload many files at the same time, each worker has its own HTTP client
+        :param local_files: A list of local file paths
+        :param folder_id: Without folder_id, files will be uploaded to My Drive.
+        :param max_workers: Number of files uploaded at the same time
+        :param progress: A function called with the result of each file when it is done
+        :return: {'results': [{'local_file', 'file_id', 'bytes', 'seconds', 'error'}], 'files', 'failed', 'bytes', 'seconds', 'bytes_per_second'}
+        '''
+        def upload(local_file):
+            started = time.perf_counter()
+            result = {'local_file': local_file, 'file_id': None, 'bytes': 0, 'seconds': 0, 'error': None}
+            try:
+                file, size = self._upload_one(self.worker_service(), local_file, folder_id=folder_id)
+                result['file_id'] = file.get('id')
+                result['bytes'] = size
+            except Exception as error:
+                result['error'] = error
+            result['seconds'] = time.perf_counter() - started
+            return result
+
+        started = time.perf_counter()
+        results = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(upload, local_file) for local_file in local_files]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if progress != None:
+                    progress(result)
+
+        seconds = time.perf_counter() - started
+        total_bytes = sum(i['bytes'] for i in results)
+        failed = len([i for i in results if i['error'] != None])
+        summary = {'results': results, 'files': len(results), 'failed': failed, 'bytes': total_bytes,
+                   'seconds': seconds, 'bytes_per_second': total_bytes / seconds if seconds > 0 else 0}
+        log(f'Upload {len(results) - failed}/{len(results)} files ({total_bytes} bytes) in {seconds:.1f}s, '
+              f'{summary["bytes_per_second"] / 1024 / 1024:.2f} MB/s')
+        return summary
+
+    def _resumable_status(self, request, session_uri, size):
+        '''
+        Ask Drive how many bytes of an upload session have been committed
+        :return: An offset, the file information json if the upload has finished, or None if the session has expired
+        '''
+        headers = {'Content-Length': '0', 'Content-Range': f'bytes */{size}'}
+        resp, content = self.scheduler.call(lambda: request.http.request(session_uri, 'PUT', headers=headers),
+                                            operation='drive.files.upload.status')
+        if resp.status in [200, 201]:
+            return json.loads(content.decode('utf-8'))
+        if resp.status == 308:
+            if 'range' in resp:
+                return int(resp['range'].split('-')[1]) + 1
+            return 0
+        if resp.status in [404, 410]:
+            return None
+        raise HttpError(resp, content, uri=session_uri)
+
+    def upload_file_resumable(self, local_file, folder_id=None, rename=None, chunk_size=8 * 1024 * 1024,
+                              journal_file='upload_journal.json'):
+        '''
+        Upload a large file in chunks, only one chunk is kept in memory.
+        The upload session is saved to journal_file, run it again after an interruption to continue from the last committed byte.
+        :param local_file: Local file path
+        :param folder_id: Without folder_id, file will be uploaded to My Drive.
+        :param rename: Without rename, local_file will be used as file name.
+        :param chunk_size: Bytes per request, it is rounded up to a multiple of 256 KB
+        :param journal_file: string
+        :return: File information json
+        '''
+        chunk_size = max(1, -(-chunk_size // (256 * 1024))) * 256 * 1024
+        name = rename if rename != None else os.path.split(local_file)[-1]
+        body = {'name': name}
+        if folder_id != None:
+            body['parents'] = [folder_id]
+
+        stat = os.stat(local_file)
+        key = f'{os.path.abspath(local_file)}|{stat.st_size}|{stat.st_mtime_ns}|{folder_id}|{name}'
+        journal = JsonJournal(journal_file)
+
+        media = MediaFileUpload(local_file, chunksize=chunk_size, resumable=True)
+        request = self.service.files().create(body=body, media_body=media,
+                                              fields='id, name, mimeType, parents, size, md5Checksum',
+                                              supportsAllDrives=True)
+
+        file = None
+        saved = journal.get(key)
+        if saved != None:
+            status = self._resumable_status(request, saved['session_uri'], stat.st_size)
+            if isinstance(status, dict):
+                file = status
+            elif status != None:
+                request.resumable_uri = saved['session_uri']
+                request.resumable_progress = status
+                log(f'Resume {local_file} from byte {status}')
+
+        while file == None:
+            status, file = self._next_chunk(request)
+            if file == None:
+                journal.set(key, {'session_uri': request.resumable_uri, 'offset': request.resumable_progress})
+
+        journal.delete(key)
+        self._index_files([file])
+        log(
+            f'Upload {local_file}{" as " + rename if rename != None else ""} to {"Drive folder " + folder_id if folder_id != None else "My Drive"} successfully!')
+        return file
+
+    def _download_meta(self, file_id):
+        meta = self.execute(self.service.files().get(fileId=file_id, fields='id, name, size, md5Checksum, mimeType',
+                                                     supportsAllDrives=True))
+        if 'size' not in meta:
+            raise Exception(f'{meta["name"]} ({file_id}) is a {meta["mimeType"]} file, it can not be downloaded directly')
+        meta['size'] = int(meta['size'])
+        return meta
+
+    def _download_range(self, file_id, start, end):
+        request = self.worker_service().files().get_media(fileId=file_id, supportsAllDrives=True)
+        request.headers['Range'] = f'bytes={start}-{end}'
+        return self.execute(request)
+
+    def iter_download(self, file_id, chunk_size=8 * 1024 * 1024, max_workers=4, verify=True):
+        '''
+        Download a file as chunks of bytes, the next chunks are fetched in parallel while you use the current one
+        for chunk in my_drive.iter_download(file_id='your-file-id'):
+            ...
+        :param file_id: string
+        :param chunk_size: Bytes per chunk
+        :param max_workers: Number of chunks fetched at the same time
+        :param verify: Check md5Checksum at the end
+        :return: A generator of bytes
+        '''
+        meta = self._download_meta(file_id)
+        md5 = hashlib.md5()
+        offsets = iter(range(0, meta['size'], chunk_size))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            def submit():
+                start = next(offsets, None)
+                if start != None:
+                    end = min(start + chunk_size, meta['size']) - 1
+                    futures.append(executor.submit(self._download_range, file_id, start, end))
+
+            futures = deque()
+            for i in range(max_workers):
+                submit()
+            while len(futures) > 0:
+                data = futures.popleft().result()
+                submit()
+                if verify:
+                    md5.update(data)
+                yield data
+
+        if verify and meta.get('md5Checksum') != None and md5.hexdigest() != meta['md5Checksum']:
+            raise Exception(f'md5Checksum of {meta["name"]} ({file_id}) does not match')
+
+    def download_file(self, file_id, local_file=None, chunk_size=16 * 1024 * 1024, max_workers=8, verify=True):
+        '''
+        Download byte ranges in parallel into a preallocated file.
+        Chunks are written to local_file.part, run it again after an interruption to download the missing chunks only.
+        :param file_id: string
+        :param local_file: Local file path, without local_file the Drive file name will be used in the current
+                           directory ('/' is replaced with '_')
+        :param chunk_size: Bytes per range request
+        :param max_workers: Number of ranges downloaded at the same time
+        :param verify: Check md5Checksum before the file is moved to local_file
+        :return: Local file path
+        '''
+        meta = self._download_meta(file_id)
+        if local_file == None:
+            # A Drive name is not a path, '../x' or 'a/b' must not leave the current directory
+            local_file = safe_name(meta['name'])
+        part_file = f'{local_file}.part'
+        journal_file = f'{part_file}.json'
+
+        journal = JsonJournal(journal_file)
+        if journal.get('md5Checksum') != meta.get('md5Checksum') or journal.get('size') != meta['size'] \
+                or not os.path.exists(part_file):
+            journal.update({'md5Checksum': meta.get('md5Checksum'), 'size': meta['size'], 'done': []})
+            with open(part_file, 'wb') as f:
+                f.truncate(meta['size'])
+
+        done = set(journal.get('done'))
+        starts = [i for i in range(0, meta['size'], chunk_size) if i not in done]
+        if len(done) > 0:
+            log(f'Resume {local_file}, {len(starts)} chunks left')
+
+        fd = os.open(part_file, os.O_RDWR | getattr(os, 'O_BINARY', 0))
+        write_lock = threading.Lock()
+
+        def download(start):
+            data = self._download_range(file_id, start, min(start + chunk_size, meta['size']) - 1)
+            if hasattr(os, 'pwrite'):
+                os.pwrite(fd, data, start)
+            else:
+                with write_lock:
+                    os.lseek(fd, start, os.SEEK_SET)
+                    os.write(fd, data)
+            return start
+
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for future in as_completed([executor.submit(download, start) for start in starts]):
+                    done.add(future.result())
+                    journal.set('done', sorted(done))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+        if verify and meta.get('md5Checksum') != None:
+            md5 = hashlib.md5()
+            with open(part_file, 'rb') as f:
+                for data in iter(lambda: f.read(1024 * 1024), b''):
+                    md5.update(data)
+            if md5.hexdigest() != meta['md5Checksum']:
+                os.remove(part_file)
+                os.remove(journal_file)
+                raise Exception(f'md5Checksum of {meta["name"]} ({file_id}) does not match, please download again')
+
+        os.replace(part_file, local_file)
+        os.remove(journal_file)
+        log(f'Download {meta["name"]} ({file_id}) to {local_file} successfully!')
+        return local_file
+
+    def export_many(self, file_ids=None, folder_id=None, mime_map=None, dest_dir='.', recursive=False,
+                    journal_file=None, max_workers=8, progress=None):
+        '''
+        Snapshot Google Docs, Sheets and Slides to local files, exports run at the same time within the scheduler
+        quota. Files whose modifiedTime has not changed since the last snapshot are skipped. Documents too large
+        for files.export are downloaded from their exportLinks.
+        :param file_ids: A list of file IDs, or use folder_id
+        :param folder_id: Export the Google files of this folder
+        :param mime_map: {Google mime type: export mime type or a list of them}, Docs and Slides to PDF and
+                         Sheets to XLSX by default. For example {'application/vnd.google-apps.spreadsheet': 'text/csv'}
+        :param dest_dir: Local directory
+        :param recursive: True = export the subfolders of folder_id too, in local subdirectories
+        :param journal_file: Snapshot state, dest_dir/.export_snapshot.jsonl by default
+        :param max_workers: Number of exports at the same time
+        :param progress: A function called with the report after each export
+        :return: {'exported', 'skipped', 'failed', 'bytes', 'errors': [(file_id, mime_type, error)],
+                  'files': {file_id: [local files]}}, mime_type is None when the file could not be read
+        '''
+        return export_many(self, file_ids=file_ids, folder_id=folder_id, mime_map=mime_map, dest_dir=dest_dir,
+                           recursive=recursive, journal_file=journal_file, max_workers=max_workers,
+                           progress=progress)
+
     def check_usage(self):
         '''
 
         :param creds: Use build creds functions
         :return: A usage information json
         '''
-        result = self.service.about().get(fields="*").execute()
+        result = self.execute(self.service.about().get(fields="*"))
         result = result.get("storageQuota", {})
         return result
 
@@ -85,7 +615,7 @@ class SimpleDrive:
         :param gauth: Use build gauth functions
         :param title_contains: string
         :param owner_email: Exactly email
-        :return: A list of files, you can use Pandas to convert it to a data frame
+        :return: A list of files, for large listings use list_columns or export_listing
         '''
         # https://stackoverflow.com/questions/56857760/list-of-files-in-a-google-drive-folder-with-python
         # https://stackoverflow.com/questions/61242051/google-drive-api-list-files-based-on-owners-in-shared-drive#comment108382909_61245232
@@ -101,9 +631,144 @@ class SimpleDrive:
 
         param = {'q': ' and '.join(filters)} if len(filters) > 0 else None
 
-        listed = self.drive.ListFile(param=param).GetList()
+        listed = self.scheduler.call(lambda: self.drive.ListFile(param=param).GetList(),
+                                     operation='pydrive.files.list')
         return listed
 
+    def iter_files(self, parent_id=None, mime_type=None, name_contains=None, owner_email=None,
+                   modified_after=None, modified_before=None, trashed=False, query=None,
+                   fields='id, name, mimeType, parents', page_size=1000, drive_id=None, index=True):
+        '''
+        Stream files page by page with the v3 API, filters are sent to Drive in the q parameter
+        for file in my_drive.iter_files(parent_id='your-folder-id', fields='id, name, size'):
+            ...
+        :param parent_id: Only files directly in this folder
+        :param mime_type: A mime type string or a list of them
+        :param name_contains: string
+        :param owner_email: Exactly email
+        :param modified_after: datetime or RFC 3339 string
+        :param modified_before: datetime or RFC 3339 string
+        :param trashed: True, False or None (both)
+        :param query: Extra raw query string
+        :param fields: Fields of each file, the less fields the faster
+        :param page_size: Files per page, 1000 at most
+        :param drive_id: Shared drive ID, without drive_id files of My Drive and shared with me are listed
+        :param index: False = do not add the listed files to the DriveIndex
+        :return: A generator of file information json
+        '''
+        q = build_query(parent_id=parent_id, mime_type=mime_type, name_contains=name_contains,
+                        owner_email=owner_email, modified_after=modified_after,
+                        modified_before=modified_before, trashed=trashed, query=query)
+        param = {'fields': f'nextPageToken, files({fields})', 'pageSize': page_size,
+                 'supportsAllDrives': True, 'includeItemsFromAllDrives': True}
+        if q != None:
+            param['q'] = q
+        if drive_id != None:
+            param['corpora'] = 'drive'
+            param['driveId'] = drive_id
+
+        page_token = None
+        while True:
+            result = self.execute(self.service.files().list(pageToken=page_token, **param))
+            if index:
+                self._index_files(result.get('files', []))
+            for file in result.get('files', []):
+                yield file
+            page_token = result.get('nextPageToken')
+            if page_token == None:
+                break
+
+    def walk_tree(self, folder_id, fields='id, name, mimeType, parents', max_workers=8, index=True):
+        '''
+        List a folder tree breadth-first, the folders of a level are listed at the same time
+        for path, file in my_drive.walk_tree(folder_id='your-folder-id'):
+            ...
+        :param folder_id: string
+        :param fields: Fields of each file, id, name and mimeType are always included
+        :param max_workers: Number of folders listed at the same time
+        :param index: False = do not add the listed files to the DriveIndex
+        :return: A generator of (path, file information json), path is relative to folder_id, for example 'a/b/c.csv'
+        '''
+        names = [i.strip() for i in fields.split(',')]
+        fields = ', '.join(names + [i for i in ['id', 'name', 'mimeType'] if i not in names])
+        level = [('', folder_id)]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while len(level) > 0:
+                listed = executor.map(
+                    lambda folder: list(self.iter_files(parent_id=folder[1], fields=fields, index=index)), level)
+                next_level = []
+                for (path, parent_id), files in zip(level, listed):
+                    for file in files:
+                        file_path = f'{path}/{file["name"]}' if path != '' else file['name']
+                        if file['mimeType'] == FOLDER_MIME_TYPE:
+                            next_level.append((file_path, file['id']))
+                        yield file_path, file
+                level = next_level
+
+    def list_records(self, fields='id, name, mimeType, parents', **filters):
+        '''
+        Same as iter_files but each file is a compact FileRecord with __slots__, it uses a few times less memory
+        than a dict when hundreds of thousands of files are kept
+        for record in my_drive.list_records(parent_id='your-folder-id', fields='id, name, size'):
+            print(record.id, record.size)
+        :param fields: Fields of each file, size is converted to int
+        :param filters: Same filters as iter_files
+        :return: A generator of FileRecord
+        '''
+        record = record_type(fields)
+        for file in self.iter_files(fields=fields, **filters):
+            yield record(file)
+
+    def list_columns(self, fields='id, name, mimeType, parents', **filters):
+        '''
+        List files into columns, one list per field instead of one dict per file
+        df = my_drive.list_columns(owner_email='example@mail.com', fields='id, name, size').to_pandas()
+        :param fields: Fields of each file
+        :param filters: Same filters as iter_files
+        :return: FileColumns, use to_pandas() or to_arrow()
+        '''
+        columns = FileColumns(fields)
+        columns.extend(self.iter_files(fields=fields, **filters))
+        return columns
+
+    def export_listing(self, path, fields='id, name, mimeType, parents', file_format=None, chunk_size=10000,
+                       **filters):
+        '''
+        Write a listing to a CSV or Parquet file while pages are streamed, the whole listing is never in memory
+        :param path: File path
+        :param fields: Fields of each file, one column per field, nested fields are written as json
+        :param file_format: 'csv' or 'parquet', by default it comes from the path extension. Parquet needs pyarrow.
+        :param chunk_size: Files kept in memory before they are written
+        :param filters: Same filters as iter_files
+        :return: Number of written files
+        '''
+        if file_format == None:
+            file_format = 'parquet' if path.lower().endswith(('.parquet', '.pq')) else 'csv'
+        if file_format not in ['csv', 'parquet']:
+            raise Exception(f'file_format must be csv or parquet, not {file_format}')
+        files = self.iter_files(fields=fields, **filters)
+        write = write_parquet if file_format == 'parquet' else write_csv
+        count = write(files, path, fields, chunk_size=chunk_size)
+        log(f'{count} files have been written to {path}')
+        return count
+
+    def mirror_directory(self, local_root, folder_id, state_file=None, delete=False, max_workers=8, rescan=False):
+        '''
+        Make a Drive folder a mirror of a local directory. Only missing folders are created and only changed files
+        are uploaded: size and mtime are compared with a local state file, then md5Checksum if they differ.
+        The remote tree is listed on the first run (or with rescan=True) only.
+        :param local_root: Local directory path
+        :param folder_id: Drive folder ID
+        :param state_file: string, local_root/.drive_mirror.jsonl by default (it is not uploaded)
+        :param delete: True = delete Drive files and folders which are not in local_root anymore
+        :param max_workers: Number of files uploaded at the same time
+        :param rescan: True = list the remote tree again instead of trusting the state file
+        :return: {'created_folders', 'uploaded', 'skipped', 'deleted', 'failed', 'errors': [(path, error)]}, the files
+                 and subfolders of a folder which could not be created are left for the next run
+        '''
+        return mirror_directory(self, local_root, folder_id, state_file=state_file, delete=delete,
+                                max_workers=max_workers, rescan=rescan)
+
     def delete_file(self, file_id):
         '''
 
@@ -111,18 +776,22 @@ class SimpleDrive:
         :param file_id: ID in URL or use list_files function to get
         :return: No
         '''
-        self.service.files().delete(fileId=file_id).execute()
-        print(f'{file_id} has been deleted!')
+        self.execute(self.service.files().delete(fileId=file_id))
+        self.invalidate(file_id)
+        self._unindex_file(file_id)
+        log(f'{file_id} has been deleted!', file_id=file_id)
 
     def move_file(self, file_id, to_folder_id):
-        file = self.service.files().get(fileId=file_id, fields='id, name, parents').execute()
+        file = self.get_file(file_id, fields='id, name, parents')
         remove_parents = file['parents'][0]
-        moved = self.service.files().update(fileId=file_id,
-                                            addParents=to_folder_id,
-                                            removeParents=remove_parents,
-                                            fields='id, name, parents, owners',
-                                            ).execute()
-        print(f'{file["name"]} has been moved to folder {to_folder_id}!')
+        moved = self.execute(self.service.files().update(fileId=file_id,
+                                                         addParents=to_folder_id,
+                                                         removeParents=remove_parents,
+                                                         fields='id, name, parents, owners',
+                                                         ))
+        self.invalidate(file_id)
+        self._index_files([moved])
+        log(f'{file["name"]} has been moved to folder {to_folder_id}!', file_id=file_id, to_folder_id=to_folder_id)
         return moved
 
     def copy_file(self, file_id, same_name=True, prefix=None, suffix=None, to_folder_id=None):
@@ -135,7 +804,7 @@ class SimpleDrive:
         :param to_folder_id: None = same folder, id string = copy to specific folder
         :return: New file information json
         '''
-        old_file = self.service.files().get(fileId=file_id, fields='id, name, parents, owners').execute()
+        old_file = self.get_file(file_id, fields='id, name, parents, owners')
 
         if same_name == True:
             new_name = f'{str(prefix) + " " if prefix != None else ""}{old_file["name"]}{" " + str(suffix) if suffix != None else ""}'
@@ -143,20 +812,54 @@ class SimpleDrive:
             new_name = f'Copy of {old_file["name"]}'
 
         body = {'name': new_name}
-
-        copied = self.service.files().copy(fileId=file_id, body=body, fields='id, name, parents, owners').execute()
-
         if to_folder_id != None:
-            copied = self.service.files().update(fileId=copied['id'],
-                                                 addParents=to_folder_id,
-                                                 removeParents=copied['parents'][0],
-                                                 fields='id, name, parents, owners',
-                                                 ).execute()
+            # The parent is set in the copy call, no second request to move the copy
+            body['parents'] = [to_folder_id]
+
+        copied = self.execute(self.service.files().copy(fileId=file_id, body=body, fields='id, name, parents, owners',
+                                                        supportsAllDrives=True))
 
-        print(
+        log(
             f'{old_file["name"]} ({file_id}) has been copied to {body["name"]} ({copied["id"]}) {", folder " + to_folder_id if to_folder_id != None else ""}!')
+        self._index_files([copied])
         return copied
 
+    def copy_tree(self, folder_id, dest_folder_id, name=None, max_workers=8, max_per_request=100, verify=True,
+                  progress=None):
+        '''
+        Copy a folder and everything in it into dest_folder_id. The tree is listed breadth-first (the folders of a level
+        at the same time), folders are created level by level and files are copied in batches with their new parent
+        set in the copy call.
+        report = my_drive.copy_tree(folder_id='your-folder-id', dest_folder_id='dest-folder-id',
+                                    progress=lambda report: print(report['files'], report['failed']))
+        :param folder_id: Source folder ID
+        :param dest_folder_id: The copy is created in this folder
+        :param name: None = same name as the source folder
+        :param max_workers: Number of listings and copy batches running at the same time
+        :param max_per_request: Number of calls per batch request, Drive accepts 100 at most
+        :param verify: True = list the copy at the end and compare it with the source
+        :param progress: A function called with the report after each batch
+        :return: {'folder_id', 'folders', 'files', 'failed', 'errors': [(path, error)], 'missing', 'mismatched', 'consistent'}
+        '''
+        return copy_tree(self, folder_id, dest_folder_id, name=name, max_workers=max_workers,
+                         max_per_request=max_per_request, verify=verify, progress=progress)
+
+    def move_tree(self, folder_id, dest_folder_id, by_copy=False, max_workers=8, max_per_request=100, progress=None):
+        '''
+        Move a folder and everything in it into dest_folder_id
+        :param folder_id: Source folder ID
+        :param dest_folder_id: string
+        :param by_copy: False = one request, Drive moves the whole tree. True = copy_tree then delete the source
+                        when the copy is complete and consistent, for moves Drive refuses (for example between
+                        shared drives of different organizations)
+        :param max_workers: Used when by_copy = True
+        :param max_per_request: Used when by_copy = True
+        :param progress: Used when by_copy = True
+        :return: {'folder_id', 'parents'}, or the copy_tree report with 'source_deleted' when by_copy = True
+        '''
+        return move_tree(self, folder_id, dest_folder_id, by_copy=by_copy, max_workers=max_workers,
+                         max_per_request=max_per_request, progress=progress)
+
     def rename_file(self, file_id, new_name):
         '''
 
@@ -166,8 +869,10 @@ class SimpleDrive:
         :return: New file information json
         '''
         body = {'name': new_name}
-        result = self.service.files().update(fileId=file_id, body=body, fields='id, name, parents, owners').execute()
-        print(f'{file_id} has been renamed to {new_name}!')
+        result = self.execute(self.service.files().update(fileId=file_id, body=body, fields='id, name, parents, owners'))
+        self.invalidate(file_id)
+        self._index_files([result])
+        log(f'{file_id} has been renamed to {new_name}!', file_id=file_id)
         return result
 
     def add_permission(self, file_id, email, role='reader'):
@@ -179,8 +884,67 @@ class SimpleDrive:
         :return: No
         '''
         permission = {'type': 'user', 'role': role, 'emailAddress': email}
-        self.service.permissions().create(fileId=file_id, body=permission).execute()
-        print(f'{email} has been added {role} permission to file_id {file_id}')
+        self.execute(self.service.permissions().create(fileId=file_id, body=permission))
+        self.invalidate(file_id)
+        log(f'{email} has been added {role} permission to file_id {file_id}', file_id=file_id)
+
+    def sync_permissions(self, file_ids, desired, remove_unlisted=True, max_workers=8, max_per_request=100,
+                         dry_run=False):
+        '''
+        Make user permissions of many files match desired, only the differences are sent (in batches).
+        Only permissions of type user are synced, group, domain and anyone shares are never changed or removed.
+        :param file_ids: A list of file IDs
+        :param desired: {email: role}, role: reader, commenter, writer. Each email is shared as a user, not a group
+        :param remove_unlisted: True = remove users who are not in desired (owners are never removed)
+        :param max_workers: Number of files whose permissions are read at the same time
+        :param max_per_request: Number of changes per batch request
+        :param dry_run: True = only compute the changes
+        :return: A list of {'file_id', 'action', 'email', 'role', 'permission_id', 'error'}, action: create, update, delete
+        '''
+        desired = {email.lower(): role for email, role in desired.items()}
+        if 'owner' in desired.values():
+            raise Exception('Ownership can not be synced, please use transfer functions')
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            current = dict(zip(file_ids, executor.map(self.list_permissions, file_ids)))
+
+        changes = []
+        for file_id in file_ids:
+            existing = {}
+            for permission in current[file_id]:
+                if permission.get('type') == 'user' and permission.get('emailAddress') != None:
+                    existing[permission['emailAddress'].lower()] = permission
+            for email, role in desired.items():
+                if email not in existing:
+                    changes.append({'file_id': file_id, 'action': 'create', 'email': email, 'role': role,
+                                    'permission_id': None, 'error': None})
+                elif existing[email]['role'] != role and existing[email]['role'] != 'owner':
+                    changes.append({'file_id': file_id, 'action': 'update', 'email': email, 'role': role,
+                                    'permission_id': existing[email]['id'], 'error': None})
+            if remove_unlisted:
+                for email, permission in existing.items():
+                    if email not in desired and permission['role'] != 'owner':
+                        changes.append({'file_id': file_id, 'action': 'delete', 'email': email,
+                                        'role': permission['role'], 'permission_id': permission['id'], 'error': None})
+
+        if dry_run or len(changes) == 0:
+            log(f'{len(changes)} permission changes for {len(file_ids)} files')
+            return changes
+
+        with self.batch(max_per_request=max_per_request) as b:
+            for change in changes:
+                if change['action'] == 'create':
+                    b.add_permission(change['file_id'], change['email'], role=change['role'])
+                elif change['action'] == 'update':
+                    b.update_permission(change['file_id'], change['permission_id'], change['role'])
+                else:
+                    b.delete_permission(change['file_id'], permission_id=change['permission_id'])
+        for change, result in zip(changes, b.results):
+            change['error'] = result['error']
+
+        failed = len([i for i in changes if i['error'] != None])
+        log(f'{len(changes) - failed} permission changes for {len(file_ids)} files have been made, {failed} failed')
+        return changes
 
     def delete_permission(self, file_id, permission_id=None, email=None):
         '''
@@ -191,13 +955,15 @@ class SimpleDrive:
         :return: No
         '''
         if permission_id != None:
-            self.service.permissions().delete(fileId=file_id, permissionId=permission_id).execute()
-            print(f'permission_id {permission_id} has been removed from file_id {file_id}')
+            self.execute(self.service.permissions().delete(fileId=file_id, permissionId=permission_id))
+            self.invalidate(file_id)
+            log(f'permission_id {permission_id} has been removed from file_id {file_id}')
         elif email != None:
-            list_permission = self.service.permissions().list(fileId=file_id, fields='*').execute()['permissions']
-            if email not in [i['emailAddress'] for i in list_permission]:
-                print(f'{email} not in permissions for file_id {file_id}')
+            list_permission = self.list_permissions(file_id)
+            if email not in [i.get('emailAddress') for i in list_permission]:
+                log(f'{email} not in permissions for file_id {file_id}', level=logging.WARNING, file_id=file_id)
             else:
-                permission_id = [i['id'] for i in list_permission if i['emailAddress'] == email][0]
-                self.service.permissions().delete(fileId=file_id, permissionId=permission_id).execute()
-                print(f'{email} has been removed permission from file_id {file_id}')
+                permission_id = [i['id'] for i in list_permission if i.get('emailAddress') == email][0]
+                self.execute(self.service.permissions().delete(fileId=file_id, permissionId=permission_id))
+                self.invalidate(file_id)
+                log(f'{email} has been removed permission from file_id {file_id}')
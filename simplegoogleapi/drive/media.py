@@ -0,0 +1,204 @@
+import io
+import os
+
+from googleapiclient.http import MediaUpload
+
+CHUNK_SIZE = 8 * 1024 * 1024
+MIME_TYPES = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+
+
+def safe_name(name):
+    '''
+    A Drive name as one local path component, it can not be a separator, '.' or '..'
+    :param name: Drive file or folder name
+    :return: string
+    '''
+    name = name.replace('/', '_').replace(os.sep, '_')
+    return '_' * max(len(name), 1) if name in ['', '.', '..'] else name
+
+
+class MemoryReader(io.RawIOBase):
+    def __init__(self, data):
+        '''
+        A seekable binary file over bytes, bytearray or memoryview, the data is not copied:
+        read() returns only the requested slice
+        :param data: bytes-like object
+        '''
+        self.view = memoryview(data).cast('B')
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        else:
+            self.position = len(self.view) + offset
+        return self.position
+
+    def read(self, size=-1):
+        end = len(self.view) if size == None or size < 0 else min(len(self.view), self.position + size)
+        data = self.view[self.position:end].tobytes()
+        self.position = max(self.position, end)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class IterReader(io.RawIOBase):
+    def __init__(self, chunks):
+        '''
+        A read-only, not seekable binary file over an iterable of bytes chunks
+        :param chunks: An iterable of bytes
+        '''
+        self.chunks = iter(chunks)
+        self.pending = b''
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        parts = [self.pending]
+        length = len(self.pending)
+        while size == None or size < 0 or length < size:
+            chunk = next(self.chunks, None)
+            if chunk == None:
+                break
+            parts.append(chunk)
+            length += len(chunk)
+        data = b''.join(parts)
+        if size == None or size < 0:
+            self.pending = b''
+            return data
+        self.pending = data[size:]
+        return data[:size]
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class StreamUpload(MediaUpload):
+    def __init__(self, stream, mimetype='application/octet-stream', chunksize=CHUNK_SIZE):
+        '''
+        A resumable upload of a stream whose size is not known (a pipe, a generator...), the stream is read chunk by
+        chunk and only the current chunk is kept in memory
+        :param stream: A readable binary file object
+        :param mimetype: string
+        :param chunksize: A multiple of 256 KB
+        '''
+        super().__init__()
+        self._stream = stream
+        self._mimetype = mimetype
+        self._chunksize = chunksize
+        self._buffer = bytearray()
+        self._offset = 0
+        self._eof = False
+        self._last = False
+
+    def chunksize(self):
+        # A full chunk at the end of the stream is sent as the last one: it must look shorter than a chunk
+        return self._chunksize + 1 if self._last else self._chunksize
+
+    def mimetype(self):
+        return self._mimetype
+
+    def size(self):
+        return None
+
+    def resumable(self):
+        return True
+
+    def getbytes(self, begin, length):
+        if begin < self._offset:
+            raise Exception(f'The stream can not go back to byte {begin}, it is at byte {self._offset}')
+        # Bytes before begin have been received by Drive
+        del self._buffer[:begin - self._offset]
+        self._offset = begin
+        # One more byte tells whether this chunk is the last one
+        while len(self._buffer) <= length and not self._eof:
+            data = self._stream.read(length + 1 - len(self._buffer))
+            if not data:
+                self._eof = True
+            else:
+                self._buffer += data
+        self._last = self._eof and len(self._buffer) <= length
+        return bytes(self._buffer[:length])
+
+    def to_json(self):
+        raise NotImplementedError('A stream upload can not be serialized')
+
+
+class ChunkSink:
+    def __init__(self):
+        '''
+        A write-only file for pyarrow, written bytes are taken out with drain()
+        '''
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def dataframe_chunks(df, file_format='csv', rows_per_chunk=100000, **kwargs):
+    '''
+    Serialize a DataFrame slice by slice, only one slice is serialized in memory at a time
+    :param df: A pandas DataFrame
+    :param file_format: 'csv' or 'parquet' (it needs pyarrow, one row group per slice)
+    :param rows_per_chunk: Rows per slice
+    :param kwargs: Passed to DataFrame.to_csv or pyarrow.parquet.ParquetWriter
+    :return: A generator of bytes
+    '''
+    if file_format == 'csv':
+        kwargs.setdefault('index', False)
+        header = kwargs.pop('header', True)
+        for start in range(0, max(len(df), 1), rows_per_chunk):
+            text = df.iloc[start:start + rows_per_chunk].to_csv(header=header if start == 0 else False, **kwargs)
+            yield text.encode(kwargs.get('encoding') or 'utf-8')
+    elif file_format == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        sink = ChunkSink()
+        schema = pa.Schema.from_pandas(df.iloc[:0], preserve_index=False)
+        with pq.ParquetWriter(sink, schema, **kwargs) as writer:
+            for start in range(0, len(df), rows_per_chunk):
+                writer.write_table(pa.Table.from_pandas(df.iloc[start:start + rows_per_chunk], schema=schema,
+                                                        preserve_index=False))
+                yield sink.drain()
+        yield sink.drain()
+    else:
+        raise Exception(f'file_format must be csv or parquet, not {file_format}')
@@ -0,0 +1,169 @@
+import hashlib
+import os
+import os.path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from ..instrument import log
+from .journal import JsonLinesJournal
+from .query import FOLDER_MIME_TYPE
+
+
+def file_md5(local_file):
+    md5 = hashlib.md5()
+    with open(local_file, 'rb') as f:
+        for data in iter(lambda: f.read(1024 * 1024), b''):
+            md5.update(data)
+    return md5.hexdigest()
+
+
+def scan_remote(simple_drive, folder_id, max_workers):
+    folders = {'': folder_id}
+    files = {}
+    for path, file in simple_drive.walk_tree(folder_id, fields='id, name, mimeType, size, md5Checksum',
+                                             max_workers=max_workers):
+        if file['mimeType'] == FOLDER_MIME_TYPE:
+            folders[path] = file['id']
+        elif 'md5Checksum' in file:
+            files[path] = {'id': file['id'], 'size': int(file.get('size', 0)), 'mtime': None,
+                           'md5': file['md5Checksum']}
+    return folders, files
+
+
+def scan_local(local_root, skip_file):
+    folders = []
+    files = {}
+    for directory, dirnames, filenames in os.walk(local_root):
+        relative = os.path.relpath(directory, local_root).replace(os.sep, '/')
+        relative = '' if relative == '.' else relative
+        for dirname in dirnames:
+            folders.append(f'{relative}/{dirname}' if relative != '' else dirname)
+        for filename in filenames:
+            local_file = os.path.join(directory, filename)
+            if os.path.abspath(local_file) == skip_file:
+                continue
+            stat = os.stat(local_file)
+            files[f'{relative}/{filename}' if relative != '' else filename] = (local_file, stat.st_size,
+                                                                              stat.st_mtime_ns)
+    return folders, files
+
+
+def mirror_directory(simple_drive, local_root, folder_id, state_file=None, delete=False, max_workers=8,
+                     rescan=False):
+    '''
+    See SimpleDrive.mirror_directory
+    '''
+    if state_file == None:
+        state_file = os.path.join(local_root, '.drive_mirror.jsonl')
+    # One line per created folder or uploaded file, a crash never loses the Drive ID of what has been created
+    journal = JsonLinesJournal(state_file)
+    report = {'created_folders': 0, 'uploaded': 0, 'skipped': 0, 'deleted': 0, 'failed': 0, 'errors': []}
+    try:
+        if rescan or journal.get('folder_id') != folder_id:
+            log(f'List Drive folder {folder_id}')
+            folders, files = scan_remote(simple_drive, folder_id, max_workers)
+            journal.replace({'folder_id': folder_id, **{f'folder:{path}': i for path, i in folders.items()},
+                             **{f'file:{path}': i for path, i in files.items()}})
+        else:
+            items = journal.items()
+            folders = {key[len('folder:'):]: value for key, value in items if key.startswith('folder:')}
+            files = {key[len('file:'):]: value for key, value in items if key.startswith('file:')}
+
+        local_folders, local_files = scan_local(local_root, os.path.abspath(state_file))
+
+        # Create missing folders level by level, parents first
+        missing = sorted([i for i in local_folders if i not in folders], key=lambda i: i.count('/'))
+        # What is under a folder which could not be created is left for the next run
+        failed_folders = []
+        under_failed = lambda path: any(path == j or path.startswith(f'{j}/') for j in failed_folders)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for depth in sorted(set(i.count('/') for i in missing)):
+                level = [i for i in missing if i.count('/') == depth and not under_failed(i)]
+
+                def create(path):
+                    parent, name = path.rsplit('/', 1) if '/' in path else ('', path)
+                    body = {'name': name, 'mimeType': FOLDER_MIME_TYPE, 'parents': [folders[parent]]}
+                    created = simple_drive.execute(simple_drive.service.files().create(body=body, fields='id',
+                                                                                       supportsAllDrives=True))
+                    journal.set(f'folder:{path}', created['id'])
+                    return created['id']
+
+                futures = {executor.submit(create, path): path for path in level}
+                for future in as_completed(futures):
+                    path = futures[future]
+                    try:
+                        folders[path] = future.result()
+                        report['created_folders'] += 1
+                    except Exception as error:
+                        failed_folders.append(path)
+                        report['failed'] += 1
+                        report['errors'].append((path, error))
+
+        # Compare size and mtime, then md5Checksum
+        changed = []
+        for path, (local_file, size, mtime) in local_files.items():
+            if under_failed(path.rsplit('/', 1)[0] if '/' in path else ''):
+                continue
+            entry = files.get(path)
+            if entry != None and entry['size'] == size and entry['mtime'] == mtime:
+                report['skipped'] += 1
+            elif entry != None and entry['size'] == size and entry['md5'] == file_md5(local_file):
+                entry['mtime'] = mtime
+                journal.set(f'file:{path}', entry)
+                report['skipped'] += 1
+            else:
+                changed.append(path)
+
+        def upload(path):
+            local_file, size, mtime = local_files[path]
+            parent = path.rsplit('/', 1)[0] if '/' in path else ''
+            entry = files.get(path)
+            file, size = simple_drive._upload_one(simple_drive.service, local_file, folder_id=folders[parent],
+                                                  file_id=entry['id'] if entry != None else None)
+            entry = {'id': file['id'], 'size': size, 'mtime': mtime, 'md5': file.get('md5Checksum')}
+            journal.set(f'file:{path}', entry)
+            return entry
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(upload, path): path for path in changed}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    files[path] = future.result()
+                    report['uploaded'] += 1
+                except Exception as error:
+                    report['failed'] += 1
+                    report['errors'].append((path, error))
+
+        if delete:
+            removed_files = [i for i in files if i not in local_files]
+            removed_folders = [i for i in folders if i != '' and i not in local_folders]
+            # Deleting a folder deletes everything in it, only the top removed folders are deleted
+            top_folders = [i for i in removed_folders
+                           if not any(i.startswith(f'{j}/') for j in removed_folders)]
+            targets = [(i, files[i]['id']) for i in removed_files
+                       if not any(i.startswith(f'{j}/') for j in top_folders)] + [(i, folders[i]) for i in top_folders]
+            with simple_drive.batch() as b:
+                for path, file_id in targets:
+                    b.delete_file(file_id)
+            deleted = []
+            for (path, file_id), result in zip(targets, b.results):
+                if result['error'] != None:
+                    report['failed'] += 1
+                    report['errors'].append((path, result['error']))
+                else:
+                    report['deleted'] += 1
+                    deleted.append(path)
+            gone = lambda path: path in deleted or any(path.startswith(f'{j}/') for j in deleted)
+            for path in [i for i in removed_files if gone(i)]:
+                del files[path]
+                journal.delete(f'file:{path}')
+            for path in [i for i in removed_folders if gone(i)]:
+                del folders[path]
+                journal.delete(f'folder:{path}')
+    finally:
+        journal.close()
+
+    log(f'Mirror {local_root} to Drive folder {folder_id}: {report["created_folders"]} folders created, '
+          f'{report["uploaded"]} files uploaded, {report["skipped"]} unchanged, {report["deleted"]} deleted, '
+          f'{report["failed"]} failed')
+    return report
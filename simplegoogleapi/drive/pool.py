@@ -0,0 +1,152 @@
+import logging
+import threading
+import time
+
+from ..instrument import log
+from .main import SimpleDrive
+from .scheduler import RequestScheduler, http_error, is_throttled
+
+
+def _unwrap(error):
+    '''
+
+    :param error: An exception, pydrive2 ApiRequestError wraps the HttpError in args or __cause__
+    :return: The HttpError or None
+    '''
+    found = http_error(error)
+    if found == None and error.__cause__ != None:
+        found = http_error(error.__cause__)
+    return found
+
+
+class _PooledDrive(SimpleDrive):
+    '''
+    A SimpleDrive whose requests are sent by the pool, every method of DrivePool runs on it so each request
+    (a page, a batch, a create...) is sent with the next available account. Requests tied to one account (pydrive2
+    upload_file and list_files, the chunks of a resumable upload) use the first account and are retried with backoff.
+    '''
+
+    def __init__(self, pool, gauth, **drive_kwargs):
+        super().__init__(gauth, **drive_kwargs)
+        self.pool = pool
+
+    def execute(self, request, max_retries=None):
+        return self.pool.execute(request, max_retries=max_retries)
+
+    def _call_with_service(self, function, **kwargs):
+        return self.pool.call_with_service(function, **kwargs)
+
+
+class DrivePool:
+    def __init__(self, gauths, strategy='round_robin', cooldown=60, **drive_kwargs):
+        '''
+        Use many accounts (service accounts) as one SimpleDrive, requests are spread over the accounts.
+        An account which hits a rate limit is left out for cooldown seconds.
+        Files must be shared with every account of the pool.
+        :param gauths: A list of gauth, use BuildAuth().build_gauth_pool()
+        :param strategy: round_robin or least_throttled
+        :param cooldown: Seconds an account is left out after a rate limit, doubled if it happens again right after
+        :param drive_kwargs: Other SimpleDrive parameters, for example cache=True
+        '''
+        if strategy not in ['round_robin', 'least_throttled']:
+            raise Exception('strategy should be round_robin or least_throttled')
+        # Rate limit errors come back at once, so the pool can move to another account
+        self.drives = [SimpleDrive(gauth, **{'scheduler': RequestScheduler(retry_throttled=False), **drive_kwargs})
+                       for gauth in gauths]
+        self.strategy = strategy
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.next_index = 0
+        self.accounts = [{'available_at': 0, 'throttled_at': 0, 'cooldown': cooldown, 'requests': 0, 'throttles': 0}
+                         for i in self.drives]
+        # Its own scheduler only sends the requests tied to the first account, they are retried when throttled
+        self.pooled_drive = _PooledDrive(self, gauths[0], **{'scheduler': RequestScheduler(), **drive_kwargs})
+
+    def pick(self):
+        '''
+
+        :return: Index of the account for the next request, it waits if every account is cooling down
+        '''
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                available = [i for i, account in enumerate(self.accounts) if account['available_at'] <= now]
+                if len(available) > 0:
+                    if self.strategy == 'least_throttled':
+                        index = min(available, key=lambda i: (self.accounts[i]['throttled_at'],
+                                                              self.accounts[i]['requests']))
+                    else:
+                        index = min(available, key=lambda i: (i - self.next_index) % len(self.accounts))
+                        self.next_index = (index + 1) % len(self.accounts)
+                    self.accounts[index]['requests'] += 1
+                    return index
+                wait = min(account['available_at'] for account in self.accounts) - now
+            time.sleep(max(wait, 0.01))
+
+    def throttled(self, index):
+        with self.lock:
+            account = self.accounts[index]
+            now = time.monotonic()
+            # Throttled again soon after coming back -> longer cooldown
+            if now - account['available_at'] < account['cooldown']:
+                account['cooldown'] = min(account['cooldown'] * 2, self.cooldown * 16)
+            else:
+                account['cooldown'] = self.cooldown
+            account['throttled_at'] = now
+            account['available_at'] = now + account['cooldown']
+            account['throttles'] += 1
+        log(f'Account {index} has been throttled, left out for {account["cooldown"]}s', level=logging.WARNING)
+
+    def call_with_service(self, function, **kwargs):
+        '''
+        Run a function which sends requests (a batch) with the service of the next account, it is run again with
+        another account if it is throttled
+        :param function: A function with the service as parameter
+        :param kwargs: RequestScheduler.call parameters
+        :return: The function result
+        '''
+        while True:
+            index = self.pick()
+            drive = self.drives[index]
+            try:
+                return drive.scheduler.call(lambda: function(drive.worker_service()), **kwargs)
+            except Exception as error:
+                if not is_throttled(_unwrap(error)):
+                    raise
+                self.throttled(index)
+
+    def execute(self, request, max_retries=None):
+        '''
+        Send one request with the next account, it is sent again with another account if it is throttled
+        :param request: A googleapiclient HttpRequest, built with the service of any account of the pool
+        :param max_retries: None = max_retries of the scheduler, 0 = the request is sent once on each account
+        :return: The response json
+        '''
+        while True:
+            index = self.pick()
+            drive = self.drives[index]
+            # The request is sent with the HTTP client (and credentials) of the picked account
+            request.http = drive.worker_service()._http
+            try:
+                return drive.execute(request, max_retries=max_retries)
+            except Exception as error:
+                if not is_throttled(_unwrap(error)):
+                    raise
+                self.throttled(index)
+
+    def stats(self):
+        '''
+
+        :return: A list of {'requests', 'throttles', 'available_in'} per account
+        '''
+        with self.lock:
+            now = time.monotonic()
+            return [{'requests': i['requests'], 'throttles': i['throttles'],
+                     'available_in': max(i['available_at'] - now, 0)} for i in self.accounts]
+
+    def __getattr__(self, name):
+        if name.startswith('_') or not callable(getattr(SimpleDrive, name, None)):
+            raise AttributeError(name)
+        # Accounts are picked per request, not per method: a method which sends many requests (copy_tree,
+        # mirror_directory...) is never run again from the start on another account
+        return getattr(self.pooled_drive, name)
@@ -0,0 +1,63 @@
+import datetime
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+
+def quote(value):
+    '''
+
+    :param value: string
+    :return: A quoted string for a Drive v3 query, for example 'it\\'s'
+    '''
+    value = str(value).replace('\\', '\\\\').replace("'", "\\'")
+    return f"'{value}'"
+
+
+def format_time(value):
+    '''
+
+    :param value: datetime or RFC 3339 string
+    :return: RFC 3339 string
+    '''
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo == None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return value.isoformat()
+    return str(value)
+
+
+def build_query(parent_id=None, mime_type=None, name_contains=None, owner_email=None,
+                modified_after=None, modified_before=None, trashed=False, query=None):
+    '''
+    Build the q parameter of files().list, so filters are applied by Drive
+    :param parent_id: Only files directly in this folder
+    :param mime_type: A mime type string or a list of them
+    :param name_contains: string
+    :param owner_email: Exactly email
+    :param modified_after: datetime or RFC 3339 string
+    :param modified_before: datetime or RFC 3339 string
+    :param trashed: True, False or None (both)
+    :param query: Extra raw query string, it will be joined with "and"
+    :return: A query string or None
+    '''
+    filters = []
+    if parent_id != None:
+        filters.append(f'{quote(parent_id)} in parents')
+    if mime_type != None:
+        if isinstance(mime_type, str):
+            filters.append(f'mimeType = {quote(mime_type)}')
+        else:
+            filters.append('(' + ' or '.join(f'mimeType = {quote(i)}' for i in mime_type) + ')')
+    if name_contains != None:
+        filters.append(f'name contains {quote(name_contains)}')
+    if owner_email != None:
+        filters.append(f'{quote(owner_email)} in owners')
+    if modified_after != None:
+        filters.append(f'modifiedTime > {quote(format_time(modified_after))}')
+    if modified_before != None:
+        filters.append(f'modifiedTime < {quote(format_time(modified_before))}')
+    if trashed != None:
+        filters.append(f'trashed = {"true" if trashed else "false"}')
+    if query != None:
+        filters.append(f'({query})')
+    return ' and '.join(filters) if len(filters) > 0 else None
@@ -0,0 +1,180 @@
+import csv
+import json
+from functools import lru_cache
+
+INT_FIELDS = ['size', 'quotaBytesUsed', 'version']
+BOOL_FIELDS = ['trashed', 'explicitlyTrashed', 'starred', 'shared', 'ownedByMe', 'viewedByMe']
+
+
+def field_names(fields):
+    '''
+
+    :param fields: A fields string, for example 'id, name, owners(emailAddress)'
+    :return: Top level names, for example ['id', 'name', 'owners']
+    '''
+    names = []
+    name = ''
+    depth = 0
+    for char in fields + ',':
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif depth == 0 and char == ',':
+            if name.strip() != '':
+                names.append(name.strip())
+            name = ''
+        elif depth == 0:
+            name += char
+    return names
+
+
+def _value(name, value):
+    if name in INT_FIELDS and value != None:
+        return int(value)
+    return value
+
+
+def _cell(name, value):
+    # CSV and Arrow get flat values, nested ones (owners, parents...) are written as json
+    if value == None or name in INT_FIELDS or name in BOOL_FIELDS:
+        return value
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+class FileRecord:
+    __slots__ = ()
+
+    def __init__(self, file):
+        for name in self.__slots__:
+            setattr(self, name, _value(name, file.get(name)))
+
+    def __getitem__(self, name):
+        if name not in self.__slots__:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def get(self, name, default=None):
+        value = getattr(self, name, None) if name in self.__slots__ else None
+        return default if value == None else value
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f'FileRecord({self.to_dict()})'
+
+
+@lru_cache(maxsize=None)
+def record_type(fields):
+    '''
+    A FileRecord class with __slots__ for the fields, it holds no per-object dict
+    :param fields: A fields string
+    :return: A class, record_type(fields)(file) makes a record
+    '''
+    return type('FileRecord', (FileRecord,), {'__slots__': tuple(field_names(fields))})
+
+
+class FileColumns:
+    def __init__(self, fields='id, name, mimeType, parents'):
+        '''
+        A listing stored column by column, one list per field instead of one dict per file.
+        It can be handed to pandas or Arrow as is.
+        :param fields: A fields string
+        '''
+        self.fields = fields
+        self.names = field_names(fields)
+        self.columns = {name: [] for name in self.names}
+
+    def append(self, file):
+        for name in self.names:
+            self.columns[name].append(_value(name, file.get(name)))
+
+    def extend(self, files):
+        for file in files:
+            self.append(file)
+
+    def __len__(self):
+        return len(self.columns[self.names[0]]) if len(self.names) > 0 else 0
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __iter__(self):
+        record = record_type(self.fields)
+        for row in zip(*[self.columns[name] for name in self.names]):
+            yield record(dict(zip(self.names, row)))
+
+    def to_pandas(self):
+        '''
+
+        :return: A pandas DataFrame, it needs pandas
+        '''
+        import pandas as pd
+        return pd.DataFrame(self.columns, columns=self.names)
+
+    def to_arrow(self):
+        '''
+        Nested fields become json strings
+        :return: A pyarrow Table, it needs pyarrow
+        '''
+        import pyarrow as pa
+        schema = arrow_schema(self.names)
+        return pa.table({name: [_cell(name, i) for i in self.columns[name]] if schema.field(name).type == pa.string()
+                         else self.columns[name] for name in self.names}, schema=schema)
+
+
+def arrow_schema(names):
+    import pyarrow as pa
+    return pa.schema([(name, pa.int64() if name in INT_FIELDS else pa.bool_() if name in BOOL_FIELDS else pa.string())
+                      for name in names])
+
+
+def write_csv(files, path, fields, chunk_size=10000):
+    '''
+    Write a listing to a CSV file while it is streamed, rows are written every chunk_size files
+    :param files: An iterable of file information json
+    :param path: CSV file path
+    :param fields: A fields string, one column per top level field
+    :param chunk_size: Files kept in memory
+    :return: Number of written files
+    '''
+    names = field_names(fields)
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(names)
+        rows = []
+        for file in files:
+            rows.append([_cell(name, _value(name, file.get(name))) for name in names])
+            if len(rows) >= chunk_size:
+                writer.writerows(rows)
+                count += len(rows)
+                rows = []
+        writer.writerows(rows)
+    return count + len(rows)
+
+
+def write_parquet(files, path, fields, chunk_size=10000):
+    '''
+    Write a listing to a Parquet file while it is streamed, one row group every chunk_size files.
+    It needs pyarrow.
+    :param files: An iterable of file information json
+    :param path: Parquet file path
+    :param fields: A fields string, one column per top level field
+    :param chunk_size: Files kept in memory
+    :return: Number of written files
+    '''
+    import pyarrow.parquet as pq
+    columns = FileColumns(fields)
+    count = 0
+    with pq.ParquetWriter(path, arrow_schema(columns.names)) as writer:
+        for file in files:
+            columns.append(file)
+            if len(columns) >= chunk_size:
+                writer.write_table(columns.to_arrow())
+                count += len(columns)
+                columns = FileColumns(fields)
+        if len(columns) > 0 or count == 0:
+            writer.write_table(columns.to_arrow())
+    return count + len(columns)
@@ -0,0 +1,236 @@
+import http.client
+import random
+import socket
+import ssl
+import sys
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+from httplib2 import ServerNotFoundError
+
+from ..instrument import RequestEvent, get_instrument
+from .batch import IDEMPOTENT_METHODS, error_reason, is_retryable
+
+THROTTLE_REASONS = ['userRateLimitExceeded', 'rateLimitExceeded']
+# The connection failed before a response came back (reset, timeout, DNS), other OSErrors are local (files)
+TRANSPORT_ERRORS = (ConnectionError, TimeoutError, socket.timeout, socket.gaierror, ssl.SSLError,
+                    http.client.HTTPException, ServerNotFoundError)
+# The connection could not be opened, the request has not reached Drive
+NOT_SENT_ERRORS = (ConnectionRefusedError, socket.gaierror, ServerNotFoundError)
+
+
+def http_error(error):
+    '''
+
+    :param error: An exception, pydrive2 errors wrap the HttpError
+    :return: The HttpError or None
+    '''
+    if isinstance(error, HttpError):
+        return error
+    for arg in getattr(error, 'args', []):
+        if isinstance(arg, HttpError):
+            return arg
+    return None
+
+
+def is_transport_error(error):
+    '''
+
+    :param error: An exception raised by an API call
+    :return: True if the connection failed, the same request can be sent again
+    '''
+    if isinstance(error, TRANSPORT_ERRORS):
+        return True
+    # Export links are downloaded with requests, it is only checked when something has imported it
+    requests = sys.modules.get('requests')
+    return requests != None and isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+def is_not_sent(error):
+    '''
+
+    :param error: An exception raised by an API call
+    :return: True if the connection failed before the request was sent, even a create can be sent again
+    '''
+    if isinstance(error, NOT_SENT_ERRORS):
+        return True
+    requests = sys.modules.get('requests')
+    return requests != None and isinstance(error, requests.ConnectTimeout)
+
+
+def is_throttled(error):
+    '''
+
+    :param error: An exception raised by an API call
+    :return: True if the request hit a rate limit
+    '''
+    error = http_error(error)
+    if error == None:
+        return False
+    return error.resp.status == 429 or (error.resp.status == 403 and error_reason(error) in THROTTLE_REASONS)
+
+
+class RequestScheduler:
+    def __init__(self, quota_per_minute=12000, burst=None, max_retries=5, base_delay=1, max_delay=64,
+                 min_rate=0.5, decrease=0.5, increase=0.02, retry_throttled=True, instrument=None):
+        '''
+        Every SimpleDrive request goes through a token bucket. Rate limit, server and connection errors are retried
+        with exponential backoff and jitter. The rate is halved when Drive throttles and slowly grows back after successes.
+        :param quota_per_minute: Queries per minute of the project (or user) quota
+        :param burst: Number of requests which can be sent at once, the rate per second by default
+        :param max_retries: Number of retries of a request
+        :param base_delay: Seconds of the first backoff
+        :param max_delay: Seconds of the longest backoff
+        :param min_rate: The rate (requests per second) never goes lower
+        :param decrease: The rate is multiplied by it when Drive throttles
+        :param increase: Part of the max rate added after each success
+        :param retry_throttled: False = rate limit errors are raised at once (DrivePool moves to another account)
+        :param instrument: Where each call is recorded, the instrument of set_instrument() by default
+        '''
+        self.max_rate = quota_per_minute / 60
+        self.rate = self.max_rate
+        self.capacity = burst if burst != None else max(1, self.max_rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.min_rate = min_rate
+        self.decrease = decrease
+        self.increase = increase
+        self.last_decrease = 0
+        self.retry_throttled = retry_throttled
+        self.instrument = instrument
+        self.lock = threading.Lock()
+        self.counters = {'requests': 0, 'succeeded': 0, 'retries': 0, 'throttled': 0, 'failed': 0, 'wait_seconds': 0}
+
+    def acquire(self, tokens=1):
+        '''
+        Wait until the bucket has enough tokens
+        :param tokens: Number of requests about to be sent
+        :return: No
+        '''
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    self.counters['requests'] += tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+                self.counters['wait_seconds'] += wait
+            time.sleep(wait)
+
+    def succeeded(self):
+        with self.lock:
+            self.counters['succeeded'] += 1
+            self.rate = min(self.max_rate, self.rate + self.max_rate * self.increase)
+
+    def throttled(self):
+        with self.lock:
+            self.counters['throttled'] += 1
+            now = time.monotonic()
+            # A burst of throttled responses is one signal, the rate is decreased once per second at most
+            if now - self.last_decrease >= 1:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self.last_decrease = now
+
+    def backoff(self, attempt, error=None):
+        '''
+
+        :param attempt: 0 for the first retry
+        :param error: HttpError, its Retry-After header is used if any
+        :return: Seconds to wait
+        '''
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt) * (0.5 + random.random() / 2)
+        error = http_error(error)
+        if error != None and error.resp.get('retry-after', '').isdigit():
+            delay = max(delay, int(error.resp['retry-after']))
+        return delay
+
+    def call(self, function, tokens=1, operation='call', bytes_sent=0, response=None, idempotent=True,
+             max_retries=None):
+        '''
+        Run a function which sends a request, retry it on rate limit, server and connection errors
+        :param function: A function without parameter
+        :param tokens: Number of requests the function sends
+        :param operation: Name of the call for the instrument, for example 'drive.files.list'
+        :param bytes_sent: Request body size for the instrument
+        :param response: A dict the function can fill with status, bytes_sent and bytes_received for the instrument
+        :param idempotent: False = the request creates something (a POST), a lost response is raised instead of
+                           retried, it is only retried when the connection failed before the request was sent
+        :param max_retries: None = max_retries of the scheduler, 0 = the request is sent once
+        :return: The function result
+        '''
+        instrument = self.instrument if self.instrument != None else get_instrument()
+        measured = instrument.enabled
+        started = time.perf_counter() if measured else 0
+        max_retries = self.max_retries if max_retries == None else max_retries
+        for attempt in range(max_retries + 1):
+            self.acquire(tokens)
+            try:
+                result = function()
+            except Exception as error:
+                throttled = is_throttled(error)
+                if throttled:
+                    self.throttled()
+                retryable = is_retryable(http_error(error)) or \
+                    (is_transport_error(error) and (idempotent or is_not_sent(error)))
+                if not retryable or attempt == max_retries or \
+                        (throttled and not self.retry_throttled):
+                    with self.lock:
+                        self.counters['failed'] += 1
+                    if measured:
+                        status = http_error(error).resp.status if http_error(error) != None else None
+                        self._record(instrument, operation, started, attempt, bytes_sent, response, None, status,
+                                     error)
+                    raise
+                with self.lock:
+                    self.counters['retries'] += 1
+                time.sleep(self.backoff(attempt, error))
+                continue
+            self.succeeded()
+            if measured:
+                self._record(instrument, operation, started, attempt, bytes_sent, response, result, None, None)
+            return result
+
+    def _record(self, instrument, operation, started, attempt, bytes_sent, response, result, status, error):
+        response = response or {}
+        received = len(result) if isinstance(result, (bytes, bytearray)) else response.get('bytes_received', 0)
+        instrument.request(RequestEvent(operation, time.perf_counter() - started, response.get('status', status),
+                                        attempt, response.get('bytes_sent', bytes_sent), received, error))
+
+    def execute(self, request, max_retries=None):
+        '''
+
+        :param request: A googleapiclient HttpRequest, a POST is not sent again after a lost response
+        :param max_retries: None = max_retries of the scheduler, 0 = the request is sent once
+        :return: The response json
+        '''
+        instrument = self.instrument if self.instrument != None else get_instrument()
+        idempotent = request.method in IDEMPOTENT_METHODS
+        if not instrument.enabled:
+            return self.call(request.execute, idempotent=idempotent, max_retries=max_retries)
+        response = {}
+
+        def callback(resp):
+            response['status'] = resp.status
+            response['bytes_received'] = int(resp.get('content-length', 0) or 0)
+
+        request.add_response_callback(callback)
+        body = request.body
+        return self.call(request.execute, operation=getattr(request, 'methodId', None) or 'request',
+                         bytes_sent=len(body) if body else 0, response=response, idempotent=idempotent,
+                         max_retries=max_retries)
+
+    def metrics(self):
+        '''
+
+        :return: Counters and the current rate (requests per second)
+        '''
+        with self.lock:
+            return {**self.counters, 'rate': self.rate, 'max_rate': self.max_rate, 'tokens': self.tokens}
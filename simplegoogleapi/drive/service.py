@@ -0,0 +1,120 @@
+import json
+import os
+import os.path
+import threading
+import weakref
+
+DISCOVERY_URL = 'https://www.googleapis.com/discovery/v1/apis/{api}/{version}/rest'
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'simplegoogleapi')
+
+_documents = {}
+_documents_lock = threading.Lock()
+_local = threading.local()
+
+
+def load_discovery_document(api='drive', version='v3', cache_dir=CACHE_DIR):
+    '''
+    The document is read once per process: from the copy bundled with google-api-python-client,
+    else from cache_dir, else it is downloaded and saved to cache_dir
+    :param api: string
+    :param version: string
+    :param cache_dir: string
+    :return: The discovery document json
+    '''
+    from googleapiclient import discovery_cache
+    key = (api, version)
+    with _documents_lock:
+        if key in _documents:
+            return _documents[key]
+
+        content = discovery_cache.get_static_doc(api, version)
+        cache_file = os.path.join(cache_dir, f'{api}.{version}.json')
+        if content == None and os.path.exists(cache_file):
+            with open(cache_file, 'r') as f:
+                content = f.read()
+        if content == None:
+            import httplib2
+            resp, content = httplib2.Http().request(DISCOVERY_URL.format(api=api, version=version))
+            content = content.decode('utf-8')
+            os.makedirs(cache_dir, exist_ok=True)
+            temp_file = f'{cache_file}.{os.getpid()}.tmp'
+            with open(temp_file, 'w') as f:
+                f.write(content)
+            os.replace(temp_file, cache_file)
+
+        _documents[key] = json.loads(content)
+        return _documents[key]
+
+
+def build_service(creds, api='drive', version='v3', api_endpoint=None, http=None):
+    '''
+    Same as googleapiclient build() but the discovery document is not read again
+    :param creds: gauth.credentials or creds
+    :param api_endpoint: None = Google, or another server for every request (uploads and batches too),
+                         for example 'http://127.0.0.1:8080'
+    :param http: An authorized HTTP client, used instead of creds
+    :return: A new service object
+    '''
+    from googleapiclient.discovery import build_from_document
+    document = load_discovery_document(api, version)
+    if api_endpoint != None:
+        # Upload and batch URLs come from rootUrl, client_options would only change the API URL
+        document = dict(document, rootUrl=f'{api_endpoint.rstrip("/")}/', mtlsRootUrl=f'{api_endpoint.rstrip("/")}/')
+    if http != None:
+        return build_from_document(document, http=http)
+    return build_from_document(document, credentials=creds)
+
+
+def _weak_authorized_http(creds):
+    '''
+    Same as the HTTP client googleapiclient builds for creds, but it refers to creds through a weak proxy.
+    A cached service then does not keep its credentials alive, and the cache entry goes away with them.
+    :param creds: gauth.credentials (oauth2client) or creds (google-auth)
+    :return: An authorized HTTP client
+    '''
+    from googleapiclient.http import build_http
+    proxy = weakref.proxy(creds)
+    if hasattr(creds, 'authorize'):
+        # oauth2client, authorize() keeps the credentials it is called on
+        return type(creds).authorize(proxy, build_http())
+    import google_auth_httplib2
+    return google_auth_httplib2.AuthorizedHttp(proxy, http=build_http())
+
+
+def drive_service(creds, api='drive', version='v3', api_endpoint=None):
+    '''
+    Service objects are shared per credentials. httplib2 is not thread-safe, so each thread has its own.
+    They are dropped when the credentials are garbage collected.
+    :param creds: gauth.credentials or creds
+    :param api_endpoint: See build_service
+    :return: A service object
+    '''
+    services = getattr(_local, 'services', None)
+    if services == None:
+        services = _local.services = weakref.WeakKeyDictionary()
+    if getattr(creds, 'requires_scopes', False):
+        # googleapiclient replaces them with scoped credentials, there is nothing to share
+        return build_service(creds, api, version, api_endpoint)
+    try:
+        by_api = services.setdefault(creds, {})
+    except TypeError:
+        # Credentials that can not be weak referenced are not shared
+        return build_service(creds, api, version, api_endpoint)
+    if (api, version, api_endpoint) not in by_api:
+        by_api[(api, version, api_endpoint)] = build_service(creds, api, version, api_endpoint,
+                                                             http=_weak_authorized_http(creds))
+    return by_api[(api, version, api_endpoint)]
+
+
+def access_token(creds):
+    '''
+    Refresh the credentials if needed (it sends a request)
+    :param creds: gauth.credentials (oauth2client) or creds (google-auth)
+    :return: An access token string
+    '''
+    if hasattr(creds, 'get_access_token'):
+        return creds.get_access_token().access_token
+    if not creds.valid:
+        from google.auth.transport.requests import Request
+        creds.refresh(Request())
+    return creds.token
@@ -0,0 +1,159 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from ..instrument import log
+from .query import FOLDER_MIME_TYPE
+
+FIELDS = 'id, name, mimeType, size, md5Checksum'
+
+
+def _join(path, name):
+    return f'{path}/{name}' if path != '' else name
+
+
+def _batch(simple_drive, max_per_request, add):
+    b = simple_drive.batch(max_per_request=max_per_request)
+    add(b)
+    return b.execute()
+
+
+def is_inside(simple_drive, folder_id, dest_folder_id):
+    '''
+    Walk up the parents of dest_folder_id
+    :return: True if dest_folder_id is folder_id or one of its descendants
+    '''
+    seen = set()
+    level = [dest_folder_id]
+    while len(level) > 0:
+        parents = []
+        for file_id in level:
+            if file_id == folder_id:
+                return True
+            if file_id in seen:
+                continue
+            seen.add(file_id)
+            file = simple_drive.get_file(file_id, fields='id, parents')
+            if file['id'] == folder_id:
+                return True
+            parents += file.get('parents', [])
+        level = parents
+    return False
+
+
+def compare_trees(simple_drive, source, folder_id, max_workers=8):
+    '''
+    Compare a listed source tree with a folder on Drive
+    :param simple_drive: A SimpleDrive object
+    :param source: {path: file information json} of the source tree
+    :param folder_id: ID of the copied folder
+    :param max_workers: Number of folders listed at the same time
+    :return: {'missing': [path], 'mismatched': [path], 'consistent': True or False}
+    '''
+    copied = {path: file for path, file in simple_drive.walk_tree(folder_id, fields=FIELDS, max_workers=max_workers)}
+    missing = [path for path in source if path not in copied]
+    mismatched = [path for path in source if path in copied
+                  and any(source[path].get(i) != copied[path].get(i) for i in ['mimeType', 'size', 'md5Checksum'])]
+    return {'missing': missing, 'mismatched': mismatched, 'consistent': len(missing) == 0 and len(mismatched) == 0}
+
+
+def copy_tree(simple_drive, folder_id, dest_folder_id, name=None, max_workers=8, max_per_request=100, verify=True,
+              progress=None):
+    '''
+    See SimpleDrive.copy_tree
+    '''
+    root = simple_drive.get_file(folder_id, fields='id, name, mimeType')
+    if root['mimeType'] != FOLDER_MIME_TYPE:
+        raise Exception(f'{folder_id} is not a folder, use copy_file')
+    if is_inside(simple_drive, root['id'], dest_folder_id):
+        raise ValueError(f'{dest_folder_id} is {folder_id} or one of its subfolders, the copy would copy itself')
+    body = {'name': name if name != None else root['name'], 'mimeType': FOLDER_MIME_TYPE, 'parents': [dest_folder_id]}
+    created = simple_drive.execute(simple_drive.service.files().create(body=body, fields='id, name, mimeType, parents',
+                                                                       supportsAllDrives=True))
+    simple_drive._index_files([created])
+
+    report = {'folder_id': created['id'], 'folders': 1, 'files': 0, 'failed': 0, 'errors': []}
+    lock = threading.Lock()
+    source = {}
+    # Folders of the copy, they are never listed as part of the source
+    created_ids = {created['id']}
+
+    def report_batch(items, results):
+        with lock:
+            for (path, file, parent_id), result in zip(items, results):
+                if result['error'] != None:
+                    report['failed'] += 1
+                    report['errors'].append((path, result['error']))
+                elif file['mimeType'] == FOLDER_MIME_TYPE:
+                    report['folders'] += 1
+                else:
+                    report['files'] += 1
+            if progress != None:
+                progress(dict(report))
+
+    def copy_files(items):
+        results = _batch(simple_drive, max_per_request,
+                         lambda b: [b.copy_file(file['id'], to_folder_id=parent_id) for path, file, parent_id in items])
+        report_batch(items, results)
+
+    level = [('', folder_id, created['id'])]
+    copies = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while len(level) > 0:
+            listed = executor.map(lambda folder: list(simple_drive.iter_files(parent_id=folder[1], fields=FIELDS)),
+                                  level)
+            folders = []
+            files = []
+            for (path, source_id, new_id), children in zip(level, listed):
+                for child in children:
+                    if child['id'] in created_ids:
+                        continue
+                    child_path = _join(path, child['name'])
+                    source[child_path] = child
+                    (folders if child['mimeType'] == FOLDER_MIME_TYPE else files).append((child_path, child, new_id))
+
+            # Folders of a level are created before their children are copied
+            results = []
+            if len(folders) > 0:
+                results = _batch(simple_drive, max_per_request,
+                                 lambda b: [b.create_folder(file['name'], parent_id) for path, file, parent_id in folders])
+                report_batch(folders, results)
+            level = [(path, file['id'], result['result']['id'])
+                     for (path, file, parent_id), result in zip(folders, results) if result['error'] == None]
+            created_ids.update(new_id for path, source_id, new_id in level)
+
+            # Files are copied while the next level is listed
+            for start in range(0, len(files), max_per_request):
+                copies.append(executor.submit(copy_files, files[start:start + max_per_request]))
+        for future in copies:
+            future.result()
+
+    if verify:
+        report.update(compare_trees(simple_drive, source, created['id'], max_workers=max_workers))
+    log(f'Copy {folder_id} to {created["id"]}: {report["folders"]} folders, {report["files"]} files, '
+          f'{report["failed"]} failed'
+          f'{", consistent" if report.get("consistent") else ", not consistent" if verify else ""}')
+    return report
+
+
+def move_tree(simple_drive, folder_id, dest_folder_id, by_copy=False, max_workers=8, max_per_request=100,
+              progress=None):
+    '''
+    See SimpleDrive.move_tree
+    '''
+    if not by_copy:
+        # Drive moves the whole tree when the top folder changes parent, one request
+        moved = simple_drive.move_file(folder_id, dest_folder_id)
+        return {'folder_id': moved['id'], 'parents': moved.get('parents')}
+
+    report = copy_tree(simple_drive, folder_id, dest_folder_id, max_workers=max_workers,
+                       max_per_request=max_per_request, verify=True, progress=progress)
+    if report['failed'] == 0 and report['consistent']:
+        simple_drive.execute(simple_drive.service.files().delete(fileId=folder_id, supportsAllDrives=True))
+        simple_drive.invalidate(folder_id)
+        simple_drive._unindex_file(folder_id)
+        report['source_deleted'] = True
+    else:
+        report['source_deleted'] = False
+        log(f'The copy of {folder_id} is not complete, the source folder is not deleted', level=logging.WARNING)
+    return report
@@ -0,0 +1,203 @@
+import bisect
+import logging
+import threading
+import time
+from collections import namedtuple
+
+RequestEvent = namedtuple('RequestEvent', ['operation', 'seconds', 'status', 'retries', 'bytes_sent',
+                                           'bytes_received', 'error'])
+
+# Upper bounds in seconds of the latency buckets, 1 ms to about 9 minutes
+BUCKETS = [0.001 * 2 ** i for i in range(20)]
+
+
+class Instrument:
+    '''
+    Base class, it does nothing. A subclass overrides request() to record API calls and message() to show messages.
+    '''
+    # False = SimpleDrive does not even measure the calls
+    enabled = False
+
+    def request(self, event):
+        '''
+
+        :param event: RequestEvent(operation, seconds, status, retries, bytes_sent, bytes_received, error)
+        :return: No
+        '''
+        pass
+
+    def message(self, text, level=logging.INFO, fields=None):
+        '''
+
+        :param text: A message for people, for example 'file-id has been deleted!'
+        :param level: A logging level
+        :param fields: A dict of values for machines, for example {'file_id': 'file-id'}
+        :return: No
+        '''
+        pass
+
+
+class NoopInstrument(Instrument):
+    '''
+    Nothing is measured and nothing is shown
+    '''
+    pass
+
+
+class LoggingInstrument(Instrument):
+    def __init__(self, logger='simplegoogleapi', request_level=logging.DEBUG):
+        '''
+        Send messages and API calls to the logging module. Until logging is configured, messages are printed
+        like before.
+        :param logger: A logger or a logger name
+        :param request_level: Level of the API call records
+        '''
+        self.logger = logging.getLogger(logger) if isinstance(logger, str) else logger
+        self.request_level = request_level
+
+    @property
+    def enabled(self):
+        return self.logger.isEnabledFor(self.request_level) and self.logger.hasHandlers()
+
+    def request(self, event):
+        if self.logger.isEnabledFor(self.request_level):
+            self.logger.log(self.request_level, '%s status=%s %.3fs retries=%s sent=%s received=%s%s',
+                            event.operation, event.status, event.seconds, event.retries, event.bytes_sent,
+                            event.bytes_received, f' error={event.error}' if event.error != None else '',
+                            extra={'event': event._asdict()})
+
+    def message(self, text, level=logging.INFO, fields=None):
+        if not self.logger.hasHandlers():
+            if level >= logging.INFO:
+                print(text)
+        elif self.logger.isEnabledFor(level):
+            self.logger.log(level, text, extra={'fields': fields or {}})
+
+
+class HistogramInstrument(Instrument):
+    enabled = True
+
+    def __init__(self, forward=None):
+        '''
+        Keep counters and a latency histogram per operation in memory
+        instrument = HistogramInstrument()
+        set_instrument(instrument)
+        ...
+        print(instrument.summary())
+        :param forward: Another instrument which gets the messages and the calls too, LoggingInstrument by default.
+                        Use NoopInstrument() to keep only the numbers.
+        '''
+        self.forward = forward if forward != None else LoggingInstrument()
+        self.lock = threading.Lock()
+        self.operations = {}
+
+    def request(self, event):
+        with self.lock:
+            stats = self.operations.get(event.operation)
+            if stats == None:
+                stats = {'count': 0, 'errors': 0, 'retries': 0, 'bytes_sent': 0, 'bytes_received': 0,
+                         'seconds': 0, 'max_seconds': 0, 'statuses': {}, 'buckets': [0] * (len(BUCKETS) + 1)}
+                self.operations[event.operation] = stats
+            stats['count'] += 1
+            stats['errors'] += 1 if event.error != None else 0
+            stats['retries'] += event.retries
+            stats['bytes_sent'] += event.bytes_sent or 0
+            stats['bytes_received'] += event.bytes_received or 0
+            stats['seconds'] += event.seconds
+            stats['max_seconds'] = max(stats['max_seconds'], event.seconds)
+            stats['statuses'][event.status] = stats['statuses'].get(event.status, 0) + 1
+            stats['buckets'][bisect.bisect_left(BUCKETS, event.seconds)] += 1
+        if self.forward.enabled:
+            self.forward.request(event)
+
+    def message(self, text, level=logging.INFO, fields=None):
+        self.forward.message(text, level, fields)
+
+    def percentile(self, operation, q):
+        '''
+
+        :param operation: For example 'drive.files.list'
+        :param q: 0 to 100
+        :return: Seconds, the upper bound of the bucket the percentile is in
+        '''
+        with self.lock:
+            buckets = list(self.operations[operation]['buckets'])
+            max_seconds = self.operations[operation]['max_seconds']
+        rank = sum(buckets) * q / 100
+        seen = 0
+        for index, count in enumerate(buckets):
+            seen += count
+            if count > 0 and seen >= rank:
+                return min(BUCKETS[index], max_seconds) if index < len(BUCKETS) else max_seconds
+        return max_seconds
+
+    def summary(self):
+        '''
+
+        :return: {operation: {count, errors, error_rate, retries, bytes_sent, bytes_received, mean, p50, p95, p99, max, statuses}}
+        '''
+        with self.lock:
+            operations = {operation: dict(stats, statuses=dict(stats['statuses']))
+                          for operation, stats in self.operations.items()}
+        return {operation: {'count': stats['count'], 'errors': stats['errors'],
+                            'error_rate': stats['errors'] / stats['count'], 'retries': stats['retries'],
+                            'bytes_sent': stats['bytes_sent'], 'bytes_received': stats['bytes_received'],
+                            'mean': stats['seconds'] / stats['count'], 'p50': self.percentile(operation, 50),
+                            'p95': self.percentile(operation, 95), 'p99': self.percentile(operation, 99),
+                            'max': stats['max_seconds'], 'statuses': stats['statuses']}
+                for operation, stats in operations.items()}
+
+    def reset(self):
+        with self.lock:
+            self.operations = {}
+
+
+_instrument = LoggingInstrument()
+
+
+def set_instrument(instrument):
+    '''
+    Choose where messages and API call records go, for every client
+    set_instrument(NoopInstrument())
+    :param instrument: LoggingInstrument, HistogramInstrument, NoopInstrument or your own Instrument subclass
+    :return: The previous instrument
+    '''
+    global _instrument
+    previous = _instrument
+    _instrument = instrument
+    return previous
+
+
+def get_instrument():
+    return _instrument
+
+
+def measure(operation, function):
+    '''
+    Run a function which sends a request and record it, for requests which do not go through a RequestScheduler
+    :param operation: For example 'auth.refresh'
+    :param function: A function without parameter
+    :return: The function result
+    '''
+    instrument = _instrument
+    if not instrument.enabled:
+        return function()
+    started = time.perf_counter()
+    try:
+        result = function()
+    except Exception as error:
+        instrument.request(RequestEvent(operation, time.perf_counter() - started, None, 0, 0, 0, error))
+        raise
+    instrument.request(RequestEvent(operation, time.perf_counter() - started, None, 0, 0, 0, None))
+    return result
+
+
+def log(text, level=logging.INFO, **fields):
+    '''
+    Used instead of print(), the message goes to the current instrument
+    :param text: string
+    :param level: A logging level
+    :param fields: Values for machines
+    :return: No
+    '''
+    _instrument.message(text, level, fields)
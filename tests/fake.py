@@ -0,0 +1,28 @@
+import os
+import sys
+
+from google.oauth2.credentials import Credentials
+from pydrive2.auth import GoogleAuth
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from fake_server import FakeServer
+from simplegoogleapi.drive import SimpleDrive
+from simplegoogleapi.drive.scheduler import RequestScheduler
+
+
+class FakeGauth(GoogleAuth):
+    def __init__(self):
+        super().__init__()
+        self.credentials = Credentials(token='fake-token')
+
+
+def fake_drive(**kwargs):
+    '''
+    A SimpleDrive connected to a new local fake server, stop the server with server.stop()
+    :param kwargs: FakeServer parameters
+    :return: (server, SimpleDrive)
+    '''
+    server = FakeServer(**kwargs).start()
+    scheduler = RequestScheduler(quota_per_minute=1e12, base_delay=0)
+    return server, SimpleDrive(FakeGauth(), cache=False, scheduler=scheduler, api_endpoint=server.url)
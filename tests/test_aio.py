@@ -0,0 +1,126 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+import aiohttp
+from google.oauth2.credentials import Credentials
+
+from fake import FakeServer, fake_drive
+from simplegoogleapi.drive.aio import AsyncDriveError, AsyncSimpleDrive
+from simplegoogleapi.instrument import NoopInstrument, set_instrument
+
+
+class AsyncUploadTest(unittest.TestCase):
+    def setUp(self):
+        set_instrument(NoopInstrument())
+        self.server = FakeServer().start()
+        self.addCleanup(self.server.stop)
+        self.data = os.urandom(3 * 256 * 1024)
+        handle, self.local_file = tempfile.mkstemp()
+        with os.fdopen(handle, 'wb') as f:
+            f.write(self.data)
+        self.addCleanup(os.remove, self.local_file)
+
+    async def upload(self, failures, max_retries=5, error=None):
+        '''
+        Upload with chunk requests which reach the server but answer 503, as if the response was lost
+        :param failures: Number of chunk requests answered with 503
+        :param error: Or raise this connection error instead
+        '''
+        async with AsyncSimpleDrive(creds=Credentials(token='fake-token'), api_endpoint=self.server.url,
+                                    max_retries=max_retries) as my_drive:
+            request = my_drive.request
+            failed = []
+
+            async def flaky_request(method, url, data=None, **kwargs):
+                status, headers, content = await request(method, url, data=data, **kwargs)
+                if method == 'PUT' and data and len(failed) < failures:
+                    failed.append(url)
+                    if error != None:
+                        raise error
+                    return 503, {}, b''
+                return status, headers, content
+
+            async def no_wait(attempt, retry_after=''):
+                pass
+
+            my_drive.request = flaky_request
+            my_drive._backoff = no_wait
+            return await my_drive.upload_file(self.local_file, chunk_size=256 * 1024)
+
+    def test_resume_from_the_saved_offset(self):
+        file = asyncio.run(self.upload(failures=2))
+        self.assertEqual(self.server.app.state.content[file['id']], self.data)
+
+    def test_resume_after_a_connection_error(self):
+        file = asyncio.run(self.upload(failures=2, error=aiohttp.ServerDisconnectedError()))
+        self.assertEqual(self.server.app.state.content[file['id']], self.data)
+
+    def test_retries_are_bounded(self):
+        with self.assertRaises(AsyncDriveError):
+            asyncio.run(self.upload(failures=100, max_retries=2))
+
+
+class LosingSession:
+    def __init__(self, session, errors):
+        '''
+        An aiohttp session whose next requests fail with errors
+        '''
+        self.session = session
+        self.errors = errors
+        self.calls = 0
+
+    def request(self, *args, **kwargs):
+        self.calls += 1
+        if len(self.errors) > 0:
+            raise self.errors.pop(0)
+        return self.session.request(*args, **kwargs)
+
+
+class AsyncRequestTest(unittest.TestCase):
+    def setUp(self):
+        set_instrument(NoopInstrument())
+        self.server, self.drive = fake_drive()
+        self.addCleanup(self.server.stop)
+        self.file_id = self.drive.upload_bytes(b'x', 'shared.txt')['id']
+
+    async def run_drive(self, function, errors=()):
+        async with AsyncSimpleDrive(creds=Credentials(token='fake-token'), api_endpoint=self.server.url) as my_drive:
+            session = LosingSession(my_drive._session(), list(errors))
+            my_drive._session = lambda: session
+
+            async def no_wait(attempt, retry_after=''):
+                pass
+
+            my_drive._backoff = no_wait
+            try:
+                return await function(my_drive)
+            finally:
+                self.calls = session.calls
+
+    def test_delete_permission_past_the_first_page(self):
+        with self.drive.batch() as b:
+            for i in range(150):
+                b.add_permission(self.file_id, f'user{i}@example.com')
+        asyncio.run(self.run_drive(lambda my_drive: my_drive.delete_permission(self.file_id,
+                                                                                email='user140@example.com')))
+        emails = [i.get('emailAddress') for i in self.drive.list_permissions(self.file_id)]
+        self.assertEqual(len(emails), 150)
+        self.assertNotIn('user140@example.com', emails)
+
+    def test_connection_errors_are_retried(self):
+        errors = [aiohttp.ServerDisconnectedError(), asyncio.TimeoutError()]
+        usage = asyncio.run(self.run_drive(lambda my_drive: my_drive.check_usage(), errors))
+        self.assertIsInstance(usage, dict)
+        self.assertEqual(self.calls, 3)
+
+    def test_lost_response_of_a_create_is_not_retried(self):
+        with self.assertRaises(aiohttp.ServerDisconnectedError):
+            asyncio.run(self.run_drive(lambda my_drive: my_drive.create_folder('Reports'),
+                                       [aiohttp.ServerDisconnectedError()]))
+        self.assertEqual(self.calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import datetime
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import google.oauth2.credentials
+from google.auth.transport.requests import Request
+from pydrive2.auth import GoogleAuth
+
+from fake import FakeServer
+from simplegoogleapi.auth import BuildAuth, TokenCache
+from simplegoogleapi.auth.shared import SharedCredentials
+from simplegoogleapi.instrument import NoopInstrument, set_instrument
+
+
+class SharedRefreshTest(unittest.TestCase):
+    def setUp(self):
+        set_instrument(NoopInstrument())
+        self.server = FakeServer().start()
+        self.addCleanup(self.server.stop)
+        self.credentials_file = os.path.join(tempfile.mkdtemp(), 'credentials.json')
+        expired = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+        with open(self.credentials_file, 'w') as f:
+            json.dump({'token': 'expired', 'access_token': 'expired', 'refresh_token': 'refresh',
+                       'token_uri': f'{self.server.url}/token', 'client_id': 'id', 'client_secret': 'secret',
+                       'expiry': expired.isoformat() + 'Z', 'token_expiry': expired.isoformat() + 'Z',
+                       'user_agent': None, 'invalid': False, '_module': 'oauth2client.client',
+                       '_class': 'OAuth2Credentials'}, f)
+        self.auth = BuildAuth(refresh_margin=0)
+
+    def test_token_cache_is_abstract(self):
+        with self.assertRaises(TypeError):
+            TokenCache()
+
+    def test_later_creds_refresh_is_shared(self):
+        with mock.patch.object(google.oauth2.credentials, '_GOOGLE_OAUTH2_TOKEN_ENDPOINT', f'{self.server.url}/token'):
+            first = SharedCredentials.load(self.auth.token_cache, self.credentials_file)
+            second = SharedCredentials.load(self.auth.token_cache, self.credentials_file)
+            first.refresh(Request())
+            second.refresh(Request())
+        self.assertEqual(self.server.stats['requests'], 1)
+        self.assertEqual(second.token, first.token)
+
+    def test_later_gauth_refresh_is_shared(self):
+        first = GoogleAuth()
+        second = GoogleAuth()
+        self.auth.load_gauth_credentials(first, self.credentials_file)
+        self.auth.load_gauth_credentials(second, self.credentials_file)
+        first.Refresh()
+        second.Refresh()
+        self.assertEqual(self.server.stats['requests'], 1)
+        self.assertEqual(second.credentials.access_token, first.credentials.access_token)
+
+
+if __name__ == '__main__':
+    unittest.main()
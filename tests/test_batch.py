@@ -0,0 +1,46 @@
+import unittest
+from unittest import mock
+
+from googleapiclient.http import BatchHttpRequest
+
+from fake import fake_drive
+from simplegoogleapi.instrument import NoopInstrument, set_instrument
+
+
+class DriveBatchTest(unittest.TestCase):
+    def setUp(self):
+        set_instrument(NoopInstrument())
+        self.server, self.drive = fake_drive()
+        self.addCleanup(self.server.stop)
+        self.file_id = self.drive.upload_bytes(b'x', 'shared.txt')['id']
+        with self.drive.batch() as b:
+            for i in range(150):
+                b.add_permission(self.file_id, f'user{i}@example.com')
+
+    def test_delete_permission_past_the_first_page(self):
+        with self.drive.batch() as b:
+            b.delete_permission(self.file_id, email='user140@example.com')
+            b.delete_permission(self.file_id, email='nobody@example.com')
+        self.assertIsNone(b.results[0]['error'])
+        self.assertIsNotNone(b.results[1]['error'])
+        emails = [i.get('emailAddress') for i in self.drive.list_permissions(self.file_id)]
+        self.assertEqual(len(emails), 150)
+        self.assertNotIn('user140@example.com', emails)
+
+    def test_lost_response_is_not_sent_again(self):
+        execute = BatchHttpRequest.execute
+
+        def lose_response(batch, *args, **kwargs):
+            execute(batch, *args, **kwargs)
+            raise ConnectionResetError()
+
+        with mock.patch.object(BatchHttpRequest, 'execute', lose_response):
+            with self.drive.batch() as b:
+                b.create_folder('Reports')
+        self.assertIsInstance(b.results[0]['error'], ConnectionResetError)
+        folders = [i for i in self.server.app.state.files.values() if i['name'] == 'Reports']
+        self.assertEqual(len(folders), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
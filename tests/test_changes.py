@@ -0,0 +1,36 @@
+import os
+import tempfile
+import time
+import unittest
+
+from fake import fake_drive
+from simplegoogleapi.drive import ChangeTracker
+from simplegoogleapi.drive.changes import ADDED, MODIFIED
+from simplegoogleapi.instrument import NoopInstrument, set_instrument
+
+
+class ChangeTrackerTest(unittest.TestCase):
+    def setUp(self):
+        set_instrument(NoopInstrument())
+        self.server, self.drive = fake_drive()
+        self.addCleanup(self.server.stop)
+        self.tracker = ChangeTracker(self.drive, state_file=os.path.join(tempfile.mkdtemp(), 'changes.json'))
+
+    def kinds(self):
+        return [(event.kind, event.file_id) for event in self.tracker.poll()]
+
+    def test_added_then_modified(self):
+        old_id = self.drive.create_folder('old')
+        self.assertEqual(self.kinds(), [])
+        # The fake server times have a one second precision
+        time.sleep(1.1)
+        new_id = self.drive.create_folder('new')
+        self.drive.rename_file(old_id, 'renamed')
+        self.assertEqual(self.kinds(), [(ADDED, new_id), (MODIFIED, old_id)])
+        time.sleep(1.1)
+        self.drive.rename_file(new_id, 'renamed')
+        self.assertEqual(self.kinds(), [(MODIFIED, new_id)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import threading
+import time
+import unittest
+
+from fake import FakeServer
+from simplegoogleapi.chat import WebhookClient
+from simplegoogleapi.instrument import NoopInstrument, set_instrument
+
+
+class WebhookClientTest(unittest.TestCase):
+    def setUp(self):
+        set_instrument(NoopInstrument())
+        self.server = FakeServer(latency=0.2).start()
+        self.addCleanup(self.server.stop)
+        self.webhook = f'{self.server.url}/chat/webhook'
+
+    def test_failing_on_error_does_not_block_flush(self):
+        def on_error(webhook, message, error):
+            raise RuntimeError('on_error failed')
+
+        client = WebhookClient(background=True, max_retries=0, on_error=on_error)
+        client.send('http://127.0.0.1:1/chat/webhook', 'Hello')
+        flushed = threading.Thread(target=client.flush, daemon=True)
+        flushed.start()
+        flushed.join(10)
+        self.assertFalse(flushed.is_alive())
+        self.assertEqual(len(client.errors), 2)
+        client.send(self.webhook, 'Hello again')
+        client.close()
+        self.assertEqual(len(client.errors), 2)
+
+    def test_posts_to_one_webhook_run_at_the_same_time(self):
+        client = WebhookClient(max_connections=4)
+        threads = [threading.Thread(target=client.send, args=(self.webhook, f'Hello {i}')) for i in range(4)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLess(time.perf_counter() - started, 0.6)
+
+    def test_long_message_is_split(self):
+        client = WebhookClient(max_message_length=10)
+        self.assertEqual(client._join(['a' * 25]), ['a' * 10, 'a' * 10, 'a' * 5])
+        self.assertEqual(client._join(['abc\ndefghijk', 'x']), ['abc', 'defghijk\nx'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from fake import fake_drive
+from simplegoogleapi.instrument import NoopInstrument, set_instrument
+
+
+class DownloadTest(unittest.TestCase):
+    def setUp(self):
+        set_instrument(NoopInstrument())
+        self.server, self.drive = fake_drive()
+        self.addCleanup(self.server.stop)
+        self.data = os.urandom(10 * 1024 + 7)
+        self.file_id = self.drive.upload_bytes(self.data, 'data.bin')['id']
+        self.directory = tempfile.mkdtemp()
+
+    def test_download_file(self):
+        local_file = os.path.join(self.directory, 'data.bin')
+        self.assertEqual(self.drive.download_file(self.file_id, local_file, chunk_size=1024), local_file)
+        with open(local_file, 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertEqual(os.listdir(self.directory), ['data.bin'])
+
+    def test_resume_downloads_the_missing_chunks_only(self):
+        local_file = os.path.join(self.directory, 'data.bin')
+        download_range = self.drive._download_range
+        ranges = []
+
+        def crash_after_five(file_id, start, end):
+            if len(ranges) == 5:
+                raise KeyboardInterrupt()
+            ranges.append(start)
+            return download_range(file_id, start, end)
+
+        with mock.patch.object(self.drive, '_download_range', crash_after_five):
+            with self.assertRaises(KeyboardInterrupt):
+                self.drive.download_file(self.file_id, local_file, chunk_size=1024, max_workers=1)
+        with mock.patch.object(self.drive, '_download_range', wraps=download_range) as resumed:
+            self.drive.download_file(self.file_id, local_file, chunk_size=1024, max_workers=1)
+        self.assertEqual(resumed.call_count, 11 - 5)
+        with open(local_file, 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_drive_name_does_not_leave_the_current_directory(self):
+        file_id = self.drive.upload_bytes(self.data, '../escape.bin')['id']
+        working_directory = os.path.join(self.directory, 'work')
+        os.mkdir(working_directory)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(working_directory)
+        local_file = self.drive.download_file(file_id)
+        self.assertEqual(os.listdir(working_directory), [local_file])
+        self.assertEqual(os.listdir(self.directory), ['work'])
+
+    def test_iter_download(self):
+        chunks = list(self.drive.iter_download(self.file_id, chunk_size=1024, max_workers=3))
+        self.assertEqual(len(chunks), 11)
+        self.assertEqual(b''.join(chunks), self.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
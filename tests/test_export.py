@@ -0,0 +1,42 @@
+import os
+import tempfile
+import unittest
+
+from fake import fake_drive
+from simplegoogleapi.drive.export import DOCUMENT
+from simplegoogleapi.drive.query import FOLDER_MIME_TYPE
+from simplegoogleapi.instrument import NoopInstrument, set_instrument
+
+
+class ExportManyTest(unittest.TestCase):
+    def setUp(self):
+        set_instrument(NoopInstrument())
+        self.server, self.drive = fake_drive()
+        self.addCleanup(self.server.stop)
+        self.dest_dir = tempfile.mkdtemp()
+
+    def create(self, name, mime_type, parent_id):
+        return self.drive.execute(self.drive.service.files().create(
+            body={'name': name, 'mimeType': mime_type, 'parents': [parent_id]}))['id']
+
+    def test_folder_names_stay_inside_dest_dir(self):
+        folder_id = self.drive.create_folder('export')
+        parent_id = folder_id
+        for name in ['..', 'a/../../x']:
+            parent_id = self.create(name, FOLDER_MIME_TYPE, parent_id)
+        self.create('doc', DOCUMENT, parent_id)
+        report = self.drive.export_many(folder_id=folder_id, dest_dir=self.dest_dir, recursive=True)
+        self.assertEqual((report['exported'], report['failed']), (1, 0))
+        root = os.path.realpath(self.dest_dir)
+        for local_file in report['files'].values():
+            self.assertTrue(os.path.realpath(local_file[0]).startswith(root + os.sep))
+
+    def test_bad_id_is_reported_as_failed(self):
+        doc_id = self.create('doc', DOCUMENT, 'root')
+        report = self.drive.export_many(file_ids=[doc_id, 'missing'], dest_dir=self.dest_dir)
+        self.assertEqual((report['exported'], report['failed']), (1, 1))
+        self.assertEqual(report['errors'][0][:2], ('missing', None))
+
+
+if __name__ == '__main__':
+    unittest.main()
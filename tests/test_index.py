@@ -0,0 +1,39 @@
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from fake import fake_drive
+from simplegoogleapi.drive import DriveIndex
+from simplegoogleapi.drive.query import FOLDER_MIME_TYPE
+from simplegoogleapi.instrument import NoopInstrument, set_instrument
+
+
+class DriveIndexTest(unittest.TestCase):
+    def setUp(self):
+        set_instrument(NoopInstrument())
+        self.server, self.drive = fake_drive()
+        self.addCleanup(self.server.stop)
+        self.drive.index = DriveIndex(os.path.join(tempfile.mkdtemp(), 'index.sqlite'))
+
+    def folders(self, name):
+        return [i for i in self.server.app.state.files.values()
+                if i['name'] == name and i['mimeType'] == FOLDER_MIME_TYPE]
+
+    def test_ensure_path_creates_each_folder_once(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            ids = set(executor.map(lambda i: self.drive.ensure_path('/Reports/2026/10'), range(16)))
+        self.assertEqual(len(ids), 1)
+        self.assertEqual([len(self.folders(i)) for i in ['Reports', '2026', '10']], [1, 1, 1])
+        self.assertEqual(self.drive.resolve_path('/Reports/2026/10'), ids.pop())
+
+    def test_uploads_are_indexed(self):
+        folder_id = self.drive.ensure_path('/Reports')
+        file_id = self.drive.upload_bytes(b'x', 'a.csv', folder_id=folder_id)['id']
+        self.assertEqual(self.drive.resolve_path('/Reports/a.csv'), file_id)
+        self.drive.delete_file(file_id)
+        self.assertIsNone(self.drive.resolve_path('/Reports/a.csv'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import csv
+import os
+import tempfile
+import unittest
+
+from fake import fake_drive
+from simplegoogleapi.drive.query import FOLDER_MIME_TYPE
+from simplegoogleapi.instrument import NoopInstrument, set_instrument
+
+
+class ListingTest(unittest.TestCase):
+    def setUp(self):
+        set_instrument(NoopInstrument())
+        self.server, self.drive = fake_drive()
+        self.addCleanup(self.server.stop)
+        self.folder_id = self.drive.create_folder('listing')
+        self.drive.create_folder('sub', parent_folder_id=self.folder_id)
+        for i in range(5):
+            self.drive.upload_bytes(b'x' * i, f'report {i}.csv', folder_id=self.folder_id, mime_type='text/csv')
+        self.drive.upload_bytes(b'y', 'other.txt')
+
+    def test_iter_files_pages_and_filters(self):
+        files = list(self.drive.iter_files(parent_id=self.folder_id, page_size=2))
+        self.assertEqual(len(files), 6)
+        reports = list(self.drive.iter_files(parent_id=self.folder_id, mime_type='text/csv', name_contains='report'))
+        self.assertEqual(sorted(i['name'] for i in reports), [f'report {i}.csv' for i in range(5)])
+        folders = list(self.drive.iter_files(parent_id=self.folder_id, mime_type=FOLDER_MIME_TYPE))
+        self.assertEqual([i['name'] for i in folders], ['sub'])
+
+    def test_records_and_columns(self):
+        records = list(self.drive.list_records(fields='id, name, size', parent_id=self.folder_id,
+                                               mime_type='text/csv'))
+        self.assertEqual(sorted(i.size for i in records), [0, 1, 2, 3, 4])
+        self.assertEqual(records[0]['name'], records[0].to_dict()['name'])
+        columns = self.drive.list_columns(fields='id, name, size', parent_id=self.folder_id, mime_type='text/csv')
+        self.assertEqual(len(columns), 5)
+        self.assertEqual(sorted(columns.to_pandas()['size']), [0, 1, 2, 3, 4])
+
+    def test_export_listing(self):
+        path = os.path.join(tempfile.mkdtemp(), 'listing.csv')
+        self.assertEqual(self.drive.export_listing(path, fields='id, name, parents', parent_id=self.folder_id), 6)
+        with open(path, newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0]['parents'], f'["{self.folder_id}"]')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import json
+import os
+import tempfile
+import unittest
+
+from fake import fake_drive
+from simplegoogleapi.drive.query import FOLDER_MIME_TYPE
+from simplegoogleapi.instrument import NoopInstrument, set_instrument
+
+
+class MirrorDirectoryTest(unittest.TestCase):
+    def setUp(self):
+        set_instrument(NoopInstrument())
+        self.server, self.drive = fake_drive()
+        self.addCleanup(self.server.stop)
+        self.local_root = tempfile.mkdtemp()
+        for directory in ['a', 'a/b', 'c']:
+            os.makedirs(os.path.join(self.local_root, directory), exist_ok=True)
+            for i in range(3):
+                with open(os.path.join(self.local_root, directory, f'{i}.txt'), 'w') as f:
+                    f.write(f'{directory} {i}')
+        self.folder_id = self.drive.create_folder('mirror')
+
+    def count(self, mime_type=None):
+        files = [i for i in self.server.app.state.files.values() if i['id'] not in ['root', self.folder_id]]
+        return len([i for i in files if (i['mimeType'] == FOLDER_MIME_TYPE) == (mime_type == FOLDER_MIME_TYPE)])
+
+    def test_resume_after_a_crash_creates_no_duplicate(self):
+        upload_one = self.drive._upload_one
+        calls = []
+
+        def failing(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 5:
+                raise KeyboardInterrupt()
+            return upload_one(*args, **kwargs)
+
+        self.drive._upload_one = failing
+        with self.assertRaises(KeyboardInterrupt):
+            self.drive.mirror_directory(self.local_root, self.folder_id, max_workers=1)
+        self.drive._upload_one = upload_one
+
+        report = self.drive.mirror_directory(self.local_root, self.folder_id)
+        self.assertEqual(report['created_folders'], 0)
+        self.assertEqual(report['uploaded'] + report['skipped'], 9)
+        self.assertEqual(self.count(FOLDER_MIME_TYPE), 3)
+        self.assertEqual(self.count(), 9)
+
+        report = self.drive.mirror_directory(self.local_root, self.folder_id)
+        self.assertEqual((report['uploaded'], report['skipped']), (0, 9))
+
+    def test_a_failed_folder_skips_only_its_tree(self):
+        execute = self.drive.execute
+
+        def fail_folder_a(request, **kwargs):
+            if request.methodId == 'drive.files.create' and '/upload/' not in request.uri and \
+                    json.loads(request.body)['name'] == 'a':
+                raise Exception('Folder a can not be created')
+            return execute(request, **kwargs)
+
+        self.drive.execute = fail_folder_a
+        report = self.drive.mirror_directory(self.local_root, self.folder_id)
+        self.assertEqual((report['created_folders'], report['uploaded'], report['failed']), (1, 3, 1))
+        self.assertEqual([path for path, error in report['errors']], ['a'])
+
+        self.drive.execute = execute
+        report = self.drive.mirror_directory(self.local_root, self.folder_id)
+        self.assertEqual((report['created_folders'], report['uploaded'], report['skipped']), (2, 6, 3))
+        self.assertEqual(self.count(FOLDER_MIME_TYPE), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+
+from fake import fake_drive
+from simplegoogleapi.instrument import NoopInstrument, set_instrument
+
+
+class SyncPermissionsTest(unittest.TestCase):
+    def setUp(self):
+        set_instrument(NoopInstrument())
+        self.server, self.drive = fake_drive()
+        self.addCleanup(self.server.stop)
+        self.file_ids = [self.drive.upload_bytes(b'x', f'{i}.txt')['id'] for i in range(2)]
+        for file_id in self.file_ids:
+            self.drive.add_permission(file_id, 'old@example.com')
+            self.drive.add_permission(file_id, 'b@example.com', role='reader')
+            self.server.app.state.permissions[file_id].append({'id': f'group-{file_id}', 'type': 'group',
+                                                               'role': 'reader', 'emailAddress': 'team@example.com'})
+
+    def permissions(self, file_id):
+        return sorted((i['type'], i['emailAddress'], i['role']) for i in self.drive.list_permissions(file_id))
+
+    def test_only_user_permissions_are_synced(self):
+        changes = self.drive.sync_permissions(self.file_ids, {'a@example.com': 'writer', 'b@example.com': 'writer'})
+        self.assertEqual(sorted(i['action'] for i in changes), ['create', 'create', 'delete', 'delete',
+                                                                'update', 'update'])
+        self.assertTrue(all(i['error'] == None for i in changes))
+        for file_id in self.file_ids:
+            self.assertEqual(self.permissions(file_id), [('group', 'team@example.com', 'reader'),
+                                                         ('user', 'a@example.com', 'writer'),
+                                                         ('user', 'b@example.com', 'writer'),
+                                                         ('user', 'owner@example.com', 'owner')])
+        self.assertEqual(self.drive.sync_permissions(self.file_ids, {'a@example.com': 'writer',
+                                                                     'b@example.com': 'writer'}), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
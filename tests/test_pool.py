@@ -0,0 +1,62 @@
+import json
+import unittest
+
+import httplib2
+from googleapiclient.errors import HttpError
+from pydrive2.files import ApiRequestError
+
+from fake import FakeGauth, FakeServer
+from simplegoogleapi.drive import DrivePool
+from simplegoogleapi.instrument import NoopInstrument, set_instrument
+
+
+def rate_limit_error():
+    content = json.dumps({'error': {'errors': [{'reason': 'userRateLimitExceeded'}]}}).encode('utf-8')
+    return HttpError(httplib2.Response({'status': 403}), content)
+
+
+class DrivePoolTest(unittest.TestCase):
+    def setUp(self):
+        set_instrument(NoopInstrument())
+        self.server = FakeServer().start()
+        self.addCleanup(self.server.stop)
+        self.pool = DrivePool([FakeGauth(), FakeGauth()], cache=False, api_endpoint=self.server.url)
+        self.folder_id = self.pool.drives[1].create_folder('pool')
+        for i in range(3):
+            self.pool.drives[1].upload_bytes(b'x', f'{i}.txt', folder_id=self.folder_id)
+
+    def throttle_first_account(self, error):
+        def execute(request, **kwargs):
+            raise error
+        self.pool.drives[0].execute = execute
+
+    def test_wrapped_rate_limit_moves_to_another_account(self):
+        self.throttle_first_account(ApiRequestError(rate_limit_error()))
+        self.assertEqual(self.pool.get_file(self.folder_id)['id'], self.folder_id)
+        self.assertEqual([i['throttles'] for i in self.pool.stats()], [1, 0])
+
+    def test_pages_of_a_listing_go_through_the_pool(self):
+        self.throttle_first_account(rate_limit_error())
+        files = list(self.pool.iter_files(parent_id=self.folder_id, page_size=1))
+        self.assertEqual(len(files), 3)
+        self.assertEqual([i['throttles'] for i in self.pool.stats()], [1, 0])
+
+    def test_a_method_is_not_run_again_from_the_start(self):
+        execute = self.pool.drives[0].execute
+
+        def throttle_listing(request, **kwargs):
+            if request.methodId == 'drive.files.list':
+                raise rate_limit_error()
+            return execute(request, **kwargs)
+
+        self.pool.drives[0].execute = throttle_listing
+        dest_id = self.pool.drives[1].create_folder('dest')
+        self.pool.copy_tree(self.folder_id, dest_id)
+        copies = list(self.pool.drives[1].iter_files(parent_id=dest_id))
+        self.assertEqual(len(copies), 1)
+        self.assertEqual(len(list(self.pool.drives[1].iter_files(parent_id=copies[0]['id']))), 3)
+        self.assertEqual(self.pool.stats()[0]['throttles'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import socket
+import unittest
+
+from httplib2 import ServerNotFoundError
+
+from simplegoogleapi.drive.scheduler import RequestScheduler
+from simplegoogleapi.instrument import NoopInstrument, set_instrument
+
+
+class RequestSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        set_instrument(NoopInstrument())
+        self.scheduler = RequestScheduler(quota_per_minute=1e12, base_delay=0)
+
+    def failing(self, errors):
+        errors = list(errors)
+
+        def function():
+            if len(errors) > 0:
+                raise errors.pop(0)
+            return 'ok'
+        return function
+
+    def test_connection_errors_are_retried(self):
+        errors = [ConnectionResetError(), socket.timeout(), ServerNotFoundError('no such host')]
+        self.assertEqual(self.scheduler.call(self.failing(errors)), 'ok')
+        self.assertEqual(self.scheduler.metrics()['retries'], 3)
+
+    def test_lost_response_of_a_create_is_not_retried(self):
+        with self.assertRaises(ConnectionResetError):
+            self.scheduler.call(self.failing([ConnectionResetError()]), idempotent=False)
+        self.assertEqual(self.scheduler.call(self.failing([ConnectionRefusedError()]), idempotent=False), 'ok')
+        self.assertEqual(self.scheduler.metrics()['retries'], 1)
+
+    def test_execute_retries_by_method(self):
+        class Request:
+            def __init__(self, method, errors):
+                self.method = method
+                self.execute = test.failing(errors)
+
+        test = self
+        self.assertEqual(self.scheduler.execute(Request('GET', [ConnectionResetError()])), 'ok')
+        with self.assertRaises(ConnectionResetError):
+            self.scheduler.execute(Request('POST', [ConnectionResetError()]))
+
+    def test_local_errors_are_not_retried(self):
+        with self.assertRaises(FileNotFoundError):
+            self.scheduler.call(self.failing([FileNotFoundError()]))
+        self.assertEqual(self.scheduler.metrics()['retries'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
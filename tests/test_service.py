@@ -0,0 +1,30 @@
+import gc
+import unittest
+import weakref
+
+from google.oauth2.credentials import Credentials
+
+from fake import FakeServer
+from simplegoogleapi.drive.service import drive_service
+from simplegoogleapi.instrument import NoopInstrument, set_instrument
+
+
+class DriveServiceTest(unittest.TestCase):
+    def setUp(self):
+        set_instrument(NoopInstrument())
+        self.server = FakeServer().start()
+        self.addCleanup(self.server.stop)
+
+    def test_cached_service_does_not_keep_credentials_alive(self):
+        creds = Credentials(token='fake-token')
+        service = drive_service(creds, api_endpoint=self.server.url)
+        self.assertIs(drive_service(creds, api_endpoint=self.server.url), service)
+        self.assertEqual(service.files().get(fileId='root').execute()['id'], 'root')
+        collected = weakref.ref(creds)
+        del creds, service
+        gc.collect()
+        self.assertIsNone(collected())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+from httplib2 import Response
+
+from fake import fake_drive
+from simplegoogleapi.drive import help
+from simplegoogleapi.instrument import NoopInstrument, set_instrument
+
+
+class TransferOwnerBulkTest(unittest.TestCase):
+    def setUp(self):
+        set_instrument(NoopInstrument())
+        self.server, self.drive = fake_drive()
+        self.addCleanup(self.server.stop)
+        self.file_ids = [self.drive.upload_bytes(f'{i}'.encode(), f'{i}.txt')['id'] for i in range(3)]
+        self.journal_file = os.path.join(tempfile.mkdtemp(), 'transfer.jsonl')
+
+    def copies(self):
+        return [i for i in self.server.app.state.files.values() if help.SOURCE_PROPERTY in i.get('appProperties', {})]
+
+    def transfer(self):
+        return help.transfer_owner_bulk(self.drive, self.drive, file_ids=self.file_ids, delete_source=False,
+                                        journal_file=self.journal_file, max_workers=1)
+
+    def test_new_files_are_not_searched(self):
+        with mock.patch.object(help, '_find_copy', wraps=help._find_copy) as find_copy:
+            report = self.transfer()
+        self.assertEqual(report['verified'], 3)
+        self.assertEqual(find_copy.call_count, 0)
+
+    def test_crash_during_copy_is_resumed_without_duplicate(self):
+        execute = self.drive.execute
+
+        def crash_after_copy(request, **kwargs):
+            result = execute(request, **kwargs)
+            if request.methodId == 'drive.files.copy' and len(self.copies()) == 2:
+                raise KeyboardInterrupt()
+            return result
+
+        with mock.patch.object(self.drive, 'execute', crash_after_copy):
+            with self.assertRaises(KeyboardInterrupt):
+                self.transfer()
+        with mock.patch.object(help, '_find_copy', wraps=help._find_copy) as find_copy:
+            report = self.transfer()
+        self.assertEqual((report['verified'] + report['skipped'], report['failed']), (3, 0))
+        self.assertEqual(find_copy.call_count, 1)
+        self.assertEqual(len(self.copies()), 3)
+
+    def test_lost_copy_response_is_not_sent_again(self):
+        execute = HttpRequest.execute
+        errors = [ConnectionResetError(), HttpError(Response({'status': 503}), b'')]
+
+        def lose_copy_response(request, *args, **kwargs):
+            result = execute(request, *args, **kwargs)
+            if request.methodId == 'drive.files.copy' and len(errors) > 0:
+                raise errors.pop(0)
+            return result
+
+        with mock.patch.object(HttpRequest, 'execute', lose_copy_response):
+            report = self.transfer()
+        self.assertEqual((report['verified'], report['failed']), (1, 2))
+        self.assertEqual(len(self.copies()), 3)
+        report = self.transfer()
+        self.assertEqual((report['verified'], report['skipped'], report['failed']), (2, 1, 0))
+        self.assertEqual(len(self.copies()), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+
+from fake import fake_drive
+from simplegoogleapi.instrument import NoopInstrument, set_instrument
+
+
+class CopyTreeTest(unittest.TestCase):
+    def setUp(self):
+        set_instrument(NoopInstrument())
+        self.server, self.drive = fake_drive()
+        self.addCleanup(self.server.stop)
+        self.folder_id = self.drive.create_folder('source')
+        self.sub_id = self.drive.create_folder('sub', parent_folder_id=self.folder_id)
+        self.drive.upload_bytes(b'a', 'a.txt', folder_id=self.folder_id)
+        self.drive.upload_bytes(b'b', 'b.txt', folder_id=self.sub_id)
+
+    def test_copy_into_subfolder_is_refused(self):
+        for dest_id in [self.folder_id, self.sub_id]:
+            with self.assertRaises(ValueError):
+                self.drive.copy_tree(self.folder_id, dest_id)
+        with self.assertRaises(ValueError):
+            self.drive.move_tree(self.folder_id, self.sub_id, by_copy=True)
+
+    def test_copy_tree(self):
+        report = self.drive.copy_tree(self.folder_id, 'root')
+        self.assertEqual((report['folders'], report['files'], report['failed']), (2, 2, 0))
+        self.assertTrue(report['consistent'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from fake import fake_drive
+from simplegoogleapi.instrument import NoopInstrument, set_instrument
+
+
+class UploadTest(unittest.TestCase):
+    def setUp(self):
+        set_instrument(NoopInstrument())
+        self.server, self.drive = fake_drive()
+        self.addCleanup(self.server.stop)
+        self.directory = tempfile.mkdtemp()
+
+    def local_file(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def content(self, file):
+        return self.server.app.state.content[file['id']]
+
+    def test_upload_many(self):
+        local_files = [self.local_file(f'{i}.txt', f'{i}'.encode()) for i in range(5)]
+        summary = self.drive.upload_many(local_files + [os.path.join(self.directory, 'missing.txt')])
+        self.assertEqual((summary['files'], summary['failed'], summary['bytes']), (6, 1, 5))
+        failed = [i for i in summary['results'] if i['error'] != None]
+        self.assertIsInstance(failed[0]['error'], FileNotFoundError)
+
+    def test_resumable_upload_continues_after_an_interruption(self):
+        data = os.urandom(3 * 256 * 1024 + 5)
+        local_file = self.local_file('data.bin', data)
+        journal_file = os.path.join(self.directory, 'upload.json')
+        next_chunk = self.drive._next_chunk
+        chunks = []
+
+        def crash_after_two(request):
+            if len(chunks) == 2:
+                raise KeyboardInterrupt()
+            chunks.append(request.resumable_progress)
+            return next_chunk(request)
+
+        with mock.patch.object(self.drive, '_next_chunk', crash_after_two):
+            with self.assertRaises(KeyboardInterrupt):
+                self.drive.upload_file_resumable(local_file, chunk_size=256 * 1024, journal_file=journal_file)
+        with mock.patch.object(self.drive, '_next_chunk', wraps=next_chunk) as resumed:
+            file = self.drive.upload_file_resumable(local_file, chunk_size=256 * 1024, journal_file=journal_file)
+        self.assertEqual(resumed.call_count, 2)
+        self.assertEqual(self.content(file), data)
+
+    def test_upload_from_memory(self):
+        data = os.urandom(300 * 1024)
+        self.assertEqual(self.content(self.drive.upload_bytes(data, 'a.bin', chunk_size=256 * 1024)), data)
+        # A pipe or a response body can not seek, it is read chunk by chunk
+        stream = io.BufferedReader(io.BytesIO(data))
+        stream.seekable = lambda: False
+        self.assertEqual(self.content(self.drive.upload_stream(stream, 'b.bin', chunk_size=256 * 1024)), data)
+
+    def test_upload_dataframe(self):
+        df = pd.DataFrame({'a': range(1000), 'b': ['x'] * 1000})
+        file = self.drive.upload_dataframe(df, 'df.csv', rows_per_chunk=100, index=False)
+        self.assertEqual(file['mimeType'], 'text/csv')
+        self.assertTrue(pd.read_csv(io.BytesIO(self.content(file))).equals(df))
+
+
+if __name__ == '__main__':
+    unittest.main()